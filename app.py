@@ -1,35 +1,24 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, make_response, abort, send_from_directory
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, make_response, abort, send_from_directory, g
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from datetime import datetime, date
 import os
 import sys
 import utility
-import yaml
-from sqlalchemy.orm import sessionmaker
-import base64
+from sqlalchemy import or_
+from sqlalchemy.orm import sessionmaker, scoped_session, joinedload
 from werkzeug.utils import secure_filename
-from markdown2 import Markdown
 from utility import save_image, delete_image
 from dotenv import load_dotenv
-from utils.config_utils import load_config, update_config, get_config_for_settings, get_section_title, get_section_icon, reset_config_to_defaults
-from utils.auth_utils import admin_required, active_user_required, get_safe_redirect_url, init_default_admin, validate_user_data, check_unique_user_fields, format_user_for_display
-from utils.project_config_utils import get_project_config, initialize_project_configs
+from utils.config_utils import get_config, get_editability_map, update_config, get_config_for_settings, get_section_title, get_section_icon, reset_config_to_defaults
+from utils.auth_utils import admin_required, active_user_required, get_safe_redirect_url, init_default_admin, validate_user_data, check_unique_user_fields, format_user_for_display, get_access_context, invalidate_access_context
+from utils.project_config_utils import get_project_config, get_project_configs, initialize_project_configs
 from utils.tool_utils import get_enabled_tools, save_project_tools, initialize_project_tools, get_project_tools_for_settings, initialize_tools_table
+from utils.markdown_utils import render_markdown, refresh_rendered_content, get_rendered_content
+from utils.search_utils import search_index_available, build_match_query, apply_search, search_rank, highlight_snippet, highlight_preview
+from utils.pagination_utils import keyset_paginate, get_page_size, parse_date
 
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, PageBreak, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch, cm
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER, TA_LEFT
-from reportlab.platypus.flowables import HRFlowable
 import io
 import re
-from PIL import Image as PILImage
-
-from datetime import datetime
-import sys
 
 # Path setup
 parent_dir = ".."
@@ -57,6 +46,12 @@ try:
 except Exception as e:
     print(f"Warning: Failed to initialize tools table: {e}")
 
+# Report the effective SQLite performance profile (WAL, busy_timeout, cache...)
+try:
+    print(f"SQLite pragmas: {models.base.report_sqlite_pragmas()}")
+except Exception as e:
+    print(f"Warning: Could not read SQLite pragmas: {e}")
+
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -79,7 +74,7 @@ config = None
 # Load config from database instead of YAML
 def initialize_config():
     global config
-    config = load_config()
+    config = get_config()
 
 # Initialize config
 initialize_config()
@@ -94,15 +89,30 @@ utility.create_database(config=config)
 # except Exception as e:
 #     print(f"Warning: Migration failed: {e}")
 
+# Request-scoped session: each request (thread) gets its own session, which is
+# released back to the pool by remove_session() when the app context tears down
 Session = sessionmaker(bind=models.base.engine)
-session = Session()
+session = scoped_session(Session)
 Artifact = models.artifact.Artifact
+ArtifactSummary = models.artifact.ArtifactSummary
 Project = models.project.Project
 User = models.user.User
 ProjectMember = models.project_member.ProjectMember
 
 # Initialize default admin user if no users exist
 init_default_admin(session, User)
+session.remove()
+
+@app.teardown_appcontext
+def remove_session(exception=None):
+    """Close the request's session and clear its identity map"""
+    session.remove()
+
+@app.before_request
+def refresh_config():
+    """Pick up config changes saved by any worker since the last request"""
+    global config
+    config = get_config()
 
 # Make date available in templates
 @app.context_processor
@@ -163,12 +173,8 @@ def inject_user_stats():
         return {'user_artifact_count': 0}
     
     try:
-        # Get count of artifacts accessible to the current user
-        accessible_project_ids = get_user_accessible_project_ids()
-        artifact_count = session.query(Artifact).filter(
-            Artifact.project_id.in_(accessible_project_ids),
-            Artifact.deleted == False
-        ).count()
+        # Count of artifacts accessible to the current user, from the shared status counts
+        artifact_count = sum(row.count for row in get_artifact_status_counts())
         
         return {'user_artifact_count': artifact_count}
     except Exception:
@@ -209,12 +215,9 @@ def inject_tools_context():
     except Exception:
         return {'global_enabled_tools': [], 'current_project_id': None}
 
-# Create markdown renderer
-markdowner = Markdown(extras=["tables", "fenced-code-blocks"])
-
 @app.template_filter('markdown')
 def markdown_filter(text):
-    return markdowner.convert(text)
+    return render_markdown(text)
 
 # Authentication Routes
 @app.route('/login', methods=['GET', 'POST'])
@@ -278,7 +281,7 @@ def settings():
                 if reset_config_to_defaults():
                     flash('Configuration reset to default values successfully!', 'success')
                     # Reload config
-                    config = load_config()
+                    config = get_config()
                 else:
                     flash('Error resetting configuration to defaults.', 'error')
             except Exception as e:
@@ -288,15 +291,8 @@ def settings():
         
         # Normal settings update
         try:
-            # Load YAML config to check editability
-            from utils.config_utils import load_config_from_yaml, flatten_dict
-            yaml_config = load_config_from_yaml()
-            flat_config = flatten_dict(yaml_config)
-            
-            # Create a map of config keys to their editability
-            editability_map = {}
-            for key, value, is_editable in flat_config:
-                editability_map[key] = is_editable
+            # Map of config keys to their editability
+            editability_map = get_editability_map()
             
             # Get all form data
             updates = {}
@@ -331,7 +327,7 @@ def settings():
             if success_count > 0:
                 flash(f'Successfully updated {success_count} configuration(s)!', 'success')
                 # Reload config
-                config = load_config()
+                config = get_config()
             else:
                 flash('No configurations were updated.', 'error')
                 
@@ -512,6 +508,42 @@ def delete_user(user_id):
     
     return redirect(url_for('user_management'))
 
+@app.route('/get_artifact_status_counts')
+@login_required
+@active_user_required
+def get_artifact_status_counts_api():
+    """API endpoint to get artifact counts per project, type and expiry status"""
+    project_filter = request.args.get('project', '')
+    current_project_id = None
+    
+    if project_filter == 'default':
+        current_project_id = get_user_default_project_id()
+    elif project_filter and project_filter != 'all':
+        try:
+            current_project_id = int(project_filter)
+        except (ValueError, TypeError):
+            current_project_id = None
+    
+    counts = []
+    totals = {status: 0 for status in (models.artifact.STATUS_EXPIRED, models.artifact.STATUS_EXPIRING,
+                                       models.artifact.STATUS_ACTIVE, models.artifact.STATUS_NO_DATE)}
+    for row in get_artifact_status_counts():
+        if current_project_id and row.project_id != current_project_id:
+            continue
+        counts.append({
+            'project_id': row.project_id,
+            'type_name': row.type_name,
+            'status': row.expiry_status,
+            'count': row.count
+        })
+        totals[row.expiry_status] += row.count
+    
+    return jsonify({
+        'warning_days': get_expiry_warning_days(),
+        'counts': counts,
+        'totals': totals
+    })
+
 @app.route('/get_project_types')
 @login_required
 @active_user_required
@@ -557,10 +589,10 @@ def get_all_user_project_types():
     accessible_project_ids = get_user_accessible_project_ids()
     all_types = set()
     
-    for project_id in accessible_project_ids:
-        project_types = get_project_types(project_id)
-        for type_obj in project_types:
-            all_types.add(type_obj['name'])
+    # One query for every project's config instead of one per project
+    project_configs = get_project_configs(accessible_project_ids)
+    for configs in project_configs.values():
+        all_types.update(configs.get('type') or [])
     
     # If no types found from projects, return empty list
     if not all_types:
@@ -569,6 +601,38 @@ def get_all_user_project_types():
     # Convert to list of dicts with sequential IDs
     return [{'id': str(i), 'name': type_name} for i, type_name in enumerate(sorted(all_types))]
 
+def get_expiry_warning_days():
+    """Days before expiry an artifact is shown as expiring soon"""
+    try:
+        return int((config or {}).get('expiry', {}).get('warning_days', models.artifact.DEFAULT_WARNING_DAYS))
+    except (ValueError, TypeError):
+        return models.artifact.DEFAULT_WARNING_DAYS
+
+def get_preview_length():
+    """Characters of content shown on artifact cards (trim.content), at most the stored preview length"""
+    try:
+        length = int((config or {}).get('trim', {}).get('content') or models.artifact.DEFAULT_PREVIEW_TRIM)
+    except (ValueError, TypeError):
+        length = models.artifact.DEFAULT_PREVIEW_TRIM
+    return max(1, min(length, models.artifact.PREVIEW_LENGTH))
+
+def get_artifact_status_counts():
+    """Accessible artifact counts per project, type and expiry status, queried once per request"""
+    if 'artifact_status_counts' not in g:
+        g.artifact_status_counts = Artifact.get_status_counts(
+            session, get_user_accessible_project_ids(), get_expiry_warning_days()
+        )
+    return g.artifact_status_counts
+
+def get_page_urls(page):
+    """Build next/previous page URLs for the current view, keeping the other filters"""
+    args = request.args.to_dict()
+    args.pop('after', None)
+    args.pop('before', None)
+    next_url = url_for(request.endpoint, **args, after=page.next_cursor) if page.has_next else None
+    prev_url = url_for(request.endpoint, **args, before=page.prev_cursor) if page.has_prev else None
+    return next_url, prev_url
+
 @app.route('/')
 @login_required
 @active_user_required
@@ -614,8 +678,9 @@ def index():
                     type_filter = type_id
                     break
     
-    # Start with base query - no search filtering on index page
-    query = session.query(Artifact).filter(Artifact.deleted == False)
+    # Start with base query - no search filtering on index page. Cards only need
+    # the summary columns, so content, images and rendered HTML are never loaded
+    query = session.query(*Artifact.summary_columns(get_expiry_warning_days())).filter(Artifact.deleted == False)
     
     # Apply type filter only if specifically selected and not showing all
     if type_filter and not show_all:
@@ -646,8 +711,14 @@ def index():
             # User has no accessible projects, show no artifacts
             query = query.filter(Artifact.id == -1)
     
-    # Get final results
-    artifacts = query.order_by(Artifact.expiry_date.asc()).all()
+    # Get one page of results, keyset-paginated on (expiry_date, id)
+    page = keyset_paginate(query, Artifact.expiry_date, Artifact.id,
+                           get_page_size(config, request.args.get('page_size')),
+                           after=request.args.get('after'),
+                           before=request.args.get('before'),
+                           parse_value=parse_date)
+    artifacts = [ArtifactSummary(row) for row in page.items]
+    next_url, prev_url = get_page_urls(page)
     
     # Get projects for dropdown
     projects = get_all_projects()
@@ -660,9 +731,12 @@ def index():
     
     return render_template('index.html', 
                          artifacts=artifacts,
+                         next_url=next_url,
+                         prev_url=prev_url,
                          type_filter=type_filter if not show_all else '',
                          project_filter=project_filter,
                          show_all=show_all,
+                         preview_length=get_preview_length(),
                          today=date.today(),
                          types=types,
                          projects=projects,
@@ -699,14 +773,18 @@ def search():
         types_dict = {t['id']: t['name'] for t in all_user_types}
         types = all_user_types
     
-    # Start with base query
-    query = session.query(Artifact).filter(Artifact.deleted == False)
+    # Start with base query over the card columns only
+    query = session.query(*Artifact.summary_columns(get_expiry_warning_days())).filter(Artifact.deleted == False)
+    # Input without any words (e.g. only punctuation) has nothing to rank, so it takes the LIKE path
+    use_fts = build_match_query(search_query) is not None and search_index_available()
     
     # Apply search filter if present
-    if search_query:
-        name_results = query.filter(Artifact.name.ilike(f'%{search_query}%'))
-        content_results = query.filter(Artifact.content.ilike(f'%{search_query}%'))
-        query = name_results.union(content_results)
+    if use_fts:
+        # Full-text index: rows gain snippet and rank columns, best match first
+        query = apply_search(query, Artifact, search_query)
+    elif search_query:
+        query = query.filter(or_(Artifact.name.ilike(f'%{search_query}%'),
+                                 Artifact.content.ilike(f'%{search_query}%')))
     else:
         # If no search query, return empty results to encourage searching
         query = query.filter(Artifact.id == -1)  # This will return no results
@@ -740,8 +818,24 @@ def search():
             # User has no accessible projects, show no artifacts
             query = query.filter(Artifact.id == -1)
     
-    # Get final results
-    artifacts = query.order_by(Artifact.expiry_date.asc()).all()
+    # Get one page of results: best matches first for full-text search, otherwise by expiry
+    page_size = get_page_size(config, request.args.get('page_size'))
+    after = request.args.get('after')
+    before = request.args.get('before')
+    snippets = {}
+    if use_fts:
+        page = keyset_paginate(query, search_rank(), Artifact.id, page_size,
+                               after=after, before=before,
+                               row_key=lambda row: (row[-1], row.id))
+        snippets = {row.id: highlight_snippet(row[-2]) for row in page.items}
+    else:
+        page = keyset_paginate(query, Artifact.expiry_date, Artifact.id, page_size,
+                               after=after, before=before, parse_value=parse_date)
+        if search_query:
+            snippets = {row.id: highlight_preview(row.content_preview, search_query, get_preview_length())
+                        for row in page.items}
+    artifacts = [ArtifactSummary(row) for row in page.items]
+    next_url, prev_url = get_page_urls(page)
     
     # Get projects for dropdown
     projects = get_all_projects()
@@ -749,6 +843,10 @@ def search():
     
     return render_template('search.html', 
                          artifacts=artifacts,
+                         snippets=snippets,
+                         preview_length=get_preview_length(),
+                         next_url=next_url,
+                         prev_url=prev_url,
                          search_query=search_query,
                          type_filter=type_filter,
                          project_filter=project_filter,
@@ -826,6 +924,7 @@ def add_artifact():
                 project_id=project_id,
                 images=images_data
             )
+            refresh_rendered_content(artifact)
             
             session.add(artifact)
             session.commit()
@@ -920,6 +1019,7 @@ def update_artifact(artifact_id):
             # Update basic info
             artifact.name = request.form['name']
             artifact.content = request.form['content']
+            refresh_rendered_content(artifact)
             
             # Handle project change (only for admins)
             target_project_id = artifact.project_id  # Default to current project
@@ -1031,10 +1131,12 @@ def update_artifact(artifact_id):
 @login_required
 @active_user_required
 def artifact_detail(artifact_id):
-    artifact = session.query(Artifact).filter(Artifact.id==artifact_id).first()
-    if not artifact:
+    warning_days = get_expiry_warning_days()
+    result = session.query(Artifact, Artifact.expiry_status(warning_days)).filter(Artifact.id==artifact_id).first()
+    if not result:
         flash('Artifact not found!', 'error')
         return redirect(url_for('index'))
+    artifact, expiry_status = result
     
     # Check if user has access to this artifact's project
     if not user_has_project_access(artifact.project_id):
@@ -1047,19 +1149,19 @@ def artifact_detail(artifact_id):
     # Get project information
     project = session.query(Project).filter(Project.id==artifact.project_id).first()
     
-    # Calculate status
-    if artifact.expiry_date is None:
+    # Status bucket comes from the query; only the day count is computed here
+    if expiry_status == models.artifact.STATUS_NO_DATE:
         days_until_expiry = None
         status_badge = "bg-secondary"
         status_text = "No Expiry Date"
         status_icon = "fas fa-calendar-times"
     else:
         days_until_expiry = (artifact.expiry_date - date.today()).days
-        if artifact.is_expired():
+        if expiry_status == models.artifact.STATUS_EXPIRED:
             status_badge = "bg-danger"
             status_text = "Expired"
             status_icon = "fas fa-times-circle"
-        elif days_until_expiry <= 14:
+        elif expiry_status == models.artifact.STATUS_EXPIRING:
             status_badge = "bg-warning text-dark"
             status_text = "Expires Soon"
             status_icon = "fas fa-exclamation-triangle"
@@ -1070,6 +1172,7 @@ def artifact_detail(artifact_id):
     
     return render_template('artifact_detail.html', 
                          artifact=artifact,
+                         rendered_content=get_artifact_html(artifact),
                          type_name=type_name,
                          days_until_expiry=days_until_expiry,
                          status_badge=status_badge,
@@ -1083,13 +1186,14 @@ def artifact_detail(artifact_id):
 def serve_image(filename):
     return send_from_directory(config['storage']['image_path'], filename)
 
-def clean_markdown_for_pdf(text):
-    """Convert markdown to PDF-friendly text with basic formatting"""
+def clean_markdown_for_pdf(text, html=None):
+    """Convert markdown (or its already rendered HTML) to PDF-friendly text with basic formatting"""
     if not text:
         return ""
     
-    # Convert markdown to HTML first using markdowner
-    html = markdowner.convert(text)
+    # Convert markdown to HTML first unless the cached rendering was passed in
+    if html is None:
+        html = render_markdown(text)
     
     # Clean HTML tags for reportlab
     html = re.sub(r'<h1>(.*?)</h1>', r'<para fontSize="18" spaceAfter="12"><b>\1</b></para>', html)
@@ -1128,6 +1232,16 @@ def export_artifact_pdf(artifact_id):
         return redirect(url_for('index'))
     
     try:
+        # reportlab and PIL are only needed here, so they are not loaded at startup
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, PageBreak, Table, TableStyle
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import cm
+        from reportlab.lib import colors
+        from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER
+        from reportlab.platypus.flowables import HRFlowable
+        from PIL import Image as PILImage
+
         # Create PDF buffer
         buffer = io.BytesIO()
         
@@ -1274,7 +1388,7 @@ def export_artifact_pdf(artifact_id):
             story.append(Spacer(1, 15))
             
             # Process content
-            cleaned_content = clean_markdown_for_pdf(artifact.content)
+            cleaned_content = clean_markdown_for_pdf(artifact.content, html=get_artifact_html(artifact))
             
             # Split into paragraphs and add to story
             paragraphs = cleaned_content.split('\n')
@@ -1435,49 +1549,40 @@ def get_user_default_project():
     """Get the current user's personal default project only if they have access to it"""
     if not current_user.is_authenticated:
         return None
-    return current_user.get_default_project(session)
+    return get_access_context(session).default_project
 
 def get_user_default_project_id():
     """Get the current user's personal default project ID only if they have access to it"""
-    user_default_project = get_user_default_project()
-    return user_default_project.id if user_default_project else None
+    if not current_user.is_authenticated:
+        return None
+    return get_access_context(session).default_project_id
 
 def get_user_accessible_projects():
     """Get projects accessible to the current user"""
     # All users (including admin) only see projects they're members of
-    project_memberships = session.query(ProjectMember).filter_by(
-        user_id=current_user.id,
-        is_active=True
-    ).all()
-    
-    project_ids = [m.project_id for m in project_memberships]
-    if project_ids:
-        return session.query(Project).filter(Project.id.in_(project_ids)).order_by(Project.name).all()
-    else:
-        return []
+    return list(get_access_context(session).projects)
 
 def get_user_accessible_project_ids():
     """Get project IDs accessible to the current user"""
     # All users (including admin) only see projects they're members of
-    project_memberships = session.query(ProjectMember).filter_by(
-        user_id=current_user.id,
-        is_active=True
-    ).all()
-    return [m.project_id for m in project_memberships]
+    return list(get_access_context(session).project_ids)
 
 def user_has_project_access(project_id):
     """Check if current user has access to a specific project"""
     # For artifact access, admin still has full access for management purposes
-    if current_user.is_admin:
-        return True
-    
-    membership = session.query(ProjectMember).filter_by(
-        user_id=current_user.id,
-        project_id=project_id,
-        is_active=True
-    ).first()
-    
-    return membership is not None
+    return get_access_context(session).has_access(project_id)
+
+def get_artifact_html(artifact):
+    """Get an artifact's rendered content, storing a re-render of stale cached HTML for later views"""
+    try:
+        content_html = get_rendered_content(artifact, session)
+        session.commit()
+        return content_html
+    except Exception as e:
+        app.logger.warning(f"Could not store rendered content of artifact {artifact.id}: {str(e)}")
+        session.rollback()
+        # Still serve fresh HTML; the next view or backfill retries the write
+        return get_rendered_content(artifact)
 
 def get_all_projects():
     """Get all projects accessible to the current user"""
@@ -1493,66 +1598,50 @@ def projects():
     if current_user.is_admin:
         # Admin can see all projects
         projects = session.query(Project).order_by(Project.created_at.desc()).all()
-        # Get project ownership and member info for each project
-        project_data = []
-        for project in projects:
-            members = project.get_members(session)
-            owner_membership = project.get_owner(session)
-            
-            # Get owner user object safely
-            owner_user = None
-            if owner_membership and owner_membership.user:
-                owner_user = owner_membership.user
-            
-            project_info = {
-                'project': project,
-                'owner': owner_membership,
-                'owner_user': owner_user,
-                'member_count': len(members),
-                'is_member': any(m.user_id == current_user.id for m in members),
-                'is_owner': owner_membership and owner_membership.user_id == current_user.id
-            }
-            project_data.append(project_info)
+        memberships = {}
+        member_project_ids = {
+            project_id for (project_id,) in session.query(ProjectMember.project_id).filter_by(
+                user_id=current_user.id,
+                is_active=True
+            )
+        }
     else:
         # Regular user sees only projects they're a member of
-        project_memberships = session.query(ProjectMember).filter_by(
+        project_memberships = session.query(ProjectMember).options(
+            joinedload(ProjectMember.project)
+        ).filter_by(
             user_id=current_user.id,
             is_active=True
         ).all()
-        
-        project_data = []
-        for membership in project_memberships:
-            project = membership.project
-            members = project.get_members(session)
-            owner_membership = project.get_owner(session)
-            
-            # Get owner user object safely
-            owner_user = None
-            if owner_membership and owner_membership.user:
-                owner_user = owner_membership.user
-            
-            project_info = {
-                'project': project,
-                'owner': owner_membership,
-                'owner_user': owner_user,
-                'member_count': len(members),
-                'is_member': True,
-                'is_owner': membership.role == 'owner',
-                'role': membership.role
-            }
-            project_data.append(project_info)
+        projects = [membership.project for membership in project_memberships]
+        memberships = {membership.project_id: membership for membership in project_memberships}
+        member_project_ids = set(memberships)
+    
+    # Member counts, owners and artifact counts for all projects in a fixed number of queries
+    member_counts, owners, artifact_counts = Project.get_listing_stats(session, [p.id for p in projects])
+    
+    project_data = []
+    for project in projects:
+        owner_membership = owners.get(project.id)
+        owner_user = owner_membership.user if owner_membership else None
+        
+        project_info = {
+            'project': project,
+            'owner': owner_membership,
+            'owner_user': owner_user,
+            'member_count': member_counts.get(project.id, 0),
+            'is_member': project.id in member_project_ids,
+            'is_owner': owner_membership and owner_membership.user_id == current_user.id
+        }
+        if project.id in memberships:
+            project_info['is_owner'] = memberships[project.id].role == 'owner'
+            project_info['role'] = memberships[project.id].role
+        project_data.append(project_info)
     
     default_project = get_default_project()
     
-    # Get artifact counts for each project the user can access
-    project_artifacts = {}
-    for item in project_data:
-        project = item['project']
-        count = session.query(Artifact).filter(
-            Artifact.project_id == project.id,
-            Artifact.deleted == False
-        ).count()
-        project_artifacts[project.id] = count
+    # Artifact counts for each project the user can access
+    project_artifacts = {project.id: artifact_counts.get(project.id, 0) for project in projects}
     
     return render_template('projects.html', 
                          project_data=project_data,
@@ -1596,6 +1685,7 @@ def add_project():
         project.add_member(session, current_user.id, role='owner', added_by=current_user.id)
         
         session.commit()
+        invalidate_access_context()
         
         # Initialize project configurations with default values (including project types)
         initialize_project_configs(project.id)
@@ -1621,6 +1711,7 @@ def set_default_project(project_id):
         # Set this project as the user's personal default
         if current_user.set_default_project(project_id, session):
             session.commit()
+            invalidate_access_context()
             flash(f'"{project.name}" set as your personal default project', 'success')
         else:
             flash('You do not have access to set this project as default', 'error')
@@ -1638,6 +1729,7 @@ def clear_default_project():
     try:
         current_user.set_default_project(None, session)
         session.commit()
+        invalidate_access_context()
         flash('Personal default project cleared', 'info')
     except Exception as e:
         flash(f'Error clearing default project: {str(e)}', 'error')
@@ -1675,6 +1767,7 @@ def delete_project(project_id):
         project_name = project.name
         session.delete(project)
         session.commit()
+        invalidate_access_context()
         flash(f'Project "{project_name}" deleted successfully', 'success')
     except Exception as e:
         flash(f'Error deleting project: {str(e)}', 'error')
@@ -1908,6 +2001,7 @@ def add_project_member(project_id):
         # Add the member
         project.add_member(session, int(user_id), role=role, added_by=current_user.id)
         session.commit()
+        invalidate_access_context()
         
         user = session.query(User).get(user_id)
         flash(f'Successfully added {user.full_name} to the project!', 'success')
@@ -1943,6 +2037,7 @@ def remove_project_member(project_id, user_id):
         # Remove the member
         project.remove_member(session, user_id)
         session.commit()
+        invalidate_access_context()
         
         user = session.query(User).get(user_id)
         if user_id == current_user.id:
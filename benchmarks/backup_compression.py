@@ -0,0 +1,79 @@
+"""
+Benchmark backup archive compression: tarfile 'w:gz' against the parallel path.
+
+Archives a directory (by default a generated mix of compressible and
+incompressible files standing in for static/uploads) with the single-core
+tarfile 'w:gz' path create_weekly_backup used to take, then with
+create_archive for gzip and, if zstandard is installed, zstd at several
+worker counts. Reports size, time and input throughput.
+
+Usage: python benchmarks/backup_compression.py [--source DIR] [--size-mb 200] [--workers 1,2,4]
+"""
+import argparse
+import os
+import sys
+import tarfile
+import tempfile
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from utils import backup_utils
+
+def generate_uploads(path, size_mb):
+    """Write size_mb of sample files: half random bytes, half repetitive text"""
+    os.makedirs(path, exist_ok=True)
+    file_size = 1024 * 1024
+    for i in range(size_mb):
+        with open(os.path.join(path, f"upload_{i:05d}.bin"), 'wb') as f:
+            if i % 2:
+                f.write(os.urandom(file_size))
+            else:
+                f.write((f"token {i} expires soon; rotate the credential. " * 30000)[:file_size].encode())
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def run_tarfile_gzip(source, target_base, level):
+    """The previous single-core path"""
+    path = target_base + '.tar.gz'
+    with tarfile.open(path, 'w:gz', compresslevel=level) as tar:
+        tar.add(source, arcname='uploads')
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--source', help='Directory to archive (default: generated sample uploads)')
+    parser.add_argument('--size-mb', type=int, default=200, help='Size of the generated sample')
+    parser.add_argument('--workers', default=f"1,2,{os.cpu_count() or 1}", help='Worker counts to try')
+    parser.add_argument('--level', type=int, default=6, help='gzip compression level')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = args.source
+        if not source:
+            source = os.path.join(tmp, 'uploads')
+            generate_uploads(source, args.size_mb)
+        input_mb = directory_size(source) / (1024 * 1024)
+        print(f"Archiving {input_mb:.0f} MB from {source} on {os.cpu_count()} CPUs\n")
+        print(f"{'method':<32} {'size MB':>9} {'seconds':>9} {'MB/s':>8}")
+
+        def report(name, run):
+            start = time.perf_counter()
+            path = run()
+            elapsed = time.perf_counter() - start
+            print(f"{name:<32} {os.path.getsize(path) / (1024 * 1024):>9.1f} {elapsed:>9.2f} {input_mb / elapsed:>8.1f}")
+            os.remove(path)
+
+        report('tarfile w:gz (before)', lambda: run_tarfile_gzip(source, os.path.join(tmp, 'baseline'), args.level))
+        compressions = ['gzip'] + (['zstd'] if backup_utils.zstandard is not None else [])
+        for compression in compressions:
+            level = args.level if compression == 'gzip' else None
+            for workers in sorted({int(w) for w in args.workers.split(',')}):
+                report(f"create_archive {compression}, {workers} workers", lambda: backup_utils.create_archive(
+                    source, os.path.join(tmp, 'parallel'), 'uploads', compression=compression,
+                    level=level, workers=workers)['path'])
+
+if __name__ == '__main__':
+    main()
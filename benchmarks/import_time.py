@@ -0,0 +1,99 @@
+"""
+Profile the import cost of app.py startup with python -X importtime.
+
+Imports the module in a fresh interpreter (best of --repeat runs) and reports
+the time spent importing its dependencies, separately from the module's own
+top-level code (database migrations, config sync), along with the most
+expensive imports. Exits non-zero when --budget-ms is exceeded or a module
+listed in LAZY_MODULES was imported at startup.
+
+Usage: python benchmarks/import_time.py [--module app] [--top 15] [--repeat 3] [--budget-ms 1500]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy packages only needed by rarely used routes; they must be imported lazily
+LAZY_MODULES = {'reportlab', 'PIL', 'markdown2'}
+
+def parse_importtime(output):
+    """Parse -X importtime stderr into (name, self_us, cumulative_us, depth) tuples, in report order"""
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # Column header
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    return entries
+
+def measure_imports(module='app', cwd=project_root):
+    """Import module in a fresh interpreter and summarize its import graph.
+
+    Raises RuntimeError if the import fails.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed: {result.stderr.strip().splitlines()[-1:]}")
+    entries = parse_importtime(result.stderr)
+    module_index = max(i for i, entry in enumerate(entries) if entry[0] == module and entry[3] == 0)
+    _, self_us, cumulative_us, _ = entries[module_index]
+
+    # Everything the module pulls in is reported before it, after the previous top-level import
+    start = module_index
+    while start > 0 and entries[start - 1][3] > 0:
+        start -= 1
+    dependencies = entries[start:module_index]
+    return {
+        'module': module,
+        'total_us': cumulative_us,
+        'self_us': self_us,
+        'imports_us': cumulative_us - self_us,
+        'modules': [name for name, _, _, _ in dependencies],
+        'direct': sorted(((name, cumulative) for name, _, cumulative, depth in dependencies if depth == 1),
+                         key=lambda item: item[1], reverse=True),
+    }
+
+def find_eager_lazy_modules(report):
+    """Packages from LAZY_MODULES that were imported at startup"""
+    return sorted({name.split('.')[0] for name in report['modules']} & LAZY_MODULES)
+
+def best_of(module, repeat):
+    """Run measure_imports repeat times and keep the fastest import cost (least scheduler noise)"""
+    return min((measure_imports(module) for _ in range(repeat)), key=lambda report: report['imports_us'])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--module', default='app', help='Module to import')
+    parser.add_argument('--top', type=int, default=15, help='Direct imports to list')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs to take the best of')
+    parser.add_argument('--budget-ms', type=float, help='Fail if dependency imports take longer than this')
+    args = parser.parse_args()
+
+    report = best_of(args.module, args.repeat)
+    print(f"import {args.module}: {report['total_us'] / 1000:.0f} ms total, "
+          f"{report['imports_us'] / 1000:.0f} ms importing {len(report['modules'])} modules, "
+          f"{report['self_us'] / 1000:.0f} ms in its own top-level code\n")
+    print(f"{'direct import':<40} {'ms':>8}")
+    for name, cumulative in report['direct'][:args.top]:
+        print(f"{name:<40} {cumulative / 1000:>8.1f}")
+
+    failed = False
+    eager = find_eager_lazy_modules(report)
+    if eager:
+        print(f"\nImported at startup but should be lazy: {', '.join(eager)}")
+        failed = True
+    if args.budget_ms is not None and report['imports_us'] / 1000 > args.budget_ms:
+        print(f"\nImport cost {report['imports_us'] / 1000:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark the expiry notification query as already-notified tokens pile up.
+
+Compares fetching every token in the notification window and filtering with
+Artifact.can_send_notification in Python against the Artifact.notification_due
+SQL predicate. The number of tokens actually due stays fixed while the number
+of tokens that already hit their notification limit or were notified recently
+grows. The index seek skips tokens at their limit; recently notified tokens
+are still scanned in the index (not fetched), so the SQL time grows with them,
+only far more slowly than the Python filter.
+
+Usage: python benchmarks/notification_query.py [--due 50] [--sizes 0,1000,10000,50000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models.base import Base
+from models.artifact import Artifact
+
+CONFIG = {'email': {'notification_days': 10, 'max_notifications': 3, 'notification_interval': 24}}
+
+def seed(session, due_count, notified_count):
+    """Insert due tokens plus tokens in the same window that are not due"""
+    today = date.today()
+    now = datetime.utcnow()
+    rows = []
+    for i in range(due_count):
+        rows.append({'name': f'due{i}', 'content': 'c', 'type_name': 'Token',
+                     'expiry_date': today + timedelta(days=1 + i % 10), 'notification_count': 0})
+    for i in range(notified_count):
+        if i % 2:
+            rows.append({'name': f'limit{i}', 'content': 'c', 'type_name': 'Token',
+                         'expiry_date': today + timedelta(days=1 + i % 10), 'notification_count': 3,
+                         'last_notification_sent': now - timedelta(days=2)})
+        else:
+            rows.append({'name': f'recent{i}', 'content': 'c', 'type_name': 'Token',
+                         'expiry_date': today + timedelta(days=1 + i % 10), 'notification_count': 1,
+                         'last_notification_sent': now - timedelta(hours=1)})
+    session.bulk_insert_mappings(Artifact, rows)
+    session.commit()
+
+def python_filter(session):
+    """The previous approach: window in SQL, eligibility in Python"""
+    today = date.today()
+    tokens = session.query(Artifact).filter(
+        Artifact.type_name == 'Token',
+        Artifact.expiry_date <= today + timedelta(days=CONFIG['email']['notification_days']),
+        Artifact.expiry_date > today
+    ).all()
+    return len(tokens), [t for t in tokens if t.can_send_notification(CONFIG)]
+
+def sql_filter(session):
+    """Eligibility as a SQL predicate"""
+    tokens = session.query(Artifact).filter(Artifact.notification_due(CONFIG)).all()
+    return len(tokens), tokens
+
+def measure(session, query, repeat):
+    """Best-of-repeat time for a query, with the rows it fetched and kept"""
+    best = None
+    for _ in range(repeat):
+        session.expire_all()
+        start = time.perf_counter()
+        fetched, due = query(session)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, fetched, len(due)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--due', type=int, default=50, help='Tokens due a notification')
+    parser.add_argument('--sizes', default='0,1000,10000,50000', help='Already-notified token counts')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    print(f"{'notified':>10} | {'python: fetched':>15} {'ms':>8} | {'sql: fetched':>12} {'ms':>8}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            Base.metadata.create_all(engine)
+            session = sessionmaker(bind=engine)()
+            try:
+                seed(session, args.due, size)
+                py_time, py_fetched, py_due = measure(session, python_filter, args.repeat)
+                sql_time, sql_fetched, sql_due = measure(session, sql_filter, args.repeat)
+                assert py_due == sql_due == args.due
+            finally:
+                session.close()
+                engine.dispose()
+        print(f"{size:>10} | {py_fetched:>15} {py_time * 1000:>8.1f} | {sql_fetched:>12} {sql_time * 1000:>8.1f}")
+
+if __name__ == '__main__':
+    main()
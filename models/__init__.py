@@ -7,9 +7,11 @@ from .project_config import ProjectConfig
 from .artifact import Artifact
 from .type import Type
 from .config import Config
+from .config_version import ConfigVersion
+from .notification_outbox import NotificationOutbox
 from .tool import Tool
 
 __all__ = [
     'Base', 'User', 'Project', 'ProjectMember', 'ProjectConfig', 
-    'Artifact', 'Type', 'Config', 'Tool'
+    'Artifact', 'Type', 'Config', 'ConfigVersion', 'NotificationOutbox', 'Tool'
 ]
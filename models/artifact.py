@@ -1,12 +1,27 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime, Text, JSON, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime, Text, JSON, Boolean, Index, func, case, and_, or_
 from .base import Base
 from datetime import datetime, date, timedelta
 
+# Characters of plain text kept for list-view previews
+PREVIEW_LENGTH = 500
+# Characters shown on cards when trim.content is not set
+DEFAULT_PREVIEW_TRIM = 120
+
+# Expiry status buckets
+STATUS_NO_DATE = 'no_date'
+STATUS_EXPIRED = 'expired'
+STATUS_EXPIRING = 'expiring'
+STATUS_ACTIVE = 'active'
+DEFAULT_WARNING_DAYS = 14
+
 class Artifact(Base):
     __tablename__ = 'artifact'
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String, nullable=False)
     content = Column(Text, nullable=False)
+    content_html = Column(Text, nullable=True)  # Rendered markdown, cached
+    content_hash = Column(String(64), nullable=True)  # Hash of the content content_html was rendered from
+    content_preview = Column(String(PREVIEW_LENGTH + 1), nullable=True)  # Plain-text start of the content for cards
     images = Column(JSON, default=list)  # Will store list of {name: filename, path: relative_path}
     type_name = Column(String, nullable=False)  # Project-level type storage
     project_id = Column(Integer, ForeignKey('project.id'), nullable=True)  # Allow null for migration
@@ -17,6 +32,77 @@ class Artifact(Base):
     deleted = Column(Boolean, default=False)
     deleted_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        # Artifact lists filter by project, deleted and (optionally) type, ordered by expiry
+        Index('ix_artifact_project_deleted_type_expiry', 'project_id', 'deleted', 'type_name', 'expiry_date'),
+        Index('ix_artifact_project_deleted_expiry', 'project_id', 'deleted', 'expiry_date'),
+        # The notification scheduler looks up live tokens by expiry window across all projects.
+        # notification_count comes before the expiry range so tokens at their limit are skipped
+        # by the seek; recently notified tokens are still read, but only from the index
+        Index('ix_artifact_deleted_type_count_expiry', 'deleted', 'type_name', 'notification_count',
+              'expiry_date', 'last_notification_sent'),
+    )
+
+
+    @classmethod
+    def expiry_status(cls, warning_days=DEFAULT_WARNING_DAYS, today=None):
+        """SQL expression bucketing artifacts into no_date/expired/expiring/active"""
+        today = today or date.today()
+        return case(
+            (cls.expiry_date.is_(None), STATUS_NO_DATE),
+            (cls.expiry_date < today, STATUS_EXPIRED),
+            (cls.expiry_date <= today + timedelta(days=warning_days), STATUS_EXPIRING),
+            else_=STATUS_ACTIVE
+        ).label('expiry_status')
+
+    @classmethod
+    def get_status_counts(cls, session, project_ids, warning_days=DEFAULT_WARNING_DAYS):
+        """Count live artifacts per (project_id, type_name, expiry status) in one grouped query"""
+        if not project_ids:
+            return []
+        status = cls.expiry_status(warning_days)
+        return session.query(
+            cls.project_id, cls.type_name, status, func.count(cls.id).label('count')
+        ).filter(
+            cls.project_id.in_(project_ids),
+            cls.deleted == False
+        ).group_by(cls.project_id, cls.type_name, status).all()
+
+    @classmethod
+    def notification_due(cls, config, now=None, today=None):
+        """SQL predicate for tokens due an expiry notification (the rules of can_send_notification)"""
+        now = now or datetime.utcnow()
+        today = today or date.today()
+        hours_between_notifications = config['email'].get('notification_interval', 24)
+        notification_days = config['email'].get('notification_days', 14)
+        max_notifications = config['email'].get('max_notifications', 3)
+        return and_(
+            cls.deleted == False,
+            cls.type_name == 'Token',
+            cls.expiry_date > today,
+            cls.expiry_date <= today + timedelta(days=notification_days),
+            # An equality list (not a range) so the index can seek each count below the limit
+            cls.notification_count.in_(range(max_notifications)),
+            or_(
+                cls.last_notification_sent.is_(None),
+                cls.last_notification_sent <= now - timedelta(hours=hours_between_notifications)
+            )
+        )
+
+    @classmethod
+    def summary_columns(cls, warning_days=DEFAULT_WARNING_DAYS):
+        """Columns needed to render an artifact card in list views (no content, images or HTML)"""
+        return [
+            cls.id,
+            cls.name,
+            cls.type_name,
+            cls.project_id,
+            cls.expiry_date,
+            cls.created_at,
+            # Rows saved before previews existed fall back to the raw content prefix
+            func.coalesce(cls.content_preview, func.substr(cls.content, 1, PREVIEW_LENGTH + 1)).label('content_preview'),
+            cls.expiry_status(warning_days),
+        ]
 
     def is_expired(self):
         expiry_date = None
@@ -79,4 +165,20 @@ class Artifact(Base):
         if not self.deleted or not self.deleted_at:
             return False
         cleanup_threshold = datetime.utcnow() - timedelta(hours=config['storage'].get('cleanup_threshold_hours', 24))
-        return self.deleted_at <= cleanup_threshold
\ No newline at end of file
+        return self.deleted_at <= cleanup_threshold
+
+class ArtifactSummary:
+    """Read-only artifact card data built from a row of Artifact.summary_columns()"""
+    __slots__ = ('id', 'name', 'type_name', 'project_id', 'expiry_date', 'created_at', 'content_preview', 'expiry_status')
+
+    def __init__(self, row):
+        for field in self.__slots__:
+            setattr(self, field, getattr(row, field))
+
+    # Same status helpers as the full model
+    is_expired = Artifact.is_expired
+    get_type_name = Artifact.get_type_name
+    is_token = Artifact.is_token
+
+    def __repr__(self):
+        return f'<ArtifactSummary {self.id} {self.name}>'
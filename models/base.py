@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 import os
 import yaml
@@ -27,5 +27,67 @@ def get_config_value(config_dict, key_path):
 db_loc = get_config_value(cfg, 'sql_alchemy.loc')
 db_name = get_config_value(cfg, 'sql_alchemy.db')
 
-engine = create_engine(f"sqlite:///{os.path.join(db_loc, db_name)}") 
-Base = declarative_base() 
\ No newline at end of file
+# Connection pool configuration (shared by the web app workers and the scheduler)
+def get_pool_options(config_dict):
+    """Build create_engine() pool keyword arguments from the sql_alchemy config section"""
+    pool_size = get_config_value(config_dict, 'sql_alchemy.pool_size')
+    max_overflow = get_config_value(config_dict, 'sql_alchemy.max_overflow')
+    pool_timeout = get_config_value(config_dict, 'sql_alchemy.pool_timeout')
+    pool_recycle = get_config_value(config_dict, 'sql_alchemy.pool_recycle')
+    return {
+        'pool_size': int(pool_size) if pool_size is not None else 5,
+        'max_overflow': int(max_overflow) if max_overflow is not None else 10,
+        'pool_timeout': int(pool_timeout) if pool_timeout is not None else 30,
+        'pool_recycle': int(pool_recycle) if pool_recycle is not None else 3600,
+        'pool_pre_ping': True,
+    }
+
+# Connect-time SQLite pragmas. WAL lets readers proceed while the scheduler or a
+# backup is writing; busy_timeout makes writers wait instead of failing with
+# "database is locked".
+SQLITE_PRAGMA_DEFAULTS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,       # milliseconds
+    'cache_size': -20000,       # negative = KiB, i.e. ~20MB page cache
+    'mmap_size': 268435456,     # 256MB
+    'temp_store': 'MEMORY',
+}
+
+def get_sqlite_pragmas(config_dict):
+    """Get the pragma set from the sql_alchemy config section, falling back to defaults"""
+    pragmas = {}
+    for name, default in SQLITE_PRAGMA_DEFAULTS.items():
+        value = get_config_value(config_dict, f'sql_alchemy.{name}')
+        if value is None:
+            value = default
+        if not str(value).lstrip('-').isalnum():
+            raise ValueError(f"Invalid value for sql_alchemy.{name}: {value!r}")
+        pragmas[name] = value
+    return pragmas
+
+def configure_sqlite_engine(target_engine, pragmas):
+    """Apply the given pragmas to every new DBAPI connection of the engine"""
+    @event.listens_for(target_engine, "connect")
+    def apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def get_effective_pragmas(target_engine=None, names=None):
+    """Read back the pragma values SQLite is actually using"""
+    target_engine = target_engine or engine
+    names = names or SQLITE_PRAGMA_DEFAULTS.keys()
+    with target_engine.connect() as conn:
+        return {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in names}
+
+def report_sqlite_pragmas(target_engine=None):
+    """Return a one-line summary of the effective pragmas for startup logs"""
+    effective = get_effective_pragmas(target_engine)
+    return ', '.join(f"{name}={value}" for name, value in effective.items())
+
+sqlite_pragmas = get_sqlite_pragmas(cfg)
+engine = create_engine(f"sqlite:///{os.path.join(db_loc, db_name)}", **get_pool_options(cfg))
+configure_sqlite_engine(engine, sqlite_pragmas)
+Base = declarative_base() 
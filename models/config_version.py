@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer
+from models.base import Base
+
+class ConfigVersion(Base):
+    __tablename__ = 'config_version'
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)  # Bumped on every config change
+    
+    def __repr__(self):
+        return f'<ConfigVersion {self.version}>'
@@ -0,0 +1,58 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, ForeignKey, Index
+from .base import Base
+from datetime import datetime, timedelta
+
+# Delivery states
+STATUS_PENDING = 'pending'
+STATUS_SENT = 'sent'
+STATUS_DEAD = 'dead'  # Gave up after the maximum number of attempts
+
+def get_dead_idempotency_key(idempotency_key, outbox_id):
+    """Key a dead-lettered row is moved to, freeing its original key"""
+    return f"{idempotency_key}:dead:{outbox_id}"
+
+class NotificationOutbox(Base):
+    """Email notifications waiting to be delivered by the outbox dispatcher"""
+    __tablename__ = 'notification_outbox'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    idempotency_key = Column(String, nullable=False, unique=True)  # One live row per logical notification
+    artifact_id = Column(Integer, ForeignKey('artifact.id'), nullable=True)
+    covered_artifacts = Column(JSON, nullable=True)  # Digests: [[artifact_id, notification_number], ...]
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)  # HTML body
+    status = Column(String(20), nullable=False, default=STATUS_PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # The dispatcher polls for pending rows whose retry time has come
+        Index('ix_notification_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<NotificationOutbox {self.idempotency_key} {self.status}>'
+
+    def mark_sent(self, now=None):
+        """Record a successful delivery"""
+        self.status = STATUS_SENT
+        self.attempts = (self.attempts or 0) + 1
+        self.sent_at = now or datetime.utcnow()
+        self.last_error = None
+
+    def mark_failed(self, error, max_attempts, retry_delay, now=None):
+        """Record a failed delivery, scheduling a retry with exponential backoff
+        or dead-lettering the row once max_attempts is reached"""
+        now = now or datetime.utcnow()
+        self.attempts = (self.attempts or 0) + 1
+        self.last_error = str(error)
+        if self.attempts >= max_attempts:
+            self.status = STATUS_DEAD
+            # Release the key so the notification can be queued again later
+            self.idempotency_key = get_dead_idempotency_key(self.idempotency_key, self.id)
+        else:
+            self.next_attempt_at = now + timedelta(seconds=retry_delay * 2 ** (self.attempts - 1))
@@ -1,5 +1,6 @@
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import func
+from sqlalchemy.orm import relationship, joinedload
 from .base import Base
 from datetime import datetime
 
@@ -107,6 +108,53 @@ class Project(Base):
         
         return session.query(cls).filter(cls.id.in_(project_ids)).all()
     
+    @classmethod
+    def get_listing_stats(cls, session, project_ids):
+        """Get member counts, owner memberships and artifact counts for many projects at once.
+        
+        Uses a fixed number of queries regardless of how many projects are passed:
+        returns (member_counts, owners, artifact_counts), each keyed by project id.
+        Owner memberships have their user eager-loaded.
+        """
+        from .project_member import ProjectMember
+        from .artifact import Artifact
+        
+        project_ids = list(project_ids)
+        if not project_ids:
+            return {}, {}, {}
+        
+        member_counts = dict(
+            session.query(ProjectMember.project_id, func.count(ProjectMember.id))
+            .filter(ProjectMember.project_id.in_(project_ids), ProjectMember.is_active == True)
+            .group_by(ProjectMember.project_id)
+            .all()
+        )
+        
+        owners = {}
+        owner_memberships = (
+            session.query(ProjectMember)
+            .options(joinedload(ProjectMember.user))
+            .filter(
+                ProjectMember.project_id.in_(project_ids),
+                ProjectMember.role == 'owner',
+                ProjectMember.is_active == True
+            )
+            .order_by(ProjectMember.id)
+            .all()
+        )
+        for membership in owner_memberships:
+            # Keep the first owner, matching get_owner()
+            owners.setdefault(membership.project_id, membership)
+        
+        artifact_counts = dict(
+            session.query(Artifact.project_id, func.count(Artifact.id))
+            .filter(Artifact.project_id.in_(project_ids), Artifact.deleted == False)
+            .group_by(Artifact.project_id)
+            .all()
+        )
+        
+        return member_counts, owners, artifact_counts
+    
     def get_user_membership(self, session, user_id):
         """Get user's membership in this project"""
         from .project_member import ProjectMember
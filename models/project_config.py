@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import json
@@ -20,6 +20,11 @@ class ProjectConfig(Base):
     # Relationship to project
     project = relationship("Project", back_populates="configs")
     
+    __table_args__ = (
+        # One value per key per project; lookups by (project_id, key) are a single index probe
+        Index('uq_project_config_project_key', 'project_id', 'key', unique=True),
+    )
+    
     def get_parsed_value(self):
         """Get the value parsed from JSON"""
         try:
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .base import Base
 from datetime import datetime
@@ -20,6 +20,13 @@ class ProjectMember(Base):
     user = relationship("User", foreign_keys=[user_id], back_populates="project_memberships")
     added_by_user = relationship("User", foreign_keys=[added_by])
     
+    __table_args__ = (
+        # Permission helpers look up a user's active memberships, optionally for one project
+        Index('ix_project_members_user_active_project', 'user_id', 'is_active', 'project_id'),
+        # Member and owner listings for a project
+        Index('ix_project_members_project_active_role', 'project_id', 'is_active', 'role'),
+    )
+    
     def __repr__(self):
         return f'<ProjectMember user_id={self.user_id} project_id={self.project_id} role={self.role}>'
     
@@ -2,17 +2,23 @@ import logging
 import yaml
 import sys
 import os
-import shutil
 import glob
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime, date, timedelta
-from models.base import engine
+from models.base import engine, report_sqlite_pragmas
 from models.artifact import Artifact
 from models.project import Project  # Import Project model to register the table
 from models.project_config import ProjectConfig  # Import ProjectConfig model to register the table
 from utility import delete_image
-from utils.email_utils import check_expiring_tokens
-from utils.config_utils import load_config
+from utils.email_utils import check_expiring_tokens, run_outbox_dispatcher
+from utils.config_utils import load_config, get_config_version
+from utils.markdown_utils import backfill_rendered_content
+from utils.backup_utils import (backup_database, backup_images_incremental, restore_image_snapshot, create_archive,
+                                COMPRESSION_EXTENSIONS, DEFAULT_PAGES_PER_STEP)
+from utils.replication_utils import run_replication, restore_replica
+from utils.schedule_utils import JobScheduler, ScheduleError
 
 # Set up logging
 logging.basicConfig(
@@ -28,34 +34,89 @@ Session = sessionmaker(bind=engine)
 # Load config from database instead of YAML
 config = load_config()
 
-def cleanup_deleted_artifacts(session):
-    """Delete artifacts that were soft-deleted"""
+# Purge limits: rows deleted per transaction and threads removing image files
+CLEANUP_BATCH_SIZE = 500
+CLEANUP_FILE_WORKERS = 4
+
+# Daemon job schedules used when scheduler.* is not configured, in one-shot run order
+DEFAULT_JOB_SCHEDULES = {
+    'notifications': 'every 5m',
+    'purge': 'every 1h',
+    'maintenance': '30 3 * * *',
+    'backup': 'every 1h',
+}
+# Seconds between checks of the config version while the daemon is idle
+DEFAULT_CONFIG_CHECK_INTERVAL = 30
+
+def format_bytes(size):
+    """Human-readable byte count"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+
+def delete_artifact_file(image_path):
+    """Delete one image of a purged artifact, returning the bytes freed (None on failure)"""
     try:
-        # Find artifacts ready for cleanup
-        artifacts_to_delete = session.query(Artifact)\
-            .filter(Artifact.deleted == True)\
-            .all()
-
-        deleted_count = 0
-        for artifact in artifacts_to_delete:
-            if artifact.is_ready_for_cleanup(config):
-                # Delete associated images
-                if artifact.images:
-                    for image in artifact.images:
-                        delete_image(image['path'])
-                
-                # Permanently delete the artifact
-                session.delete(artifact)
-                deleted_count += 1
+        return delete_image(image_path)
+    except Exception as e:
+        logger.warning(f"Could not delete image {image_path}: {str(e)}")
+        return None
+
+def cleanup_deleted_artifacts(session, batch_size=CLEANUP_BATCH_SIZE, file_workers=CLEANUP_FILE_WORKERS):
+    """Permanently delete soft-deleted artifacts past the cleanup threshold.
 
-        if deleted_count > 0:
-            session.commit()
-            logger.info(f"Permanently deleted {deleted_count} artifacts")
+    Rows are selected by the threshold in SQL and purged in batches of batch_size
+    with a commit per batch, so memory use does not grow with the trash. Image
+    files are removed on a thread pool once their rows are gone. Returns a report
+    of the artifacts, files and bytes reclaimed.
+    """
+    report = {'artifacts': 0, 'files': 0, 'failed_files': 0, 'bytes': 0}
+    threshold_hours = config.get('storage', {}).get('cleanup_threshold_hours', 24)
+    cleanup_threshold = datetime.utcnow() - timedelta(hours=threshold_hours)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=file_workers) as executor:
+            last_id = 0
+            while True:
+                # Only the id and image list of each expired row are read
+                rows = session.query(Artifact.id, Artifact.images)\
+                    .filter(Artifact.deleted == True,
+                            Artifact.deleted_at.isnot(None),
+                            Artifact.deleted_at <= cleanup_threshold,
+                            Artifact.id > last_id)\
+                    .order_by(Artifact.id)\
+                    .limit(batch_size)\
+                    .all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                
+                session.query(Artifact)\
+                    .filter(Artifact.id.in_([row.id for row in rows]))\
+                    .delete(synchronize_session=False)
+                session.commit()
+                report['artifacts'] += len(rows)
+                
+                # Remove files after the commit so no remaining row points at a missing image
+                image_paths = [image['path'] for row in rows for image in (row.images or []) if image.get('path')]
+                for freed in executor.map(delete_artifact_file, image_paths):
+                    if freed is None:
+                        report['failed_files'] += 1
+                    else:
+                        report['files'] += 1
+                        report['bytes'] += freed
 
     except Exception as e:
         logger.error(f"Error during cleanup: {str(e)}")
         session.rollback()
 
+    if report['artifacts'] > 0:
+        logger.info(f"Permanently deleted {report['artifacts']} artifacts, removed {report['files']} images "
+                    f"({format_bytes(report['bytes'])} reclaimed)"
+                    + (f", {report['failed_files']} images could not be removed" if report['failed_files'] else ""))
+    return report
+
 def get_last_backup_date():
     """Get the date of the last backup from a marker file"""
     backup_marker_file = "/tmp/keepstone_last_backup"
@@ -109,9 +170,13 @@ def should_run_backup(config):
 def cleanup_old_backups(backup_path, keep_count):
     """Remove old backup files, keeping only the specified number"""
     try:
-        # Get all backup files
-        db_backups = glob.glob(os.path.join(backup_path, "keepstone_backup_*.db"))
-        archive_backups = glob.glob(os.path.join(backup_path, "keepstone_backup_*.tar.gz"))
+        # Get all backup files (database copies may be compressed)
+        db_backups = []
+        for extension in set(COMPRESSION_EXTENSIONS.values()):
+            db_backups.extend(glob.glob(os.path.join(backup_path, f"keepstone_backup_*.db{extension}")))
+        archive_backups = []
+        for extension in set(COMPRESSION_EXTENSIONS.values()):
+            archive_backups.extend(glob.glob(os.path.join(backup_path, f"keepstone_backup_*.tar{extension}")))
         
         # Sort by modification time (newest first)
         db_backups.sort(key=os.path.getmtime, reverse=True)
@@ -136,8 +201,11 @@ def create_weekly_backup(config):
         backup_config = config.get('backup', {})
         backup_path = backup_config.get('backup_path', '/app/backups')
         keep_backups = backup_config.get('keep_backups', 4)
-        backup_database = backup_config.get('backup_database', True)
-        backup_images = backup_config.get('backup_images', False)
+        include_database = backup_config.get('backup_database', True)
+        include_images = backup_config.get('backup_images', False)
+        compression = backup_config.get('compression', 'gzip')
+        compression_level = backup_config.get('compression_level') or None
+        compression_workers = backup_config.get('compression_workers', 0)
         
         # Create backup directory if it doesn't exist
         os.makedirs(backup_path, exist_ok=True)
@@ -145,19 +213,23 @@ def create_weekly_backup(config):
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
         # Backup database
-        if backup_database:
+        if include_database:
             db_config = config.get('sql_alchemy', {})
             db_path = os.path.join(db_config.get('loc', '/app/db'), db_config.get('db', 'data.db'))
             backup_db_path = os.path.join(backup_path, f"keepstone_backup_{timestamp}.db")
             
             if os.path.exists(db_path):
-                shutil.copy2(db_path, backup_db_path)
-                logger.info(f"Database backup created: {backup_db_path}")
+                # Online backup API: consistent with the WAL and never blocks the app for long
+                backup_database(db_path, backup_db_path,
+                                compression=compression,
+                                pages_per_step=backup_config.get('pages_per_step', DEFAULT_PAGES_PER_STEP),
+                                compression_level=compression_level,
+                                compression_workers=compression_workers)
             else:
                 logger.warning(f"Database file not found: {db_path}")
         
         # Backup images if enabled
-        if backup_images:
+        if include_images:
             storage_config = config.get('storage', {})
             image_path = storage_config.get('image_path', 'static/uploads')
             
@@ -165,17 +237,15 @@ def create_weekly_backup(config):
             if not os.path.isabs(image_path):
                 image_path = os.path.join('/app', image_path)
             
-            if os.path.exists(image_path):
-                archive_path = os.path.join(backup_path, f"keepstone_backup_{timestamp}.tar.gz")
-                
-                # Create tar.gz archive of images
-                import tarfile
-                with tarfile.open(archive_path, 'w:gz') as tar:
-                    tar.add(image_path, arcname='uploads')
-                
-                logger.info(f"Images backup created: {archive_path}")
-            else:
+            if not os.path.exists(image_path):
                 logger.warning(f"Images directory not found: {image_path}")
+            elif backup_config.get('images_mode', 'incremental') == 'incremental':
+                # Deduplicated snapshot: only new or changed uploads are copied
+                backup_images_incremental(image_path, backup_path, snapshot_id=timestamp, keep_snapshots=keep_backups)
+            else:
+                # Full archive of images, compressed in parallel chunks
+                create_archive(image_path, os.path.join(backup_path, f"keepstone_backup_{timestamp}"), 'uploads',
+                               compression=compression, level=compression_level, workers=compression_workers)
         
         # Clean up old backups
         cleanup_old_backups(backup_path, keep_backups)
@@ -189,48 +259,181 @@ def create_weekly_backup(config):
         logger.error(f"Error creating weekly backup: {str(e)}")
         raise
 
-def run_scheduler():
+def run_notifications_job():
+    """Queue notifications for expiring tokens (delivered by the outbox dispatcher)"""
+    session = Session()
     try:
-        
-        # Create database session
-        session = Session()
-        
-        try:
-            # Check expiring tokens
-            check_expiring_tokens(session, config)
-            logger.info("Token check completed")
+        check_expiring_tokens(session, config)
+    finally:
+        session.close()
 
-            # Clean up deleted artifacts
-            cleanup_deleted_artifacts(session)
-            logger.info("Cleanup check completed")
-            
-            # Check if weekly backup should run
-            if should_run_backup(config):
-                logger.info("Starting weekly backup...")
-                create_weekly_backup(config)
-            else:
-                logger.debug("Weekly backup not scheduled for today")
-                
-        except Exception as e:
-            logger.error(f"Error running scheduled tasks: {str(e)}")
-        finally:
-            session.close()
-            
+def run_purge_job():
+    """Permanently delete soft-deleted artifacts past the cleanup threshold"""
+    session = Session()
+    try:
+        cleanup_deleted_artifacts(session)
+    finally:
+        session.close()
+
+def run_maintenance_job():
+    """Re-render missing or stale cached markdown and refresh SQLite planner statistics"""
+    session = Session()
+    try:
+        # Full hash check: also catches rows cached by an older renderer configuration
+        rendered_count = backfill_rendered_content(session)
+        if rendered_count:
+            logger.info(f"Rendered content cached for {rendered_count} artifacts")
+        session.execute(text("PRAGMA optimize"))
+    finally:
+        session.close()
+
+def run_backup_job():
+    """Create the weekly backup if it is due"""
+    if should_run_backup(config):
+        logger.info("Starting weekly backup...")
+        create_weekly_backup(config)
+    else:
+        logger.debug("Weekly backup not scheduled for today")
+
+JOBS = {
+    'notifications': run_notifications_job,
+    'purge': run_purge_job,
+    'maintenance': run_maintenance_job,
+    'backup': run_backup_job,
+}
+
+def run_scheduler():
+    """Run every job once, in order (cron-style invocation)"""
+    try:
+        logger.info(f"SQLite pragmas: {report_sqlite_pragmas()}")
     except Exception as e:
         logger.error(f"Error in scheduler setup: {str(e)}")
-        if 'session' in locals():
-            session.close()
         sys.exit(1)
 
+    for name, job in JOBS.items():
+        try:
+            job()
+            logger.info(f"{name.capitalize()} check completed")
+        except Exception as e:
+            logger.error(f"Error running scheduled task {name}: {str(e)}")
+
+def configure_jobs(job_scheduler, config):
+    """Apply scheduler.<job>_schedule from config; an empty schedule disables the job"""
+    schedules = config.get('scheduler', {})
+    for name, job in JOBS.items():
+        spec = schedules.get(f"{name}_schedule", DEFAULT_JOB_SCHEDULES[name])
+        try:
+            job_scheduler.set_job(name, job, spec)
+        except ScheduleError as e:
+            # Keep the previous schedule rather than dropping the job over a typo
+            logger.error(f"Invalid schedule for job {name}: {str(e)}")
+            if name not in job_scheduler.jobs:
+                job_scheduler.set_job(name, job, DEFAULT_JOB_SCHEDULES[name])
+
+def run_daemon(stop_event):
+    """Run the jobs on their schedules until stop_event is set.
+
+    The config is reloaded, and the jobs rescheduled, whenever the config version
+    in the database changes. A job in progress when stop_event is set finishes first.
+    """
+    global config
+    logger.info(f"SQLite pragmas: {report_sqlite_pragmas()}")
+    # Version first, so a change made while loading is picked up on the first check
+    config_version = get_config_version()
+    config = load_config()
+    check_interval = config.get('scheduler', {}).get('config_check_interval', DEFAULT_CONFIG_CHECK_INTERVAL)
+    job_scheduler = JobScheduler()
+    configure_jobs(job_scheduler, config)
+    logger.info(f"Scheduler daemon started with jobs: {', '.join(job_scheduler.jobs)}")
+
+    while not stop_event.is_set():
+        version = get_config_version()
+        if version is not None and version != config_version:
+            try:
+                config = load_config()
+                config_version = version
+                configure_jobs(job_scheduler, config)
+                logger.info(f"Config version {version} loaded")
+            except Exception as e:
+                logger.error(f"Error reloading config: {str(e)}")
+
+        job_scheduler.run_pending(stop_event=stop_event)
+
+        wait = job_scheduler.seconds_until_next()
+        stop_event.wait(check_interval if wait is None else min(wait, check_interval))
+
+    for name, stats in job_scheduler.stats().items():
+        if stats['runs']:
+            logger.info(f"Job {name}: {stats['runs']} runs, {stats['failures']} failed, "
+                        f"avg {stats['avg_duration']:.2f}s, max {stats['max_duration']:.2f}s")
+    logger.info("Scheduler daemon stopped")
+
+def run_replicator(stop_event):
+    """Replicate until stop_event is set, waiting while replication.enabled is off.
+
+    While disabled, the config is re-read whenever its version changes, so
+    enabling replication in the settings starts it without a restart.
+    """
+    global config
+    config_version = get_config_version()
+    if not config.get('replication', {}).get('enabled', False):
+        logger.info("Replication is disabled (replication.enabled), waiting for it to be enabled")
+    while not stop_event.is_set():
+        if config.get('replication', {}).get('enabled', False):
+            run_replication(config, stop_event)
+            return
+        stop_event.wait(config.get('scheduler', {}).get('config_check_interval', DEFAULT_CONFIG_CHECK_INTERVAL))
+        version = get_config_version()
+        if version is not None and version != config_version:
+            config_version, config = version, load_config()
+
 if __name__ == "__main__":
     import argparse
     
     parser = argparse.ArgumentParser(description='Keepstone Scheduler')
     parser.add_argument('--backup', action='store_true', help='Force run backup now')
     parser.add_argument('--backup-images', action='store_true', help='Include images in forced backup')
+    parser.add_argument('--rebuild-search-index', action='store_true', help='Rebuild the full-text search index from all artifacts')
+    parser.add_argument('--backfill-rendered-content', action='store_true', help='Render and cache markdown HTML for all artifacts')
+    parser.add_argument('--daemon', action='store_true', help='Run the jobs on their configured schedules until stopped')
+    parser.add_argument('--dispatch-outbox', action='store_true', help='Run the notification dispatcher until stopped')
+    parser.add_argument('--replicate', action='store_true', help='Ship database WAL changes to the replica directory until stopped')
+    parser.add_argument('--restore-replica', metavar='TARGET', help='Rebuild the database from the replica into TARGET')
+    parser.add_argument('--restore-time', help='Point in time to restore to (ISO format, local time; default latest)')
+    parser.add_argument('--restore-images', metavar='TARGET', help='Restore an images backup snapshot into TARGET')
+    parser.add_argument('--snapshot', help='Images snapshot id to restore (default latest)')
     args = parser.parse_args()
     
-    if args.backup:
+    if args.daemon or args.dispatch_outbox or args.replicate:
+        import signal
+        import threading
+        stop_event = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+        if args.daemon:
+            run_daemon(stop_event)
+        elif args.dispatch_outbox:
+            run_outbox_dispatcher(config, stop_event)
+        else:
+            run_replicator(stop_event)
+    elif args.restore_images:
+        backup_path = config.get('backup', {}).get('backup_path', '/app/backups')
+        count = restore_image_snapshot(backup_path, args.restore_images, args.snapshot)
+        logger.info(f"Restored {count} images to {args.restore_images}")
+    elif args.restore_replica:
+        restore_time = datetime.fromisoformat(args.restore_time) if args.restore_time else None
+        replica_path = config.get('replication', {}).get('replica_path', '/app/replica')
+        report = restore_replica(replica_path, args.restore_replica, restore_time)
+        logger.info(f"Database restored to {args.restore_replica} as of {report['restored_to']}")
+    elif args.rebuild_search_index:
+        from utils.search_utils import ensure_search_index, rebuild_search_index
+        ensure_search_index()
+        count = rebuild_search_index()
+        logger.info(f"Search index rebuilt with {count} artifacts")
+    elif args.backfill_rendered_content:
+        count = backfill_rendered_content()
+        logger.info(f"Rendered content refreshed for {count} artifacts")
+    elif args.backup:
         logger.info("Running manual backup...")
         # Override backup settings for manual run
         backup_config = config.get('backup', {}).copy()
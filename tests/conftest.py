@@ -211,3 +211,23 @@ def test_db():
     # Cleanup
     if os.path.exists(db_path):
         os.unlink(db_path)
+
+@pytest.fixture(scope="function")
+def db_engine(test_db):
+    """Engine on the test database with every model's table created"""
+    from sqlalchemy import create_engine
+    from models.base import Base
+
+    engine = create_engine(f"sqlite:///{test_db}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture(scope="function")
+def db_session(db_engine):
+    """Session on the test database, closed after the test"""
+    from sqlalchemy.orm import sessionmaker
+
+    session = sessionmaker(bind=db_engine)()
+    yield session
+    session.close()
@@ -0,0 +1,240 @@
+"""
+Unit tests for backup utilities
+"""
+import pytest
+import os
+import gzip
+import sqlite3
+from unittest.mock import patch
+
+# Add project root to path for imports
+import sys
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from utils import backup_utils
+
+@pytest.fixture
+def wal_database(tmp_path):
+    """A WAL-mode database with committed rows still in the -wal file"""
+    db_path = str(tmp_path / 'data.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA wal_autocheckpoint=0")
+    conn.execute("CREATE TABLE artifact (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO artifact (name) VALUES (?)", [(f'artifact {i}' * 20,) for i in range(500)])
+    conn.commit()
+    assert os.path.getsize(db_path + '-wal') > 0
+    yield db_path
+    conn.close()
+
+class TestDatabaseBackup:
+    """Test online database backups"""
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_backup_includes_wal_and_compresses(self, wal_database, tmp_path):
+        """Test that a hot backup captures uncheckpointed commits and round-trips through gzip"""
+        report = backup_utils.backup_database(wal_database, str(tmp_path / 'backup.db'),
+                                              compression='gzip', pages_per_step=4)
+
+        assert report['path'].endswith('backup.db.gz')
+        assert report['steps'] > 1
+        assert report['backup_bytes'] < report['database_bytes']
+        assert not os.path.exists(str(tmp_path / 'backup.db'))
+
+        restored_path = str(tmp_path / 'restored.db')
+        with gzip.open(report['path'], 'rb') as source, open(restored_path, 'wb') as target:
+            target.write(source.read())
+        assert backup_utils.check_integrity(restored_path) == []
+        conn = sqlite3.connect(restored_path)
+        try:
+            assert conn.execute("SELECT COUNT(*) FROM artifact").fetchone()[0] == 500
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'delete'
+        finally:
+            conn.close()
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_corrupt_copy_is_discarded(self, wal_database, tmp_path):
+        """Test that a copy failing the integrity check raises and leaves no file behind"""
+        with patch('utils.backup_utils.check_integrity', return_value=['page 3 is never used']):
+            with pytest.raises(backup_utils.BackupError):
+                backup_utils.backup_database(wal_database, str(tmp_path / 'backup.db'))
+        assert sorted(os.listdir(tmp_path)) == ['data.db', 'data.db-shm', 'data.db-wal']
+
+class TestWeeklyBackup:
+    """Test the scheduler's weekly backup"""
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_create_weekly_backup_writes_compressed_copy(self, wal_database, tmp_path):
+        """Test that create_weekly_backup copies the database and keeps it restorable"""
+        import scheduler
+
+        backup_path = tmp_path / 'backups'
+        config = {
+            'sql_alchemy': {'loc': os.path.dirname(wal_database), 'db': os.path.basename(wal_database)},
+            'backup': {'backup_path': str(backup_path), 'keep_backups': 2, 'backup_database': True,
+                       'backup_images': False, 'compression': 'gzip', 'compression_workers': 1},
+        }
+        with patch.object(scheduler, 'set_last_backup_date') as set_last_backup_date:
+            scheduler.create_weekly_backup(config)
+        set_last_backup_date.assert_called_once()
+
+        backups = os.listdir(backup_path)
+        assert len(backups) == 1 and backups[0].startswith('keepstone_backup_') and backups[0].endswith('.db.gz')
+        restored_path = str(tmp_path / 'restored.db')
+        with gzip.open(backup_path / backups[0], 'rb') as source, open(restored_path, 'wb') as target:
+            target.write(source.read())
+        conn = sqlite3.connect(restored_path)
+        try:
+            assert conn.execute("SELECT COUNT(*) FROM artifact").fetchone()[0] == 500
+        finally:
+            conn.close()
+
+class TestParallelCompression:
+    """Test chunked compression on a process pool"""
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_parallel_gzip_is_standard_gzip(self, tmp_path):
+        """Test that multi-member output decompresses to the original bytes"""
+        data = os.urandom(50000) + b'keepstone ' * 20000
+        source = tmp_path / 'data.db'
+        source.write_bytes(data)
+
+        path = backup_utils.compress_file(str(source), 'gzip', level=1, workers=2)
+        assert path.endswith('.gz') and not source.exists()
+        assert gzip.decompress(open(path, 'rb').read()) == data
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_parallel_zstd_frames(self, tmp_path):
+        """Test that each chunk becomes a zstd frame and the frames decode back in order"""
+        zstandard = pytest.importorskip('zstandard')
+        data = b''.join(f'artifact {i}\n'.encode() for i in range(20000))
+        target = tmp_path / 'data.zst'
+        with open(target, 'wb') as f:
+            with backup_utils.ParallelCompressor(f, 'zstd', workers=2, chunk_size=16384) as compressor:
+                compressor.write(data)
+
+        with open(target, 'rb') as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            assert reader.read() == data
+        assert compressor.bytes_in == len(data)
+        assert compressor.bytes_out == os.path.getsize(target)
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_single_worker_compresses_in_process(self, tmp_path):
+        """Test that one worker starts no process pool and an out-of-range level is clamped for gzip"""
+        uploads = tmp_path / 'uploads'
+        uploads.mkdir()
+        (uploads / 'notes.txt').write_bytes(b'keepstone ' * 10000)
+
+        with patch('utils.backup_utils.ProcessPoolExecutor') as pool:
+            report = backup_utils.create_archive(str(uploads), str(tmp_path / 'backup'), 'uploads',
+                                                 compression='gzip', level=19, workers=1)
+        pool.assert_not_called()
+        assert backup_utils.get_compression_level('gzip', 19) == 9
+        assert backup_utils.get_compression_level('zstd', 19) == 19
+        assert backup_utils.get_compression_level('gzip', 0) == 6
+
+        import tarfile
+        with tarfile.open(report['path'], 'r:gz') as tar:
+            assert tar.extractfile('uploads/notes.txt').read() == b'keepstone ' * 10000
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_archive_readable_by_tarfile(self, tmp_path):
+        """Test that a parallel-compressed archive opens with the standard tarfile reader"""
+        import tarfile
+
+        uploads = tmp_path / 'uploads'
+        uploads.mkdir()
+        for i in range(5):
+            (uploads / f'{i}.png').write_bytes(os.urandom(3000))
+
+        report = backup_utils.create_archive(str(uploads), str(tmp_path / 'backup'), 'uploads',
+                                             compression='gzip', workers=2)
+        assert report['path'].endswith('backup.tar.gz')
+        with tarfile.open(report['path'], 'r:gz') as tar:
+            assert sorted(tar.getnames()) == ['uploads'] + [f'uploads/{i}.png' for i in range(5)]
+            assert tar.extractfile('uploads/3.png').read() == (uploads / '3.png').read_bytes()
+
+class TestIncrementalImageBackup:
+    """Test content-addressed image snapshots"""
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_snapshots_store_new_content_once(self, tmp_path):
+        """Test that unchanged files are neither re-read nor re-stored and snapshots restore exactly"""
+        uploads = tmp_path / 'uploads'
+        (uploads / 'nested').mkdir(parents=True)
+        (uploads / 'a.png').write_bytes(b'a' * 1000)
+        (uploads / 'copy-of-a.png').write_bytes(b'a' * 1000)
+        (uploads / 'nested' / 'b.png').write_bytes(b'b' * 500)
+        backup_path = str(tmp_path / 'backups')
+
+        first = backup_utils.backup_images_incremental(str(uploads), backup_path, snapshot_id='001')
+        assert (first['files'], first['hashed'], first['new_objects'], first['new_bytes']) == (3, 3, 2, 1500)
+
+        (uploads / 'c.png').write_bytes(b'c' * 200)
+        second = backup_utils.backup_images_incremental(str(uploads), backup_path, snapshot_id='002')
+        assert (second['files'], second['hashed'], second['new_objects'], second['new_bytes']) == (4, 1, 1, 200)
+
+        restored = tmp_path / 'restored'
+        assert backup_utils.restore_image_snapshot(backup_path, str(restored), '001') == 3
+        assert (restored / 'nested' / 'b.png').read_bytes() == b'b' * 500
+        assert not (restored / 'c.png').exists()
+        assert os.stat(restored / 'a.png').st_mtime_ns == os.stat(uploads / 'a.png').st_mtime_ns
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_file_changing_during_backup_stays_restorable(self, tmp_path):
+        """Test that an upload rewritten after it was listed is stored under the digest of what was read"""
+        uploads = tmp_path / 'uploads'
+        uploads.mkdir()
+        (uploads / 'a.png').write_bytes(b'before')
+        backup_path = str(tmp_path / 'backups')
+        store_image_object = backup_utils.store_image_object
+
+        def rewrite_then_store(store_path, source_path):
+            with open(source_path, 'wb') as f:
+                f.write(b'rewritten meanwhile')
+            return store_image_object(store_path, source_path)
+
+        with patch('utils.backup_utils.store_image_object', side_effect=rewrite_then_store):
+            backup_utils.backup_images_incremental(str(uploads), backup_path, snapshot_id='001')
+
+        restored = tmp_path / 'restored'
+        assert backup_utils.restore_image_snapshot(backup_path, str(restored), '001') == 1
+        assert (restored / 'a.png').read_bytes() == b'rewritten meanwhile'
+        assert os.listdir(os.path.join(backup_path, 'images', 'tmp')) == []
+
+        # The size and mtime no longer match what was recorded, so the next backup reads it again
+        assert backup_utils.backup_images_incremental(str(uploads), backup_path, snapshot_id='002')['hashed'] == 1
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_pruning_removes_unreferenced_objects(self, tmp_path):
+        """Test that old snapshots are dropped along with objects only they referenced"""
+        uploads = tmp_path / 'uploads'
+        uploads.mkdir()
+        (uploads / 'keep.png').write_bytes(b'keep')
+        (uploads / 'old.png').write_bytes(b'old')
+        backup_path = str(tmp_path / 'backups')
+        backup_utils.backup_images_incremental(str(uploads), backup_path, snapshot_id='001')
+
+        os.remove(uploads / 'old.png')
+        backup_utils.backup_images_incremental(str(uploads), backup_path, snapshot_id='002', keep_snapshots=1)
+
+        assert backup_utils.list_image_snapshots(backup_path) == ['002']
+        objects = [name for _, _, names in os.walk(os.path.join(backup_path, 'images', 'objects')) for name in names]
+        assert len(objects) == 1
+        with pytest.raises(backup_utils.BackupError):
+            backup_utils.restore_image_snapshot(backup_path, str(tmp_path / 'restored'), '001')
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
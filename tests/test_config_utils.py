@@ -152,21 +152,28 @@ class TestConfigLoading:
         
         mock_yaml_content = yaml.dump(test_config)
         
-        with patch('builtins.open', mock_open(read_data=mock_yaml_content)):
-            with patch('utils.config_utils.yaml.safe_load') as mock_yaml_load:
-                mock_yaml_load.return_value = test_config
-                
-                # Import and test the function
-                try:
-                    from utils.config_utils import load_config_from_yaml
-                    result = load_config_from_yaml()
-                    assert result == test_config
-                except ImportError:
-                    pytest.skip("Could not import config utils")
+        from utils.config_utils import clear_yaml_cache
+        clear_yaml_cache()
+        try:
+            with patch('builtins.open', mock_open(read_data=mock_yaml_content)):
+                with patch('utils.config_utils.yaml.safe_load') as mock_yaml_load:
+                    mock_yaml_load.return_value = test_config
+                    
+                    # Import and test the function
+                    try:
+                        from utils.config_utils import load_config_from_yaml
+                        result = load_config_from_yaml()
+                        assert result == test_config
+                    except ImportError:
+                        pytest.skip("Could not import config utils")
+        finally:
+            clear_yaml_cache()
     
     @pytest.mark.config
     def test_config_file_not_found(self):
         """Test handling of missing config file"""
+        from utils.config_utils import clear_yaml_cache
+        clear_yaml_cache()
         with patch('builtins.open', side_effect=FileNotFoundError):
             try:
                 from utils.config_utils import load_config_from_yaml
@@ -174,6 +181,37 @@ class TestConfigLoading:
                 assert result == {}  # Should return empty dict on file not found
             except ImportError:
                 pytest.skip("Could not import config utils")
+    
+    @pytest.mark.config
+    def test_yaml_parsed_once_per_file_change(self, test_config, tmp_path):
+        """Test that config.yaml and derived key sets are cached until the file changes"""
+        from utils import config_utils
+        
+        temp_config_file = str(tmp_path / 'config.yaml')
+        with open(temp_config_file, 'w') as f:
+            yaml.dump(test_config, f)
+        
+        config_utils.clear_yaml_cache()
+        try:
+            with patch('utils.config_utils.CONFIG_PATH', temp_config_file):
+                with patch('utils.config_utils.yaml.safe_load', wraps=yaml.safe_load) as mock_yaml_load:
+                    first = config_utils.load_config_from_yaml()
+                    assert config_utils.load_config_from_yaml() is first
+                    editability = config_utils.get_editability_map()
+                    assert config_utils.get_editability_map() is editability
+                    assert editability['general.default_type'] is True
+                    assert editability['sql_alchemy.loc'] is False
+                    assert mock_yaml_load.call_count == 1
+                    
+                    # Rewriting the file (new size and mtime) triggers a single re-parse
+                    with open(temp_config_file, 'a') as f:
+                        f.write('extra_setting:\n  value: 1\n  edit: true\n')
+                    os.utime(temp_config_file, ns=(0, os.stat(temp_config_file).st_mtime_ns + 1))
+                    
+                    assert config_utils.get_editability_map()['extra_setting'] is True
+                    assert mock_yaml_load.call_count == 2
+        finally:
+            config_utils.clear_yaml_cache()
 
 class TestConfigInitialization:
     """Test configuration initialization"""
@@ -202,6 +240,39 @@ class TestConfigInitialization:
                 except ImportError:
                     pytest.skip("Could not import config utils")
 
+    @pytest.mark.integration
+    @pytest.mark.database
+    def test_get_config_reloads_only_on_version_change(self, db_engine):
+        """Test that the config snapshot is reused until the config version is bumped"""
+        from sqlalchemy.orm import sessionmaker
+        from utils import config_utils
+
+        test_session = sessionmaker(bind=db_engine)
+        config_utils.invalidate_config_cache()
+        try:
+            with patch('utils.config_utils.Session', test_session):
+                with patch('utils.config_utils.load_config', return_value={'trim': {'name': 15}, 'type': ['Token']}) as mock_load:
+                    first = config_utils.get_config()
+                    assert config_utils.get_config() is first
+                    assert mock_load.call_count == 1
+
+                    # Snapshots are read-only
+                    with pytest.raises(TypeError):
+                        first['trim']['name'] = 20
+                    assert first['type'] == ('Token',)
+
+                    # Simulate another worker saving a config change
+                    other_worker = test_session()
+                    config_utils.bump_config_version(other_worker)
+                    other_worker.commit()
+                    other_worker.close()
+
+                    assert config_utils.get_config_version() == 1
+                    assert config_utils.get_config() is not first
+                    assert mock_load.call_count == 2
+        finally:
+            config_utils.invalidate_config_cache()
+
 class TestConfigValidation:
     """Test configuration validation"""
     
@@ -317,25 +388,70 @@ class TestProjectConfigUtils:
             from utils.project_config_utils import get_project_config
             from models.project_config import ProjectConfig
             
+            from utils.project_config_utils import invalidate_project_config_cache
+            invalidate_project_config_cache()
+            
             # Mock a project config with JSON list value
             mock_config = MagicMock()
+            mock_config.project_id = 1
+            mock_config.key = 'type'
             mock_config.get_parsed_value.return_value = ['Token', 'Troubleshoot', 'Information', 'Other']
             
             with patch('utils.project_config_utils.Session') as mock_session_class:
                 mock_session = MagicMock()
                 mock_session_class.return_value = mock_session
                 
-                # Mock query returns our config
-                mock_session.query.return_value.filter_by.return_value.first.return_value = mock_config
+                # Mock the batch query returns our config
+                mock_session.query.return_value.filter.return_value.all.return_value = [mock_config]
                 
                 # Call the function
                 result = get_project_config(1, 'type', [])
                 
                 # Verify it returns the parsed list
                 assert result == ['Token', 'Troubleshoot', 'Information', 'Other']
+            
+            invalidate_project_config_cache()
                 
         except ImportError:
             pytest.skip("Could not import project config utilities")
+    
+    @pytest.mark.integration
+    @pytest.mark.database
+    def test_get_project_configs_batches_and_invalidates(self, db_engine):
+        """Test that configs for many projects load in one query and updates invalidate the cache"""
+        from sqlalchemy import event
+        from sqlalchemy.orm import sessionmaker
+        from models.project_config import ProjectConfig
+        from utils import project_config_utils
+        
+        test_session = sessionmaker(bind=db_engine)
+        
+        setup = test_session()
+        for project_id in range(1, 51):
+            setup.add(ProjectConfig(project_id=project_id, key='type', value=json.dumps([f'Type{project_id}'])))
+        setup.commit()
+        setup.close()
+        
+        statements = []
+        event.listen(db_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        
+        project_config_utils.invalidate_project_config_cache()
+        try:
+            with patch('utils.project_config_utils.Session', test_session):
+                configs = project_config_utils.get_project_configs(range(1, 52))
+                assert len(statements) == 1
+                assert configs[7]['type'] == ['Type7']
+                assert configs[51] == {}
+                
+                # Fully cached now
+                assert project_config_utils.get_project_config(7, 'type') == ['Type7']
+                assert len(statements) == 1
+                
+                assert project_config_utils.update_project_config(7, 'type', ['Changed'])
+                assert project_config_utils.get_project_config(7, 'type') == ['Changed']
+        finally:
+            project_config_utils.invalidate_project_config_cache()
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -0,0 +1,343 @@
+"""
+Unit tests for email notification utilities
+"""
+import pytest
+import os
+import socket
+from datetime import date, timedelta
+
+# Add project root to path for imports
+import sys
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from models.artifact import Artifact
+from models.notification_outbox import NotificationOutbox
+from utils import email_utils
+
+class RecordingHandler:
+    """aiosmtpd handler that keeps every message it receives"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 Message accepted for delivery'
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    """Local SMTP stand-in and a matching email config"""
+    aiosmtpd_controller = pytest.importorskip('aiosmtpd.controller')
+    monkeypatch.setenv('SENDER_EMAIL', 'keepstone@example.com')
+    monkeypatch.delenv('EMAIL_APP_PASSWORD', raising=False)
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    handler = RecordingHandler()
+    controller = aiosmtpd_controller.Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    config = {
+        'maintainer_email': 'maintainer@example.com',
+        'email': {
+            'smtp_server': '127.0.0.1',
+            'smtp_port': port,
+            'use_tls': False,
+            'max_connections': 2,
+            'notification_days': 10,
+            'max_notifications': 3,
+            'notification_interval': 24
+        }
+    }
+    yield config, handler
+    controller.stop()
+
+class TestSMTPConnectionPool:
+    """Test pooled SMTP delivery"""
+
+    @pytest.mark.utils
+    @pytest.mark.integration
+    def test_reconnects_after_dropped_connection(self, smtp_server):
+        """Test that a dropped connection is replaced and the message still sent"""
+        config, handler = smtp_server
+        token = Artifact(name='api-key', content='x', type_name='Token', expiry_date=date.today() + timedelta(days=3))
+
+        with email_utils.SMTPConnectionPool(config) as pool:
+            pool.send(email_utils.build_expiry_message(config, token, 3))
+            pool.send(email_utils.build_expiry_message(config, token, 3))
+            assert pool.connections_opened == 1
+
+            # Simulate the server closing the idle connection
+            pool._idle.queue[0].close()
+            pool.send(email_utils.build_expiry_message(config, token, 3))
+            assert pool.connections_opened == 2
+
+        assert len(handler.messages) == 3
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_outbox_dispatch_reuses_connections(self, smtp_server, db_session):
+        """Test that queued notifications are delivered over a bounded set of connections"""
+        config, handler = smtp_server
+        for i in range(12):
+            db_session.add(Artifact(name=f'token{i}', content='x', type_name='Token',
+                                    expiry_date=date.today() + timedelta(days=5)))
+        db_session.add(Artifact(name='far', content='x', type_name='Token',
+                                expiry_date=date.today() + timedelta(days=60)))
+        db_session.commit()
+
+        assert email_utils.check_expiring_tokens(db_session, config) == 12
+        assert handler.messages == []
+
+        pool = email_utils.SMTPConnectionPool(config)
+        try:
+            report = email_utils.dispatch_outbox(db_session, config, pool=pool, batch_size=5)
+            assert report == {'sent': 12, 'retried': 0, 'dead': 0}
+            assert pool.connections_opened <= 2
+        finally:
+            pool.close()
+
+        assert len(handler.messages) == 12
+        assert all(envelope.rcpt_tos == ['maintainer@example.com'] for envelope in handler.messages)
+        db_session.expire_all()
+        counts = {a.name: a.notification_count for a in db_session.query(Artifact).all()}
+        assert counts.pop('far') == 0
+        assert set(counts.values()) == {1}
+
+        # Nothing is due again until the notification interval has passed
+        assert email_utils.check_expiring_tokens(db_session, config) == 0
+
+class FailingPool:
+    """Stand-in for SMTPConnectionPool whose sends always fail"""
+    max_connections = 1
+
+    def send(self, message):
+        raise ConnectionError('connection refused')
+
+class SentPool:
+    """Stand-in for SMTPConnectionPool that accepts every message"""
+    max_connections = 1
+
+    def __init__(self):
+        self.recipients = []
+
+    def send(self, message):
+        self.recipients.append(message['To'])
+
+class TestNotificationOutbox:
+    """Test queuing and retrying notifications"""
+
+    @pytest.fixture
+    def config(self):
+        return {
+            'maintainer_email': 'maintainer@example.com',
+            'email': {'notification_days': 10, 'max_notifications': 3, 'notification_interval': 24,
+                      'outbox_max_attempts': 3, 'outbox_retry_delay': 60}
+        }
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_scan_queues_each_notification_once(self, db_session, config):
+        """Test that repeated scans don't queue the same notification twice"""
+        for i in range(3):
+            db_session.add(Artifact(name=f'token{i}', content='x', type_name='Token',
+                                    expiry_date=date.today() + timedelta(days=2)))
+        db_session.add(Artifact(name='deleted', content='x', type_name='Token', deleted=True,
+                                expiry_date=date.today() + timedelta(days=2)))
+        db_session.commit()
+
+        assert email_utils.check_expiring_tokens(db_session, config) == 3
+        assert email_utils.check_expiring_tokens(db_session, config) == 0
+        entries = db_session.query(NotificationOutbox).all()
+        assert len(entries) == 3
+        assert {entry.status for entry in entries} == {'pending'}
+        assert all(entry.idempotency_key.endswith(':1') for entry in entries)
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_digest_groups_tokens_per_recipient(self, db_session, config):
+        """Test that digest mode queues one email per member and records each token once on delivery"""
+        from models.project import Project
+        from models.project_member import ProjectMember
+        from models.user import User
+
+        config['email'].update({'digest': True, 'digest_recipients': 'members'})
+        owner = User('owner', 'owner@example.com', 'pw', 'Owner')
+        member = User('member', 'member@example.com', 'pw', 'Member')
+        db_session.add_all([owner, member, Project(id=1, name='Alpha'), Project(id=2, name='Beta')])
+        db_session.flush()
+        db_session.add_all([
+            ProjectMember(project_id=1, user_id=owner.id, role='owner'),
+            ProjectMember(project_id=1, user_id=member.id, role='member'),
+            ProjectMember(project_id=2, user_id=owner.id, role='owner'),
+        ])
+        soon = date.today() + timedelta(days=3)
+        db_session.add_all([
+            Artifact(name='alpha-1', content='x', type_name='Token', project_id=1, expiry_date=soon),
+            Artifact(name='alpha-2', content='x', type_name='Token', project_id=1, expiry_date=soon),
+            Artifact(name='beta-1', content='x', type_name='Token', project_id=2, expiry_date=soon),
+            Artifact(name='orphan', content='x', type_name='Token', expiry_date=soon),
+        ])
+        db_session.commit()
+
+        assert email_utils.check_expiring_tokens(db_session, config) == 3
+        digests = {entry.recipient: entry for entry in db_session.query(NotificationOutbox).all()}
+        assert set(digests) == {'owner@example.com', 'member@example.com', 'maintainer@example.com'}
+        assert digests['owner@example.com'].subject == 'Token Expiry Digest: 3 tokens expiring soon'
+        assert 'beta-1' not in digests['member@example.com'].body
+        assert 'Beta' in digests['owner@example.com'].body
+        assert 'orphan' in digests['maintainer@example.com'].body
+
+        # Nothing is recorded until delivery, and covered tokens are not queued again meanwhile
+        db_session.expire_all()
+        assert {a.notification_count or 0 for a in db_session.query(Artifact).all()} == {0}
+        assert email_utils.check_expiring_tokens(db_session, config) == 0
+
+        pool = SentPool()
+        assert email_utils.dispatch_outbox(db_session, config, pool=pool, batch_size=1)['sent'] == 3
+        db_session.expire_all()
+        assert {a.notification_count for a in db_session.query(Artifact).all()} == {1}
+        assert email_utils.check_expiring_tokens(db_session, config) == 0
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_undelivered_notifications_are_not_recorded_or_requeued(self, db_session, config):
+        """Test that a dead digest uses up no notification and pending per-token rows are not repeated in a digest"""
+        soon = date.today() + timedelta(days=3)
+        db_session.add(Artifact(name='queued', content='x', type_name='Token', expiry_date=soon))
+        db_session.commit()
+        assert email_utils.check_expiring_tokens(db_session, config) == 1
+
+        config['email']['digest'] = True
+        db_session.add(Artifact(name='new', content='x', type_name='Token', expiry_date=soon))
+        db_session.commit()
+        assert email_utils.check_expiring_tokens(db_session, config) == 1
+        digest = db_session.query(NotificationOutbox).filter(NotificationOutbox.artifact_id.is_(None)).one()
+        assert 'queued' not in digest.body and 'new' in digest.body
+
+        config['email']['outbox_max_attempts'] = 1
+        report = email_utils.dispatch_outbox(db_session, config, pool=FailingPool())
+        assert report == {'sent': 0, 'retried': 0, 'dead': 2}
+        db_session.expire_all()
+        assert {a.notification_count or 0 for a in db_session.query(Artifact).all()} == {0}
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_dead_notifications_are_requeued_after_the_interval(self, db_session, config):
+        """Test that a dead-lettered notification is queued again, per token or in a digest, once the interval has passed"""
+        from datetime import datetime
+        from unittest.mock import patch
+
+        db_session.add(Artifact(name='token', content='x', type_name='Token',
+                                expiry_date=date.today() + timedelta(days=5)))
+        db_session.commit()
+        config['email']['outbox_max_attempts'] = 1
+
+        start = datetime.utcnow()
+        queued = []
+        for hours, digest in ((0, False), (1, False), (25, False), (50, True), (51, True), (75, True)):
+            config['email']['digest'] = digest
+            with patch('utils.email_utils.datetime') as mock_datetime:
+                mock_datetime.utcnow.return_value = start + timedelta(hours=hours)
+                queued.append(email_utils.check_expiring_tokens(db_session, config))
+                email_utils.dispatch_outbox(db_session, config, pool=FailingPool())
+
+        # Nothing is queued again within the notification interval of a dead-lettered notification
+        assert queued == [1, 0, 1, 1, 0, 1]
+        entries = db_session.query(NotificationOutbox).order_by(NotificationOutbox.id).all()
+        assert [entry.status for entry in entries] == ['dead'] * 4
+        assert entries[0].idempotency_key == f"expiry:{entries[0].artifact_id}:1:dead:{entries[0].id}"
+        assert db_session.query(Artifact).one().notification_count == 0
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_failed_notifications_back_off_then_dead_letter(self, db_session, config):
+        """Test exponential backoff between attempts and dead-lettering after the last one"""
+        from datetime import datetime
+        from unittest.mock import patch
+
+        db_session.add(Artifact(name='token', content='x', type_name='Token',
+                                expiry_date=date.today() + timedelta(days=2)))
+        db_session.commit()
+        email_utils.check_expiring_tokens(db_session, config)
+        entry = db_session.query(NotificationOutbox).one()
+
+        start = datetime.utcnow()
+        delays = []
+        for attempt in range(3):
+            with patch('utils.email_utils.datetime') as mock_datetime:
+                mock_datetime.utcnow.return_value = start + timedelta(days=attempt)
+                report = email_utils.dispatch_outbox(db_session, config, pool=FailingPool())
+            db_session.refresh(entry)
+            delays.append(entry.next_attempt_at - (start + timedelta(days=attempt)))
+
+        assert report == {'sent': 0, 'retried': 0, 'dead': 1}
+        assert delays[:2] == [timedelta(seconds=60), timedelta(seconds=120)]
+        assert entry.status == 'dead'
+        assert entry.attempts == 3
+        assert 'connection refused' in entry.last_error
+        assert db_session.query(Artifact).one().notification_count == 0
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_purge_removes_old_sent_and_dead_rows(self, db_session, config):
+        """Test that only sent and dead rows past the retention period are purged"""
+        from datetime import datetime
+
+        now = datetime.utcnow()
+        old, recent = now - timedelta(days=31), now - timedelta(days=1)
+        for key, status, created_at, sent_at in (('old-sent', 'sent', old, old), ('recent-sent', 'sent', old, recent),
+                                                 ('old-dead', 'dead', old, None), ('recent-dead', 'dead', recent, None),
+                                                 ('old-pending', 'pending', old, None)):
+            db_session.add(NotificationOutbox(idempotency_key=key, recipient='a@example.com', subject='s', body='b',
+                                              status=status, created_at=created_at, sent_at=sent_at))
+        db_session.commit()
+
+        assert email_utils.purge_outbox(db_session, dict(config, email={'outbox_retention_days': 0})) == 0
+        assert email_utils.purge_outbox(db_session, config, now) == 2
+        remaining = {entry.idempotency_key for entry in db_session.query(NotificationOutbox).all()}
+        assert remaining == {'recent-sent', 'recent-dead', 'old-pending'}
+
+class TestOutboxDispatcher:
+    """Test the long-running notification dispatcher"""
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_reloads_config_and_reconnects_on_email_changes(self):
+        """Test that a config version bump is picked up and only changed email settings replace the pool"""
+        import threading
+        from unittest.mock import patch
+
+        email = {'smtp_server': 'smtp.a.example.com', 'smtp_port': 587, 'outbox_poll_interval': 0.01}
+        configs = iter([{'email': dict(email), 'backup': {}},
+                        {'email': dict(email, smtp_server='smtp.b.example.com')}])
+        versions = iter([1, 1, 2, 3])
+        stop_event = threading.Event()
+        dispatched = []
+
+        def get_version():
+            try:
+                return next(versions)
+            except StopIteration:
+                stop_event.set()
+                return 3
+
+        def dispatch(session, config, pool=None):
+            dispatched.append((config['email']['smtp_server'], pool))
+
+        with patch.object(email_utils, 'get_config_version', side_effect=get_version), \
+             patch.object(email_utils, 'load_config', side_effect=lambda: next(configs)), \
+             patch.object(email_utils, 'dispatch_outbox', side_effect=dispatch), \
+             patch.object(email_utils, 'purge_outbox', return_value=0) as purge_outbox:
+            email_utils.run_outbox_dispatcher({'email': dict(email)}, stop_event)
+
+        assert [server for server, _ in dispatched] == ['smtp.a.example.com'] * 2 + ['smtp.b.example.com'] * 2
+        pools = [pool for _, pool in dispatched]
+        assert pools[0] is pools[1] and pools[2] is pools[3] and pools[1] is not pools[2]
+        assert pools[2].smtp_server == 'smtp.b.example.com'
+        # Old rows are swept on the first loop, then once per OUTBOX_PURGE_INTERVAL
+        assert purge_outbox.call_count == 1
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
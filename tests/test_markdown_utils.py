@@ -0,0 +1,89 @@
+"""
+Unit tests for markdown rendering utilities
+"""
+import pytest
+import os
+from unittest.mock import patch
+
+# Add project root to path for imports
+import sys
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from models.artifact import Artifact
+from utils import markdown_utils
+
+class TestRenderedContent:
+    """Test cached rendered markdown on artifacts"""
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_rerenders_only_when_content_changes(self):
+        """Test that cached HTML is reused until the content hash changes"""
+        artifact = Artifact(name='Runbook', content='# Title\n\n```\ncode\n```')
+
+        with patch('utils.markdown_utils.render_markdown', wraps=markdown_utils.render_markdown) as mock_render:
+            assert '<h1>Title</h1>' in markdown_utils.get_rendered_content(artifact)
+            markdown_utils.get_rendered_content(artifact)
+            assert mock_render.call_count == 1
+
+            artifact.content = '## Changed'
+            assert '<h2>Changed</h2>' in markdown_utils.get_rendered_content(artifact)
+            assert mock_render.call_count == 2
+            assert artifact.content_preview == 'Changed'
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_stale_render_is_flushed_for_the_caller(self, db_session):
+        """Test that a re-render of stale HTML is flushed, not committed, and served from the cache once committed"""
+        db_session.add(Artifact(name='stale', content='new', type_name='Token', content_html='<p>old</p>',
+                                content_hash='x', content_preview='old'))
+        db_session.commit()
+
+        # The caller's other pending changes are not committed along with the render
+        artifact = db_session.query(Artifact).one()
+        artifact.name = 'renamed'
+        assert '<p>new</p>' in markdown_utils.get_rendered_content(artifact, db_session)
+        db_session.rollback()
+        assert (artifact.name, artifact.content_html) == ('stale', '<p>old</p>')
+
+        assert '<p>new</p>' in markdown_utils.get_rendered_content(artifact, db_session)
+        db_session.commit()
+        db_session.close()
+
+        with patch('utils.markdown_utils.render_markdown') as mock_render:
+            artifact = db_session.query(Artifact).one()
+            assert '<p>new</p>' in markdown_utils.get_rendered_content(artifact, db_session)
+            mock_render.assert_not_called()
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_preview_is_plain_text(self):
+        """Test that previews drop markdown syntax and mark truncation"""
+        from models.artifact import PREVIEW_LENGTH
+
+        preview = markdown_utils.build_preview(markdown_utils.render_markdown('**Rotate** the `a & b` key\n\n- one'))
+        assert preview == 'Rotate the a & b key one'
+
+        long_preview = markdown_utils.build_preview(markdown_utils.render_markdown('word ' * 500))
+        assert len(long_preview) == PREVIEW_LENGTH + 1
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_backfill_rendered_content(self, db_session):
+        """Test that the backfill renders missing and stale HTML once"""
+        for i in range(5):
+            db_session.add(Artifact(name=f'a{i}', content=f'**bold {i}**', type_name='Token'))
+        stale = Artifact(name='stale', content='new', type_name='Token', content_html='<p>old</p>', content_hash='x')
+        db_session.add(stale)
+        db_session.commit()
+
+        assert markdown_utils.backfill_rendered_content(db_session, batch_size=2) == 6
+        assert markdown_utils.backfill_rendered_content(db_session, batch_size=2) == 0
+
+        db_session.expire_all()
+        assert '<strong>bold 3</strong>' in db_session.query(Artifact).filter_by(name='a3').one().content_html
+        assert db_session.get(Artifact, stale.id).content_html.strip() == '<p>new</p>'
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
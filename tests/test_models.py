@@ -5,7 +5,7 @@ import pytest
 import tempfile
 import os
 from unittest.mock import patch, MagicMock
-from datetime import datetime
+from datetime import datetime, date
 
 # Add project root to path for imports
 import sys
@@ -129,6 +129,126 @@ class TestProjectModel:
         except ImportError:
             pytest.skip("Could not import Project model")
 
+    @pytest.mark.models
+    @pytest.mark.database
+    def test_listing_stats_query_count_is_constant(self, db_engine, db_session):
+        """Test that project listing stats don't issue queries per project"""
+        from sqlalchemy import event
+        from models.project import Project
+        from models.project_member import ProjectMember
+        from models.artifact import Artifact
+        from models.user import User
+
+        statements = []
+        event.listen(db_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        def count_queries(project_count):
+            user = User(f'user{project_count}', f'u{project_count}@example.com', 'secret', 'Test User')
+            db_session.add(user)
+            for i in range(project_count):
+                project = Project(name=f'Project {project_count}-{i}')
+                db_session.add(project)
+                db_session.flush()
+                db_session.add(ProjectMember(project_id=project.id, user_id=user.id, role='owner'))
+                db_session.add(Artifact(name='a', content='c', type_name='Token', project_id=project.id))
+            db_session.commit()
+            db_session.expunge_all()
+
+            project_ids = [p.id for p in db_session.query(Project).all()]
+            statements.clear()
+            member_counts, owners, artifact_counts = Project.get_listing_stats(db_session, project_ids)
+            owner_names = [owner.user.full_name for owner in owners.values()]
+            assert len(owner_names) == len(project_ids)
+            assert sum(artifact_counts.values()) == len(project_ids)
+            return len(statements)
+
+        assert count_queries(3) == count_queries(30)
+
+    @pytest.mark.models
+    @pytest.mark.database
+    def test_artifact_summary_skips_content(self, db_engine, db_session):
+        """Test that list-view summaries are built without loading content"""
+        from sqlalchemy import event
+        from models.artifact import Artifact, ArtifactSummary
+
+        db_session.add(Artifact(name='with preview', content='x' * 10000, type_name='Token',
+                                content_preview='short', expiry_date=date(2000, 1, 1)))
+        db_session.add(Artifact(name='legacy', content='raw content', type_name='Other'))
+        db_session.commit()
+
+        statements = []
+        event.listen(db_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        rows = db_session.query(*Artifact.summary_columns()).order_by(Artifact.id).all()
+        summaries = [ArtifactSummary(row) for row in rows]
+
+        assert 'AS artifact_content' not in statements[0] and 'AS artifact_images' not in statements[0]
+        assert [s.content_preview for s in summaries] == ['short', 'raw content']
+        assert summaries[0].is_expired() and summaries[0].is_token()
+        assert summaries[1].is_expired() is None
+
+    @pytest.mark.models
+    @pytest.mark.database
+    def test_expiry_status_counts(self, db_session):
+        """Test that the SQL expiry buckets honour the warning threshold and group in one query"""
+        from datetime import timedelta
+        from models.artifact import Artifact
+
+        today = date.today()
+        for offset in (None, -1, 0, 5, 6, 30):
+            expiry_date = today + timedelta(days=offset) if offset is not None else None
+            db_session.add(Artifact(name=f'{offset}', content='c', type_name='Token', project_id=1, expiry_date=expiry_date))
+        db_session.add(Artifact(name='other project', content='c', type_name='Token', project_id=2))
+        db_session.add(Artifact(name='deleted', content='c', type_name='Token', project_id=1, deleted=True))
+        db_session.commit()
+
+        statuses = dict(db_session.query(Artifact.name, Artifact.expiry_status(warning_days=5)).all())
+        assert statuses['None'] == 'no_date'
+        assert statuses['-1'] == 'expired'
+        assert statuses['0'] == statuses['5'] == 'expiring'
+        assert statuses['6'] == statuses['30'] == 'active'
+
+        counts = {(row.project_id, row.type_name, row.expiry_status): row.count
+                  for row in Artifact.get_status_counts(db_session, [1], warning_days=5)}
+        assert counts == {(1, 'Token', 'no_date'): 1, (1, 'Token', 'expired'): 1,
+                          (1, 'Token', 'expiring'): 2, (1, 'Token', 'active'): 2}
+
+    @pytest.mark.models
+    @pytest.mark.database
+    def test_notification_due_matches_eligibility_rules(self, db_engine, db_session):
+        """Test that the SQL notification predicate applies every eligibility rule"""
+        from datetime import timedelta
+        from sqlalchemy import text
+        from models.artifact import Artifact
+
+        config = {'email': {'notification_days': 10, 'max_notifications': 3, 'notification_interval': 24}}
+        soon = date.today() + timedelta(days=5)
+        now = datetime.utcnow()
+        db_session.add_all([
+            Artifact(name='due', content='c', type_name='Token', expiry_date=soon),
+            Artifact(name='due again', content='c', type_name='Token', expiry_date=soon,
+                     notification_count=2, last_notification_sent=now - timedelta(hours=30)),
+            Artifact(name='deleted', content='c', type_name='Token', expiry_date=soon, deleted=True),
+            Artifact(name='limit reached', content='c', type_name='Token', expiry_date=soon, notification_count=3),
+            Artifact(name='recently sent', content='c', type_name='Token', expiry_date=soon,
+                     notification_count=1, last_notification_sent=now - timedelta(hours=2)),
+            Artifact(name='outside window', content='c', type_name='Token', expiry_date=soon + timedelta(days=30)),
+            Artifact(name='expired', content='c', type_name='Token', expiry_date=date.today() - timedelta(days=1)),
+            Artifact(name='not a token', content='c', type_name='Other', expiry_date=soon),
+        ])
+        db_session.commit()
+
+        due = db_session.query(Artifact).filter(Artifact.notification_due(config)).all()
+        assert sorted(a.name for a in due) == ['due', 'due again']
+        assert all(a.can_send_notification(config) for a in due)
+
+        query = db_session.query(Artifact.id).filter(Artifact.notification_due(config))
+        sql = str(query.statement.compile(db_engine, compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(str(row[-1]) for row in db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+        assert 'ix_artifact_deleted_type_count_expiry' in plan
+        assert 'notification_count=?' in plan  # Tokens at their limit are skipped by the seek
+
 class TestConfigModel:
     """Test Config model functionality"""
     
@@ -220,6 +340,32 @@ class TestBaseModel:
         except ImportError:
             pytest.skip("Could not import base model functions")
 
+    @pytest.mark.models
+    @pytest.mark.database
+    def test_sqlite_pragmas_applied_on_connect(self, test_db):
+        """Test that configured pragmas are applied to new connections"""
+        from sqlalchemy import create_engine
+        from models.base import get_sqlite_pragmas, configure_sqlite_engine, get_effective_pragmas
+
+        pragmas = get_sqlite_pragmas({'sql_alchemy': {'busy_timeout': {'value': 1234, 'edit': False}}})
+        test_engine = create_engine(f"sqlite:///{test_db}")
+        configure_sqlite_engine(test_engine, pragmas)
+
+        effective = get_effective_pragmas(test_engine)
+        assert effective['journal_mode'] == 'wal'
+        assert effective['busy_timeout'] == 1234
+        assert effective['synchronous'] == 1  # NORMAL
+        test_engine.dispose()
+
+    @pytest.mark.models
+    @pytest.mark.unit
+    def test_sqlite_pragmas_reject_invalid_values(self):
+        """Test that pragma values from config cannot inject SQL"""
+        from models.base import get_sqlite_pragmas
+
+        with pytest.raises(ValueError):
+            get_sqlite_pragmas({'sql_alchemy': {'journal_mode': {'value': 'WAL; DROP TABLE artifact', 'edit': False}}})
+
 class TestModelRelationships:
     """Test model relationships and constraints"""
     
@@ -0,0 +1,84 @@
+"""
+Unit tests for keyset pagination utilities
+"""
+import pytest
+import os
+from datetime import date, timedelta
+
+# Add project root to path for imports
+import sys
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from models.artifact import Artifact
+from utils.pagination_utils import (
+    keyset_paginate,
+    encode_cursor,
+    decode_cursor,
+    get_page_size,
+    parse_date
+)
+
+@pytest.fixture
+def artifact_session(db_session):
+    """Session with 10 artifacts; every third one has no expiry date"""
+    today = date.today()
+    for i in range(10):
+        db_session.add(Artifact(name=f'a{i}', content='x', type_name='Token', project_id=1,
+                                expiry_date=None if i % 3 == 0 else today + timedelta(days=i % 4)))
+    db_session.commit()
+    return db_session
+
+def paginate(session, page_size, after=None, before=None):
+    query = session.query(Artifact)
+    return keyset_paginate(query, Artifact.expiry_date, Artifact.id, page_size,
+                           after=after, before=before, parse_value=parse_date)
+
+class TestCursors:
+    """Test cursor encoding"""
+
+    @pytest.mark.unit
+    def test_round_trip_with_date_and_null(self):
+        assert decode_cursor(encode_cursor(date(2024, 5, 1), 7), parse_date) == (date(2024, 5, 1), 7)
+        assert decode_cursor(encode_cursor(None, 3), parse_date) == (None, 3)
+
+    @pytest.mark.unit
+    def test_malformed_cursor_is_ignored(self):
+        assert decode_cursor('not-a-cursor') is None
+
+    @pytest.mark.unit
+    def test_page_size_is_clamped(self):
+        assert get_page_size({'pagination': {'page_size': 10}}) == 10
+        assert get_page_size({}, requested='5000') == 200
+        assert get_page_size({}, requested='abc') == 24
+
+class TestKeysetPaginate:
+    """Test walking pages forwards and backwards"""
+
+    @pytest.mark.database
+    def test_forward_walk_matches_full_ordering(self, artifact_session):
+        expected = [a.id for a in artifact_session.query(Artifact)
+                    .order_by(Artifact.expiry_date.asc(), Artifact.id.asc()).all()]
+
+        seen, cursor = [], None
+        while True:
+            page = paginate(artifact_session, 3, after=cursor)
+            seen.extend(a.id for a in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        assert seen == expected
+
+    @pytest.mark.database
+    def test_previous_page_returns_same_items(self, artifact_session):
+        first = paginate(artifact_session, 4)
+        second = paginate(artifact_session, 4, after=first.next_cursor)
+        back = paginate(artifact_session, 4, before=second.prev_cursor)
+
+        assert [a.id for a in back] == [a.id for a in first]
+        assert not back.has_prev
+        assert back.next_cursor == first.next_cursor
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,162 @@
+"""
+Unit tests for WAL shipping replication
+"""
+import pytest
+import os
+import time
+import sqlite3
+from datetime import datetime
+
+# Add project root to path for imports
+import sys
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from utils import replication_utils
+
+@pytest.fixture
+def app_db(tmp_path):
+    """A WAL-mode database with an open application connection"""
+    db_path = str(tmp_path / 'data.db')
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE artifact (id INTEGER PRIMARY KEY, name TEXT)")
+    yield db_path, conn
+    conn.close()
+
+def write_artifacts(conn, count):
+    for _ in range(count):
+        conn.execute("INSERT INTO artifact (name) VALUES (?)", ('x' * 500,))
+
+def artifact_state(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*), SUM(id) FROM artifact").fetchone()
+    finally:
+        conn.close()
+
+class TestWalReplication:
+    """Test shipping WAL segments and point-in-time restore"""
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_restore_to_each_sync_point(self, app_db, tmp_path):
+        """Test that every sync is a recovery point, across WAL restarts"""
+        db_path, conn = app_db
+        replica_path = str(tmp_path / 'replica')
+        checkpoints = []
+        with replication_utils.WalReplicator(db_path, replica_path) as replicator:
+            assert replicator.sync()['new_generation']
+            for round_number in range(4):
+                write_artifacts(conn, 100)
+                if round_number == 1:
+                    conn.execute("DELETE FROM artifact WHERE id % 3 = 0")
+                report = replicator.sync()
+                assert not report['new_generation']
+                assert report['commits'] == 100 + (round_number == 1)
+                checkpoints.append((datetime.now(), conn.execute("SELECT COUNT(*), SUM(id) FROM artifact").fetchone()))
+                time.sleep(0.01)
+
+            # Nothing changed, nothing shipped
+            assert replicator.sync()['bytes'] == 0
+
+        manifest = replication_utils.load_manifest(replica_path)
+        assert len(manifest['generations']) == 1
+        assert len(manifest['generations'][0]['segments']) == 4
+
+        restored_path = str(tmp_path / 'restored.db')
+        for point_in_time, expected in checkpoints:
+            replication_utils.restore_replica(replica_path, restored_path, point_in_time)
+            assert artifact_state(restored_path) == expected
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_new_generation_when_wal_restarted_elsewhere(self, app_db, tmp_path):
+        """Test that losing track of the WAL starts a new base snapshot instead of a gap"""
+        db_path, conn = app_db
+        replica_path = str(tmp_path / 'replica')
+        with replication_utils.WalReplicator(db_path, replica_path) as replicator:
+            replicator.sync()
+            write_artifacts(conn, 10)
+
+        # While no replicator is running the app checkpoints and restarts the WAL
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        write_artifacts(conn, 10)
+
+        with replication_utils.WalReplicator(db_path, replica_path) as replicator:
+            assert replicator.sync()['new_generation']
+
+        restored_path = str(tmp_path / 'restored.db')
+        replication_utils.restore_replica(replica_path, restored_path)
+        assert artifact_state(restored_path)[0] == 20
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_rebases_after_max_segments(self, app_db, tmp_path):
+        """Test that a full generation is replaced by a new base snapshot and idle syncs write nothing"""
+        from unittest.mock import patch
+
+        db_path, conn = app_db
+        replica_path = str(tmp_path / 'replica')
+        with replication_utils.WalReplicator(db_path, replica_path, max_segments=2) as replicator:
+            replicator.sync()
+            for _ in range(2):
+                write_artifacts(conn, 10)
+                assert not replicator.sync()['new_generation']
+            write_artifacts(conn, 10)
+            assert replicator.sync()['new_generation']
+
+            with patch.object(replicator, '_save_manifest', wraps=replicator._save_manifest) as save_manifest:
+                replicator.sync()
+                replicator.sync()
+                write_artifacts(conn, 10)
+                replicator.sync()
+            assert save_manifest.call_count == 1
+
+        manifest = replication_utils.load_manifest(replica_path)
+        assert [len(g['segments']) for g in manifest['generations']] == [2, 1]
+        restored_path = str(tmp_path / 'restored.db')
+        replication_utils.restore_replica(replica_path, restored_path)
+        assert artifact_state(restored_path)[0] == 40
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_base_snapshot_does_not_block_writers(self, app_db, tmp_path):
+        """Test that commits made while a base snapshot is checked succeed and are shipped by the next sync"""
+        from unittest.mock import patch
+
+        db_path, conn = app_db
+        write_artifacts(conn, 10)
+        conn.execute("PRAGMA busy_timeout=0")
+        replica_path = str(tmp_path / 'replica')
+        check_integrity = replication_utils.check_integrity
+
+        def write_during_check(path):
+            write_artifacts(conn, 5)  # Raises 'database is locked' if the write lock were still held
+            return check_integrity(path)
+
+        with replication_utils.WalReplicator(db_path, replica_path) as replicator:
+            with patch.object(replication_utils, 'check_integrity', side_effect=write_during_check):
+                assert replicator.sync()['new_generation']
+            restored_path = str(tmp_path / 'restored.db')
+            replication_utils.restore_replica(replica_path, restored_path)
+            assert artifact_state(restored_path)[0] == 10
+
+            assert replicator.sync()['commits'] == 5
+        replication_utils.restore_replica(replica_path, restored_path)
+        assert artifact_state(restored_path)[0] == 15
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_restore_before_first_generation_fails(self, app_db, tmp_path):
+        """Test that restoring to a time before the replica existed is refused"""
+        db_path, _ = app_db
+        replica_path = str(tmp_path / 'replica')
+        with replication_utils.WalReplicator(db_path, replica_path) as replicator:
+            replicator.sync()
+
+        with pytest.raises(replication_utils.ReplicationError):
+            replication_utils.restore_replica(replica_path, str(tmp_path / 'restored.db'), datetime(2000, 1, 1))
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
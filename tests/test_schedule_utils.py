@@ -0,0 +1,133 @@
+"""
+Unit tests for the scheduler daemon's job scheduling
+"""
+import pytest
+import os
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+# Add project root to path for imports
+import sys
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from utils import schedule_utils
+
+class TestSchedules:
+    """Test parsing schedules and computing next runs"""
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_interval_specs(self):
+        """Test that numbers and interval strings become interval schedules"""
+        assert schedule_utils.parse_schedule(90).seconds == 90
+        assert schedule_utils.parse_schedule('every 5m').seconds == 300
+        assert schedule_utils.parse_schedule('2h').seconds == 7200
+        assert schedule_utils.parse_schedule('45').seconds == 45
+        assert schedule_utils.parse_schedule('') is None
+        with pytest.raises(schedule_utils.ScheduleError):
+            schedule_utils.parse_schedule('every 0m')
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_cron_next_run(self):
+        """Test cron matching across hours, days, months and weekday names"""
+        monday = datetime(2024, 1, 1, 10, 7, 30)
+        assert schedule_utils.parse_schedule('*/15 * * * *').next_run(monday) == datetime(2024, 1, 1, 10, 15)
+        assert schedule_utils.parse_schedule('30 3 * * *').next_run(monday) == datetime(2024, 1, 2, 3, 30)
+        assert schedule_utils.parse_schedule('0 9 * * sat,sun').next_run(monday) == datetime(2024, 1, 6, 9, 0)
+        assert schedule_utils.parse_schedule('0 0 * * 7').next_run(monday) == datetime(2024, 1, 7, 0, 0)
+        assert schedule_utils.parse_schedule('@monthly').next_run(monday) == datetime(2024, 2, 1, 0, 0)
+        assert schedule_utils.parse_schedule('0 12 29 2 *').next_run(monday) == datetime(2024, 2, 29, 12, 0)
+        # Day of month and weekday both restricted: either matches
+        assert schedule_utils.parse_schedule('0 0 15 * mon').next_run(monday) == datetime(2024, 1, 8, 0, 0)
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_invalid_cron(self):
+        """Test that malformed cron expressions are rejected"""
+        for spec in ('* * * *', '61 * * * *', '0 0 * * funday', '0 0 30 2 *'):
+            with pytest.raises(schedule_utils.ScheduleError):
+                schedule_utils.parse_schedule(spec).next_run(datetime(2024, 1, 1))
+
+class TestJobScheduler:
+    """Test running due jobs and recording their durations"""
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_runs_due_jobs_and_records_stats(self):
+        """Test that only due jobs run, failures are recorded and jobs are rescheduled"""
+        calls = []
+        start = datetime.now() - timedelta(minutes=10)
+        job_scheduler = schedule_utils.JobScheduler()
+        job_scheduler.set_job('often', lambda: calls.append('often'), 'every 1m', now=start)
+        job_scheduler.set_job('rare', lambda: calls.append('rare'), 'every 1d', now=start)
+        job_scheduler.set_job('broken', lambda: 1 / 0, 'every 5m', now=start)
+
+        assert job_scheduler.run_pending() == ['often', 'broken']
+        assert calls == ['often']
+        stats = job_scheduler.stats()
+        assert stats['often']['runs'] == 1 and stats['often']['last_duration'] >= 0
+        assert stats['broken']['failures'] == 1
+        # Overdue jobs are not run again to catch up
+        assert job_scheduler.run_pending() == []
+        assert 0 < job_scheduler.seconds_until_next() <= 60
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_set_job_updates_in_place(self):
+        """Test that an unchanged spec keeps the next run and an empty one removes the job"""
+        job_scheduler = schedule_utils.JobScheduler()
+        job = job_scheduler.set_job('purge', lambda: None, 'every 1h')
+        job.runs = 3
+        assert job_scheduler.set_job('purge', lambda: None, 'every 1h') is job
+
+        rescheduled = job_scheduler.set_job('purge', lambda: None, '0 * * * *')
+        assert rescheduled is not job and rescheduled.runs == 3
+
+        job_scheduler.set_job('purge', lambda: None, '')
+        assert job_scheduler.jobs == {}
+
+class TestSchedulerDaemon:
+    """Test the scheduler daemon loop"""
+
+    @pytest.mark.utils
+    @pytest.mark.unit
+    def test_reloads_config_when_version_changes(self):
+        """Test that a config version bump reschedules jobs and the daemon stops on request"""
+        import scheduler
+
+        versions = iter([1, 1, 1, 2])
+        configs = iter([
+            {'scheduler': {'notifications_schedule': 'every 1h', 'purge_schedule': '', 'maintenance_schedule': '',
+                           'backup_schedule': '', 'config_check_interval': 0.01}},
+            {'scheduler': {'notifications_schedule': 'every 1m', 'purge_schedule': '', 'maintenance_schedule': '',
+                           'backup_schedule': ''}},
+        ])
+        stop_event = threading.Event()
+        scheduled = []
+
+        def get_version():
+            try:
+                return next(versions)
+            except StopIteration:
+                stop_event.set()
+                return 2
+
+        def configure_jobs(job_scheduler, config):
+            original_configure_jobs(job_scheduler, config)
+            scheduled.append({name: job.spec for name, job in job_scheduler.jobs.items()})
+
+        original_configure_jobs = scheduler.configure_jobs
+        with patch.object(scheduler, 'get_config_version', side_effect=get_version), \
+             patch.object(scheduler, 'load_config', side_effect=lambda: next(configs)), \
+             patch.object(scheduler, 'configure_jobs', side_effect=configure_jobs), \
+             patch.object(scheduler, 'report_sqlite_pragmas', return_value=''), \
+             patch.object(scheduler, 'config', {'scheduler': {'config_check_interval': 0.01}}):
+            scheduler.run_daemon(stop_event)
+
+        assert scheduled == [{'notifications': 'every 1h'}, {'notifications': 'every 1m'}]
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
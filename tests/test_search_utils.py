@@ -0,0 +1,108 @@
+"""
+Unit tests for full-text search utilities
+"""
+import pytest
+import os
+from unittest.mock import patch
+
+# Add project root to path for imports
+import sys
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from models.artifact import Artifact
+from utils.search_utils import (
+    build_match_query,
+    highlight_snippet,
+    highlight_preview,
+    ensure_search_index,
+    rebuild_search_index,
+    apply_search,
+    search_rank
+)
+
+@pytest.fixture
+def search_session(db_engine, db_session):
+    """Session on a temporary database with the search index installed"""
+    with patch('utils.search_utils.Session', sessionmaker(bind=db_engine)):
+        assert ensure_search_index()
+        yield db_session
+
+def search(session, search_query):
+    query = session.query(Artifact).filter(Artifact.deleted == False)
+    return apply_search(query, Artifact, search_query).order_by(search_rank()).all()
+
+class TestMatchQuery:
+    """Test conversion of user input to FTS5 syntax"""
+
+    @pytest.mark.unit
+    def test_terms_are_quoted_prefix_matches(self):
+        assert build_match_query('api key') == '"api"* "key"*'
+
+    @pytest.mark.unit
+    def test_fts_operators_are_neutralised(self):
+        assert build_match_query('foo" OR NEAR(bar') == '"foo"* "OR"* "NEAR"* "bar"*'
+
+    @pytest.mark.unit
+    def test_empty_input(self):
+        assert build_match_query('  --  ') is None
+
+    @pytest.mark.unit
+    def test_highlight_snippet_escapes_html(self):
+        result = highlight_snippet('<script>\x02token\x03</script>')
+        assert str(result) == '&lt;script&gt;<mark>token</mark>&lt;/script&gt;'
+
+    @pytest.mark.unit
+    def test_highlight_preview_escapes_and_truncates(self):
+        result = highlight_preview('<img src=x onerror=alert(1)> rotate the Token now', 'token', 45)
+        assert str(result) == '&lt;img src=x onerror=alert(1)&gt; rotate the <mark>Token</mark>...'
+        assert str(highlight_preview('a <b>', '', 10)) == 'a &lt;b&gt;'
+
+class TestSearchIndex:
+    """Test the FTS index and its sync triggers"""
+
+    @pytest.mark.database
+    def test_search_ranks_name_matches_first(self, search_session):
+        search_session.add_all([
+            Artifact(name='Runbook', content='Rotate the vault token monthly', type_name='Troubleshoot', project_id=1),
+            Artifact(name='Vault token', content='Expires soon', type_name='Token', project_id=1),
+            Artifact(name='Unrelated', content='Nothing here', type_name='Other', project_id=1),
+        ])
+        search_session.commit()
+
+        results = search(search_session, 'vault')
+        assert [artifact.name for artifact, _, _ in results] == ['Vault token', 'Runbook']
+        assert '\x02vault\x03' in results[1][1].lower()
+
+    @pytest.mark.database
+    def test_triggers_keep_index_in_sync(self, search_session):
+        artifact = Artifact(name='Old name', content='body', type_name='Other', project_id=1,
+                            images=[{'name': 'diagram.png', 'path': 'static/uploads/x.png'}])
+        search_session.add(artifact)
+        search_session.commit()
+        assert len(search(search_session, 'diagram')) == 1
+
+        artifact.name = 'Renamed'
+        search_session.commit()
+        assert search(search_session, 'old') == []
+        assert len(search(search_session, 'renamed')) == 1
+
+        search_session.delete(artifact)
+        search_session.commit()
+        assert search(search_session, 'renamed') == []
+
+    @pytest.mark.database
+    def test_rebuild_backfills_existing_rows(self, search_session):
+        search_session.add(Artifact(name='Backfilled', content='x', type_name='Other', project_id=1))
+        search_session.commit()
+        search_session.execute(text("DELETE FROM artifact_fts"))
+        search_session.commit()
+        assert search(search_session, 'backfilled') == []
+
+        assert rebuild_search_index(search_session) == 1
+        assert len(search(search_session, 'backfilled')) == 1
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,75 @@
+"""
+Unit tests for tool utilities
+"""
+import pytest
+import os
+from unittest.mock import patch
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+# Add project root to path for imports
+import sys
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from utils import tool_utils, project_config_utils
+
+TOOLS_YAML = {
+    'tools': {
+        'project_settings': True,
+        'csv_to_json': {
+            'value': False,
+            'edit': True,
+            'display_name': 'CSV to JSON',
+            'url': '/tools/csv_to_json'
+        }
+    }
+}
+
+@pytest.fixture
+def tools_db(db_engine):
+    """Tools utilities bound to a fresh database and a fixed config.yaml"""
+    test_session = sessionmaker(bind=db_engine)
+    with patch('utils.tool_utils.Session', test_session):
+        with patch('utils.project_config_utils.Session', test_session):
+            with patch('utils.tool_utils.load_config_from_yaml', return_value=TOOLS_YAML):
+                tool_utils.initialize_tools_table()
+                yield db_engine
+    tool_utils.invalidate_enabled_tools()
+    project_config_utils.invalidate_project_config_cache()
+
+class TestToolRegistry:
+    """Test tools registry syncing and caching"""
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_enabled_tools_cached_until_saved(self, tools_db):
+        """Test that enabled tools cost no queries once cached and refresh on save"""
+        statements = []
+        event.listen(tools_db, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        assert tool_utils.get_enabled_tools(1) == []
+        statements.clear()
+        assert tool_utils.get_enabled_tools(1) == []
+        assert statements == []
+
+        assert tool_utils.save_project_tools(1, ['csv_to_json'])
+        assert [tool['name'] for tool in tool_utils.get_enabled_tools(1)] == ['csv_to_json']
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_tools_table_synced_once_per_config(self, tools_db):
+        """Test that the tools table is only rewritten when config.yaml changes"""
+        with patch('utils.tool_utils.initialize_tools_table') as mock_sync:
+            tool_utils.get_available_tools()
+            tool_utils.initialize_project_tools(1)
+            mock_sync.assert_not_called()
+
+        with patch('utils.tool_utils.load_config_from_yaml', return_value={'tools': {}}):
+            with patch('utils.tool_utils.initialize_tools_table') as mock_sync:
+                tool_utils.ensure_tools_synced()
+                mock_sync.assert_called_once()
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
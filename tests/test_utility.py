@@ -185,6 +185,98 @@ class TestDatabaseUtilities:
         except ImportError:
             pytest.skip("Could not import utility functions")
 
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_migrate_indexes_on_existing_database(self, db_engine, db_session):
+        """Test that missing indexes are created once and duplicate configs are removed"""
+        from sqlalchemy import inspect, text
+        from utility import migrate_indexes
+
+        # Simulate a database created before the indexes were declared
+        with db_engine.begin() as conn:
+            for table in ('artifact', 'project_config', 'project_members'):
+                for index in inspect(conn).get_indexes(table):
+                    conn.execute(text(f"DROP INDEX {index['name']}"))
+            conn.execute(text("CREATE INDEX ix_artifact_deleted_type_expiry ON artifact (deleted, type_name, expiry_date)"))
+            conn.execute(text("INSERT INTO artifact (name, content, type_name, created_at, notification_count) "
+                              "VALUES ('old', 'c', 'Token', '2024-01-01', NULL)"))
+            for value in ('"a"', '"b"'):
+                conn.execute(text(
+                    "INSERT INTO project_config (project_id, key, value, created_at, updated_at) "
+                    f"VALUES (1, 'default_type', '{value}', '2024-01-01', '2024-01-01')"
+                ))
+
+        assert migrate_indexes(db_session) == 6
+        assert migrate_indexes(db_session) == 0  # Idempotent
+
+        index_names = {index['name'] for index in inspect(db_engine).get_indexes('project_config')}
+        assert 'uq_project_config_project_key' in index_names
+        assert 'ix_artifact_deleted_type_expiry' not in {index['name'] for index in inspect(db_engine).get_indexes('artifact')}
+        assert db_session.execute(text("SELECT notification_count FROM artifact")).scalar() == 0
+        rows = db_session.execute(text("SELECT value FROM project_config")).fetchall()
+        assert [row[0] for row in rows] == ['"a"']
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_migrate_database_from_baseline_schema(self, db_engine, capsys):
+        """Test that upgrading a database without the new columns and indexes runs every migration step"""
+        from sqlalchemy import inspect, text
+        from utility import migrate_database
+
+        # Simulate a database created before the cached render, preview, digest columns and indexes
+        with db_engine.begin() as conn:
+            for table in ('artifact', 'project_config', 'project_members'):
+                for index in inspect(conn).get_indexes(table):
+                    conn.execute(text(f"DROP INDEX {index['name']}"))
+            for column in ('content_html', 'content_hash', 'content_preview'):
+                conn.execute(text(f"ALTER TABLE artifact DROP COLUMN {column}"))
+            conn.execute(text("ALTER TABLE notification_outbox DROP COLUMN covered_artifacts"))
+            conn.execute(text(
+                "INSERT INTO notification_outbox (id, idempotency_key, recipient, subject, body, status, attempts, "
+                "next_attempt_at, created_at) VALUES (7, 'expiry:1:1', 'a@example.com', 's', 'b', 'dead', 5, "
+                "'2024-01-01', '2024-01-01')"
+            ))
+
+        with patch('models.base.engine', db_engine):
+            migrate_database()
+        output = capsys.readouterr().out
+        assert 'Warning' not in output and 'Migration error' not in output
+
+        inspector = inspect(db_engine)
+        artifact_columns = {column['name'] for column in inspector.get_columns('artifact')}
+        assert {'content_html', 'content_hash', 'content_preview'} <= artifact_columns
+        assert 'covered_artifacts' in {column['name'] for column in inspector.get_columns('notification_outbox')}
+        with db_engine.connect() as conn:
+            keys = conn.execute(text("SELECT idempotency_key FROM notification_outbox")).scalars().all()
+        assert keys == ['expiry:1:1:dead:7']
+        # The steps after the column migrations still ran
+        assert 'ix_artifact_project_deleted_expiry' in {index['name'] for index in inspector.get_indexes('artifact')}
+
+    @pytest.mark.utils
+    @pytest.mark.database
+    def test_cleanup_deleted_artifacts_in_batches(self, db_session, tmp_path):
+        """Test that only expired soft-deleted artifacts are purged and their images reclaimed"""
+        from datetime import datetime, timedelta
+        from models.artifact import Artifact
+        import scheduler
+
+        long_ago = datetime.utcnow() - timedelta(days=30)
+        for i in range(5):
+            image = tmp_path / f"image{i}.png"
+            image.write_bytes(b'x' * 100)
+            db_session.add(Artifact(name=f'old{i}', content='x', type_name='Token', deleted=True, deleted_at=long_ago,
+                                    images=[{'path': str(image)}]))
+        db_session.add(Artifact(name='recent', content='x', type_name='Token', deleted=True, deleted_at=datetime.utcnow()))
+        db_session.add(Artifact(name='live', content='x', type_name='Token'))
+        db_session.commit()
+
+        report = scheduler.cleanup_deleted_artifacts(db_session, batch_size=2)
+        assert report == {'artifacts': 5, 'files': 5, 'failed_files': 0, 'bytes': 500}
+        assert list(tmp_path.iterdir()) == []
+        assert sorted(a.name for a in db_session.query(Artifact).all()) == ['live', 'recent']
+
+        assert scheduler.cleanup_deleted_artifacts(db_session)['artifacts'] == 0
+
 class TestFileHandling:
     """Test file handling utilities"""
     
@@ -1,9 +1,10 @@
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import and_, text
+from sqlalchemy import and_, text, inspect
 import os
 from werkzeug.utils import secure_filename
 import uuid
 from utils.config_utils import initialize_config_table
+from utils.search_utils import ensure_search_index
 import sys
 parent_dir = ".."
 sys.path.append(parent_dir)
@@ -11,6 +12,8 @@ sys.path.append(parent_dir)
 import models.artifact
 import models.base
 import models.config
+import models.config_version
+import models.notification_outbox
 import models.project
 import models.project_config
 import models.user
@@ -29,6 +32,9 @@ def create_database(session=None, config=None):
     
     models.base.Base.metadata.create_all(models.base.engine)
 
+    # Full-text search index over artifacts (created and backfilled on first run)
+    ensure_search_index()
+
     # Types are now managed at project level via project_config table
     # No need to insert global types
 
@@ -73,6 +79,52 @@ def migrate_database():
                     print(f"Warning: Could not add updated_at column: {e}")
                 session.rollback()
         
+        # Check if artifact table has the rendered content and preview columns (new tables get them from create_all)
+        artifact_columns = get_table_columns(session, 'artifact')
+        missing_columns = [column for column in ("content_html TEXT", "content_hash VARCHAR(64)", "content_preview VARCHAR(501)")
+                           if artifact_columns and column.split()[0] not in artifact_columns]
+        if not missing_columns:
+            print("Artifact table already has rendered content columns")
+        else:
+            print("Migrating artifact table...")
+            
+            for column in missing_columns:
+                try:
+                    session.execute(text(f"ALTER TABLE artifact ADD COLUMN {column}"))
+                    session.commit()
+                    print(f"Added {column.split()[0]} column to artifact table")
+                except Exception as e:
+                    if "duplicate column name" not in str(e).lower():
+                        print(f"Warning: Could not add {column.split()[0]} column: {e}")
+                    session.rollback()
+        
+        # Check if the notification outbox records which tokens a digest covers
+        outbox_columns = get_table_columns(session, 'notification_outbox')
+        if outbox_columns and 'covered_artifacts' not in outbox_columns:
+            try:
+                session.execute(text("ALTER TABLE notification_outbox ADD COLUMN covered_artifacts JSON"))
+                session.commit()
+                print("Added covered_artifacts column to notification_outbox table")
+            except Exception as e:
+                if "duplicate column name" not in str(e).lower():
+                    print(f"Warning: Could not add covered_artifacts column: {e}")
+                session.rollback()
+        
+        # Dead-lettered notifications give up their idempotency key so they can be queued again
+        if outbox_columns:
+            try:
+                released = session.execute(
+                    text("UPDATE notification_outbox SET idempotency_key = idempotency_key || :suffix || id "
+                         "WHERE status = 'dead' AND idempotency_key NOT LIKE :released"),
+                    {'suffix': ':dead:', 'released': '%:dead:%'}
+                ).rowcount
+                session.commit()
+                if released:
+                    print(f"Released the idempotency keys of {released} dead-lettered notifications")
+            except Exception as e:
+                print(f"Warning: Could not release dead-lettered notification keys: {e}")
+                session.rollback()
+        
         # Check if project_members table exists
         try:
             session.execute(text("SELECT COUNT(*) FROM project_members LIMIT 1"))
@@ -139,6 +191,13 @@ def migrate_database():
             print(f"Warning: Could not fix project owners: {e}")
             session.rollback()
         
+        # Create composite indexes declared on the models for existing databases
+        try:
+            migrate_indexes(session)
+        except Exception as e:
+            print(f"Warning: Could not create indexes: {e}")
+            session.rollback()
+        
         session.close()
         print("Database migration completed")
         
@@ -147,6 +206,55 @@ def migrate_database():
         if 'session' in locals():
             session.close()
 
+def get_table_columns(session, table_name):
+    """
+    Names of a table's columns, or an empty set if the table doesn't exist.
+    Inspects the session's current connection, so it is safe to call after a commit.
+    """
+    inspector = inspect(session.connection())
+    if not inspector.has_table(table_name):
+        return set()
+    return {column['name'] for column in inspector.get_columns(table_name)}
+
+def migrate_indexes(session):
+    """
+    Create the indexes declared on the models if they are missing (idempotent).
+    Tables that don't exist yet are skipped - create_all() builds them with their indexes.
+    """
+    existing_tables = set(inspect(session.connection()).get_table_names())
+    
+    # Remove duplicate project configs before adding the unique (project_id, key) index,
+    # keeping the oldest row which is the one lookups have been returning
+    if 'project_config' in existing_tables:
+        result = session.execute(text(
+            "DELETE FROM project_config WHERE id NOT IN "
+            "(SELECT MIN(id) FROM project_config GROUP BY project_id, key)"
+        ))
+        if result.rowcount:
+            print(f"Removed {result.rowcount} duplicate project config rows")
+    
+    # Replaced by an index with notification_count ahead of the expiry range, which
+    # notification_due can only seek for non-NULL counts
+    session.execute(text("DROP INDEX IF EXISTS ix_artifact_deleted_type_expiry"))
+    if 'artifact' in existing_tables:
+        session.execute(text("UPDATE artifact SET notification_count = 0 WHERE notification_count IS NULL"))
+    
+    created_count = 0
+    for table in (models.artifact.Artifact.__table__,
+                  models.project_config.ProjectConfig.__table__,
+                  models.project_member.ProjectMember.__table__):
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = {index['name'] for index in inspect(session.connection()).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=session.connection())
+                created_count += 1
+    
+    session.commit()
+    print(f"Index migration completed: created {created_count} indexes")
+    return created_count
+
 def migrate_user_default_projects():
     """
     Add default_project_id column to users table for per-user default projects
@@ -267,9 +375,15 @@ def save_image(file, config):
     return os.path.join(config['storage']['image_path'], unique_name)
 
 def delete_image(image_path):
-    """Delete image from disk"""
+    """Delete image from disk, returning the number of bytes freed"""
     full_path = os.path.join(os.path.dirname(__file__), image_path)
     if os.path.exists(full_path):
+        try:
+            size = os.path.getsize(full_path)
+        except OSError:
+            size = 0
         os.remove(full_path)
+        return size
+    return 0
 
 
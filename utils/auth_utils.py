@@ -3,7 +3,7 @@ Authentication utilities for KeepStone application
 """
 
 from functools import wraps
-from flask import redirect, url_for, flash, request, session
+from flask import redirect, url_for, flash, request, session, g
 from flask_login import current_user
 
 def login_required(f):
@@ -142,6 +142,59 @@ def format_user_for_display(user):
         'notes': user.notes or ''
     }
 
+class UserAccessContext:
+    """Project access for one user, loaded with a single membership query"""
+    
+    def __init__(self, db_session, user):
+        from models.project_member import ProjectMember
+        from sqlalchemy.orm import joinedload
+        
+        memberships = db_session.query(ProjectMember).options(
+            joinedload(ProjectMember.project)
+        ).filter_by(
+            user_id=user.id,
+            is_active=True
+        ).all()
+        
+        self.is_admin = user.is_admin
+        self.memberships = {membership.project_id: membership for membership in memberships}
+        self.project_ids = [membership.project_id for membership in memberships]
+        self.projects = sorted((membership.project for membership in memberships), key=lambda p: p.name)
+        
+        # The personal default only counts while the user still has access to it
+        self.default_project = None
+        if user.default_project_id:
+            membership = self.memberships.get(user.default_project_id)
+            if membership:
+                self.default_project = membership.project
+            else:
+                user.default_project_id = None
+    
+    @property
+    def default_project_id(self):
+        return self.default_project.id if self.default_project else None
+    
+    def is_member(self, project_id):
+        """Check if the user is an active member of the project"""
+        try:
+            return int(project_id) in self.memberships
+        except (ValueError, TypeError):
+            return False
+    
+    def has_access(self, project_id):
+        """Check artifact access; admins can access every project"""
+        return self.is_admin or self.is_member(project_id)
+
+def get_access_context(db_session):
+    """Get the current user's access context, computed once per request"""
+    if 'access_context' not in g:
+        g.access_context = UserAccessContext(db_session, current_user)
+    return g.access_context
+
+def invalidate_access_context():
+    """Drop the cached access context after memberships or the default project change"""
+    g.pop('access_context', None)
+
 def log_user_activity(user, activity, details=None):
     """Log user activity (placeholder for future audit trail)"""
     # This could be expanded to log to a database table or file
@@ -0,0 +1,457 @@
+"""
+Backup utilities: hot SQLite database backups via the online backup API and
+content-addressed, incremental image backups
+"""
+
+import os
+import gzip
+import json
+import shutil
+import sqlite3
+import hashlib
+import time
+import logging
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# zstd compression is optional; gzip is used when the zstandard package is missing
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Pages copied per backup step; the source database is only locked for one step at a time
+DEFAULT_PAGES_PER_STEP = 256
+# Seconds to wait before retrying a step when the source is busy
+BACKUP_STEP_SLEEP = 0.05
+
+# Uncompressed bytes per independently compressed chunk in parallel compression
+PARALLEL_CHUNK_SIZE = 4 * 1024 * 1024
+DEFAULT_COMPRESSION_LEVELS = {'gzip': 6, 'zstd': 3}
+COMPRESSION_LEVEL_RANGES = {'gzip': (1, 9), 'zstd': (1, 22)}
+
+# Image store layout under the backup path:
+#   images/objects/<sha256[:2]>/<sha256[2:]>  each distinct file stored once
+#   images/snapshots/<id>.json                 path -> hash manifest per backup
+#   images/index.json                          size/mtime -> hash cache of the last backup
+IMAGE_STORE_DIR = 'images'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+COMPRESSION_EXTENSIONS = {
+    'none': '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+class BackupError(Exception):
+    """Raised when a backup copy is incomplete or fails its integrity check"""
+
+def get_compression(name):
+    """Normalise a compression setting, falling back to gzip when zstd is unavailable"""
+    name = (name or 'none').lower()
+    if name not in COMPRESSION_EXTENSIONS:
+        logger.warning(f"Unknown backup compression '{name}', using gzip")
+        return 'gzip'
+    if name == 'zstd' and zstandard is None:
+        logger.warning("zstandard is not installed, using gzip for backup compression")
+        return 'gzip'
+    return name
+
+def get_compression_level(compression, level):
+    """Level to compress with: the codec default for 0 or None, clamped to the codec's range"""
+    if compression not in COMPRESSION_LEVEL_RANGES:
+        return None
+    if not level:
+        return DEFAULT_COMPRESSION_LEVELS[compression]
+    low, high = COMPRESSION_LEVEL_RANGES[compression]
+    if not low <= level <= high:
+        clamped = min(max(level, low), high)
+        logger.warning(f"Compression level {level} is out of range for {compression} ({low}-{high}), using {clamped}")
+        return clamped
+    return level
+
+def get_compression_workers(workers):
+    """Worker processes to compress with; 0 or None means one per CPU"""
+    return workers or os.cpu_count() or 1
+
+def compress_chunk(compression, level, data):
+    """Compress one chunk as a self-contained gzip member or zstd frame"""
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+class ParallelCompressor:
+    """Writable file object compressing fixed-size chunks on a process pool.
+
+    Each chunk becomes its own gzip member or zstd frame and is written in
+    order, so the output is a standard multi-member gzip file (readable by
+    gzip, pigz and Python's gzip module) or multi-frame zstd file. At most two
+    chunks per worker are in flight, which bounds memory use.
+    """
+
+    def __init__(self, target, compression, level=None, workers=None, chunk_size=PARALLEL_CHUNK_SIZE):
+        self.target = target
+        self.compression = compression
+        self.level = get_compression_level(compression, level)
+        self.workers = get_compression_workers(workers)
+        self.chunk_size = chunk_size
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(cancel_futures=True)
+
+    def write(self, data):
+        self._buffer += data
+        self.bytes_in += len(data)
+        while len(self._buffer) >= self.chunk_size:
+            self._submit(bytes(self._buffer[:self.chunk_size]))
+            del self._buffer[:self.chunk_size]
+        return len(data)
+
+    def _submit(self, chunk):
+        self._pending.append(self._executor.submit(compress_chunk, self.compression, self.level, chunk))
+        while len(self._pending) >= self.workers * 2:
+            self._write_next()
+
+    def _write_next(self):
+        compressed = self._pending.popleft().result()
+        self.target.write(compressed)
+        self.bytes_out += len(compressed)
+
+    def close(self):
+        """Compress what is buffered, write every pending chunk and stop the workers"""
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self._write_next()
+        self._executor.shutdown()
+
+class CountingWriter:
+    """Write-through file object counting the bytes written to it"""
+
+    def __init__(self, target):
+        self.target = target
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.target.write(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+def open_stream_compressor(target, compression, level):
+    """Single-stream compressing writer over target (left open when the writer is closed)"""
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=level).stream_writer(target, closefd=False)
+    return gzip.GzipFile(fileobj=target, mode='wb', compresslevel=level, mtime=0)
+
+def compress_file(source_path, compression, level=None, workers=1):
+    """Compress a file next to itself, remove the original and return the new path.
+    With more than one worker the file is compressed in parallel chunks."""
+    target_path = source_path + COMPRESSION_EXTENSIONS[compression]
+    level = get_compression_level(compression, level)
+    with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+        if get_compression_workers(workers) > 1:
+            with ParallelCompressor(target, compression, level, workers) as compressor:
+                shutil.copyfileobj(source, compressor, PARALLEL_CHUNK_SIZE)
+        elif compression == 'zstd':
+            compressor = zstandard.ZstdCompressor(level=level)
+            compressor.copy_stream(source, target)
+        else:
+            with gzip.GzipFile(fileobj=target, mode='wb', compresslevel=level) as gz:
+                shutil.copyfileobj(source, gz, 1024 * 1024)
+    os.remove(source_path)
+    return target_path
+
+def create_archive(source_path, archive_base, arcname, compression='gzip', level=None, workers=None):
+    """Tar a directory into archive_base + .tar[.gz|.zst], compressing on a process pool.
+    With one worker the archive is compressed as a single stream in this process.
+    Returns a report with the archive path, sizes and duration."""
+    import tarfile
+
+    compression = get_compression(compression)
+    archive_path = f"{archive_base}.tar{COMPRESSION_EXTENSIONS[compression]}"
+    start = time.monotonic()
+    with open(archive_path, 'wb') as target:
+        if compression == 'none':
+            with tarfile.open(fileobj=target, mode='w|') as tar:
+                tar.add(source_path, arcname=arcname)
+            bytes_in = bytes_out = target.tell()
+        elif get_compression_workers(workers) == 1:
+            # A pool of one only adds pickling and process overhead
+            with open_stream_compressor(target, compression, get_compression_level(compression, level)) as compressor:
+                counter = CountingWriter(compressor)
+                with tarfile.open(fileobj=counter, mode='w|') as tar:
+                    tar.add(source_path, arcname=arcname)
+            bytes_in, bytes_out = counter.bytes_written, target.tell()
+        else:
+            with ParallelCompressor(target, compression, level, workers) as compressor:
+                with tarfile.open(fileobj=compressor, mode='w|') as tar:
+                    tar.add(source_path, arcname=arcname)
+            bytes_in, bytes_out = compressor.bytes_in, compressor.bytes_out
+
+    report = {'path': archive_path, 'bytes_in': bytes_in, 'bytes_out': bytes_out,
+              'duration': time.monotonic() - start}
+    logger.info(f"Archive created: {archive_path} ({bytes_in} bytes -> {bytes_out} bytes, "
+                f"{report['duration']:.2f}s)")
+    return report
+
+def check_integrity(db_path):
+    """Run PRAGMA integrity_check on a database file, returning the problems found"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("PRAGMA integrity_check").fetchall()
+    finally:
+        conn.close()
+    problems = [row[0] for row in rows]
+    return [] if problems == ['ok'] else problems
+
+def backup_database(db_path, backup_path, compression='none', pages_per_step=DEFAULT_PAGES_PER_STEP,
+                    compression_level=None, compression_workers=1):
+    """Copy a live SQLite database with the online backup API.
+
+    Pages are copied pages_per_step at a time so readers and writers are only
+    held up for one step, and changes committed to the WAL while the copy runs
+    are picked up. The copy is checked with PRAGMA integrity_check before it is
+    (optionally) compressed. Returns a report with the final path, sizes,
+    duration and pages per second; raises BackupError if the copy is corrupt.
+    """
+    compression = get_compression(compression)
+    partial_path = backup_path + '.partial'
+    start = time.monotonic()
+    progress = {'steps': 0, 'pages': 0}
+
+    def on_progress(status, remaining, total):
+        progress['steps'] += 1
+        progress['pages'] = total
+
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(partial_path)
+    try:
+        source.backup(target, pages=pages_per_step, progress=on_progress, sleep=BACKUP_STEP_SLEEP)
+        # The copy is a standalone file, not a WAL database with a missing -wal
+        target.execute("PRAGMA journal_mode=DELETE")
+    except Exception:
+        target.close()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+    copy_seconds = time.monotonic() - start
+
+    problems = check_integrity(partial_path)
+    if problems:
+        os.remove(partial_path)
+        raise BackupError(f"Backup of {db_path} failed integrity check: {'; '.join(problems[:5])}")
+
+    os.replace(partial_path, backup_path)
+    database_bytes = os.path.getsize(backup_path)
+    if compression != 'none':
+        backup_path = compress_file(backup_path, compression, compression_level, compression_workers)
+
+    duration = time.monotonic() - start
+    report = {
+        'path': backup_path,
+        'compression': compression,
+        'pages': progress['pages'],
+        'steps': progress['steps'],
+        'database_bytes': database_bytes,
+        'backup_bytes': os.path.getsize(backup_path),
+        'duration': duration,
+        'pages_per_second': progress['pages'] / copy_seconds if copy_seconds else 0.0,
+    }
+    logger.info(f"Database backup created: {backup_path} ({report['pages']} pages, "
+                f"{report['database_bytes']} bytes -> {report['backup_bytes']} bytes, "
+                f"{duration:.2f}s, {report['pages_per_second']:.0f} pages/s)")
+    return report
+
+def hash_file(path):
+    """SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def store_image_object(store_path, source_path):
+    """Copy a file into the object store, hashing the bytes as they are copied.
+
+    The object is named after the digest of what was actually read, so a file
+    changing during the backup can never leave an object whose content does
+    not match its name. Returns (digest, bytes copied, whether it was new).
+    """
+    temp_dir = os.path.join(store_path, 'tmp')
+    os.makedirs(temp_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+    try:
+        digest = hashlib.sha256()
+        size = 0
+        with open(source_path, 'rb') as source, os.fdopen(fd, 'wb') as target:
+            for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                target.write(chunk)
+                size += len(chunk)
+        digest = digest.hexdigest()
+
+        object_path = _object_path(store_path, digest)
+        if os.path.exists(object_path):
+            os.remove(temp_path)
+            return digest, size, False
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(temp_path, object_path)
+        return digest, size, True
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _write_json_atomic(path, data):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+def get_image_store(backup_path):
+    """Directory of the content-addressed image store inside a backup path"""
+    return os.path.join(backup_path, IMAGE_STORE_DIR)
+
+def _object_path(store_path, digest):
+    return os.path.join(store_path, 'objects', digest[:2], digest[2:])
+
+def list_image_snapshots(backup_path):
+    """Ids of the stored image snapshots, oldest first"""
+    snapshots_path = os.path.join(get_image_store(backup_path), 'snapshots')
+    if not os.path.isdir(snapshots_path):
+        return []
+    return sorted(name[:-len('.json')] for name in os.listdir(snapshots_path) if name.endswith('.json'))
+
+def load_image_snapshot(backup_path, snapshot_id=None):
+    """Manifest of an image snapshot (the latest if snapshot_id is None)"""
+    snapshots = list_image_snapshots(backup_path)
+    if snapshot_id is None and snapshots:
+        snapshot_id = snapshots[-1]
+    if snapshot_id not in snapshots:
+        raise BackupError(f"Image snapshot not found: {snapshot_id}")
+    return _read_json(os.path.join(get_image_store(backup_path), 'snapshots', f"{snapshot_id}.json"), None)
+
+def backup_images_incremental(image_path, backup_path, snapshot_id=None, keep_snapshots=None):
+    """Back up an image directory into the content-addressed store.
+
+    Files whose size and mtime match the previous backup reuse its hash without
+    being read; new contents are copied into the store once per SHA-256, so a
+    snapshot costs time and space in proportion to new uploads. Snapshots beyond
+    keep_snapshots are removed together with objects no snapshot references.
+    Returns a report of files seen, hashed and stored.
+    """
+    start = time.monotonic()
+    store_path = get_image_store(backup_path)
+    os.makedirs(os.path.join(store_path, 'snapshots'), exist_ok=True)
+    index_path = os.path.join(store_path, 'index.json')
+    index = _read_json(index_path, {})
+    snapshot_id = snapshot_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    files = {}
+    report = {'snapshot': snapshot_id, 'files': 0, 'hashed': 0, 'new_objects': 0, 'new_bytes': 0, 'total_bytes': 0}
+    for root, _, names in os.walk(image_path):
+        for name in sorted(names):
+            full_path = os.path.join(root, name)
+            relative_path = os.path.relpath(full_path, image_path).replace(os.sep, '/')
+            stat = os.stat(full_path)
+
+            entry = index.get(relative_path)
+            unchanged = entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+            if unchanged and os.path.exists(_object_path(store_path, entry['sha256'])):
+                digest, size = entry['sha256'], entry['size']
+            else:
+                # Hashed during the copy, so the stored object always matches its name
+                digest, size, stored = store_image_object(store_path, full_path)
+                report['hashed'] += 1
+                if stored:
+                    report['new_objects'] += 1
+                    report['new_bytes'] += size
+
+            # The mtime is from before the read: a file modified meanwhile is re-read next time
+            files[relative_path] = {'sha256': digest, 'size': size, 'mtime_ns': stat.st_mtime_ns}
+            report['files'] += 1
+            report['total_bytes'] += size
+
+    _write_json_atomic(os.path.join(store_path, 'snapshots', f"{snapshot_id}.json"),
+                       {'id': snapshot_id, 'created_at': datetime.now().isoformat(), 'files': files})
+    _write_json_atomic(index_path, files)
+
+    if keep_snapshots:
+        prune_image_snapshots(backup_path, keep_snapshots)
+
+    report['duration'] = time.monotonic() - start
+    logger.info(f"Images snapshot {snapshot_id}: {report['files']} files ({report['total_bytes']} bytes), "
+                f"{report['hashed']} hashed, {report['new_objects']} new objects ({report['new_bytes']} bytes), "
+                f"{report['duration']:.2f}s")
+    return report
+
+def prune_image_snapshots(backup_path, keep_snapshots):
+    """Remove the oldest image snapshots beyond keep_snapshots and unreferenced objects"""
+    store_path = get_image_store(backup_path)
+    snapshots = list_image_snapshots(backup_path)
+    removed = snapshots[:-keep_snapshots] if keep_snapshots > 0 else []
+    if not removed:
+        return 0
+    for snapshot_id in removed:
+        os.remove(os.path.join(store_path, 'snapshots', f"{snapshot_id}.json"))
+        logger.info(f"Removed old images snapshot: {snapshot_id}")
+
+    referenced = set()
+    for snapshot_id in snapshots[-keep_snapshots:]:
+        referenced.update(entry['sha256'] for entry in load_image_snapshot(backup_path, snapshot_id)['files'].values())
+
+    removed_objects = 0
+    objects_path = os.path.join(store_path, 'objects')
+    for prefix in os.listdir(objects_path) if os.path.isdir(objects_path) else []:
+        for name in os.listdir(os.path.join(objects_path, prefix)):
+            if prefix + name not in referenced:
+                os.remove(os.path.join(objects_path, prefix, name))
+                removed_objects += 1
+    if removed_objects:
+        logger.info(f"Removed {removed_objects} unreferenced image objects")
+    return removed_objects
+
+def restore_image_snapshot(backup_path, target_path, snapshot_id=None):
+    """Restore an image snapshot (the latest if snapshot_id is None) into target_path.
+
+    Every file is checked against its SHA-256 and gets its original mtime back.
+    Returns the number of files restored.
+    """
+    store_path = get_image_store(backup_path)
+    snapshot = load_image_snapshot(backup_path, snapshot_id)
+    for relative_path, entry in snapshot['files'].items():
+        destination = os.path.join(target_path, *relative_path.split('/'))
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(_object_path(store_path, entry['sha256']), destination)
+        if hash_file(destination) != entry['sha256']:
+            raise BackupError(f"Image backup object for {relative_path} is corrupt")
+        os.utime(destination, ns=(entry['mtime_ns'], entry['mtime_ns']))
+    logger.info(f"Restored {len(snapshot['files'])} images from snapshot {snapshot['id']} to {target_path}")
+    return len(snapshot['files'])
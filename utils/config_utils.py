@@ -1,18 +1,97 @@
+import os
 import yaml
 import json
+import threading
+from types import MappingProxyType
 from sqlalchemy.orm import sessionmaker
 from models.base import engine
 from models.config import Config
+from models.config_version import ConfigVersion
 
 Session = sessionmaker(bind=engine)
 
+CONFIG_PATH = "/app/config.yaml"
+
+# Parsed config.yaml plus structures derived from it, keyed on the file's mtime and size
+_yaml_lock = threading.Lock()
+_yaml_cache = {'file_key': None, 'config': None, 'derived': {}}
+
+# Process-wide snapshot of the merged config and the DB version it was loaded at
+_config_lock = threading.Lock()
+_config_snapshot = None
+_config_snapshot_version = None
+
+def _get_yaml_file_key():
+    """Identify the current version of config.yaml by mtime and size"""
+    try:
+        stat = os.stat(CONFIG_PATH)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
 def load_config_from_yaml():
-    """Load initial config from YAML file"""
+    """Load initial config from YAML file.
+    
+    The file is only parsed again when its mtime or size changes. The returned
+    dict is shared between callers and must not be modified.
+    """
+    global _yaml_cache
+    file_key = _get_yaml_file_key()
+    cache = _yaml_cache
+    if file_key is not None and file_key == cache['file_key']:
+        return cache['config']
+    
     try:
-        with open("/app/config.yaml", 'r') as f:
-            return yaml.safe_load(f)
+        with open(CONFIG_PATH, 'r') as f:
+            yaml_config = yaml.safe_load(f)
     except FileNotFoundError:
         return {}
+    
+    with _yaml_lock:
+        _yaml_cache = {'file_key': file_key, 'config': yaml_config, 'derived': {}}
+    return yaml_config
+
+def clear_yaml_cache():
+    """Forget the parsed config.yaml so the next load re-reads the file"""
+    global _yaml_cache
+    with _yaml_lock:
+        _yaml_cache = {'file_key': None, 'config': None, 'derived': {}}
+
+def _get_yaml_derived(name, build):
+    """Memoize build(yaml_config) until config.yaml changes"""
+    yaml_config = load_config_from_yaml()
+    cache = _yaml_cache
+    if cache['config'] is yaml_config and name in cache['derived']:
+        return cache['derived'][name]
+    
+    value = build(yaml_config)
+    if cache['config'] is yaml_config:
+        cache['derived'][name] = value
+    return value
+
+def get_flat_yaml_config():
+    """Get the flattened (key, value, editable) items of config.yaml"""
+    return _get_yaml_derived('flat', lambda yaml_config: tuple(flatten_dict(yaml_config or {})))
+
+def get_editability_map():
+    """Get a read-only map of config key to whether it can be edited"""
+    return _get_yaml_derived('editability', lambda yaml_config: MappingProxyType(
+        {key: is_editable for key, value, is_editable in get_flat_yaml_config()}
+    ))
+
+def _build_project_level_keys(yaml_config):
+    project_level_keys = []
+    for key, value, is_editable in get_flat_yaml_config():
+        # Check if this config has project_settings: True
+        if isinstance(value, dict) and value.get('project_settings', False):
+            project_level_keys.append(key)
+        elif key in yaml_config and isinstance(yaml_config[key], dict) and yaml_config[key].get('project_settings', False):
+            project_level_keys.append(key)
+    return tuple(project_level_keys)
+
+def get_project_level_keys():
+    """Get the config keys that are managed per project rather than system-wide"""
+    return _get_yaml_derived('project_level_keys', _build_project_level_keys)
 
 def flatten_dict(d, parent_key='', sep='.'):
     """Flatten nested dictionary, handling new structure with value/edit properties"""
@@ -59,19 +138,43 @@ def generate_config_description(key):
         # Database
         'sql_alchemy.loc': 'Database directory location',
         'sql_alchemy.db': 'Database filename',
+        'sql_alchemy.pool_size': 'Number of persistent database connections per process',
+        'sql_alchemy.max_overflow': 'Additional connections allowed above the pool size',
+        'sql_alchemy.pool_timeout': 'Seconds to wait for a free database connection',
+        'sql_alchemy.pool_recycle': 'Seconds before a pooled connection is recycled',
+        'sql_alchemy.journal_mode': 'SQLite journal mode (WAL allows concurrent readers)',
+        'sql_alchemy.synchronous': 'SQLite fsync level for commits',
+        'sql_alchemy.busy_timeout': 'Milliseconds to wait when the database is locked',
+        'sql_alchemy.cache_size': 'SQLite page cache size (negative values are KiB)',
+        'sql_alchemy.mmap_size': 'Bytes of the database file to memory-map',
+        'sql_alchemy.temp_store': 'Where SQLite keeps temporary tables and indexes',
         
         # Display/Trim settings
         'trim.name': 'Maximum characters for artifact name display',
-        'trim.content': 'Maximum characters for content preview',
+        'trim.content': 'Maximum characters for content preview (at most 500, the stored preview length)',
         'trim.extra': 'Extra characters allowed for display',
         
+        # Pagination
+        'pagination.page_size': 'Number of artifacts shown per page',
+        
+        # Expiry status
+        'expiry.warning_days': 'Days before expiry an artifact is shown as expiring soon',
+        
         # Email settings
         'email.smtp_server': 'SMTP server hostname for email',
         'email.smtp_port': 'SMTP server port number',
+        'email.use_tls': 'Use STARTTLS when connecting to the SMTP server',
+        'email.max_connections': 'SMTP connections used in parallel to send notifications',
         'email.notification_days': 'Days before expiry to send notifications',
         'email.max_notifications': 'Maximum number of notifications per token',
         'email.notification_interval': 'Hours between notification attempts',
         'email.timezone': 'Timezone for date calculations',
+        'email.digest': 'Send one summary email per recipient instead of one email per token',
+        'email.digest_recipients': 'Digest recipients: project owners, members or the maintainer only',
+        'email.outbox_max_attempts': 'Delivery attempts before a notification is dead-lettered (it is queued again after the notification interval)',
+        'email.outbox_retry_delay': 'Seconds before retrying a failed notification (doubled per attempt)',
+        'email.outbox_poll_interval': 'Seconds the notification dispatcher waits when there is nothing to send',
+        'email.outbox_retention_days': 'Days sent and dead-lettered notifications are kept in the outbox (0 keeps them forever)',
         
         # General settings
         'default_type': 'Default artifact type to pre-select when creating new artifacts',
@@ -84,8 +187,28 @@ def generate_config_description(key):
         'backup.backup_path': 'Directory path where backup files are stored',
         'backup.keep_backups': 'Number of backup files to retain (older files are deleted)',
         'backup.backup_database': 'Include SQLite database in backups',
+        'backup.compression': 'Backup compression: none, gzip or zstd',
+        'backup.compression_level': 'Backup compression level (0 for the default; gzip 1-9, zstd 1-22, clamped to the range)',
+        'backup.compression_workers': 'Processes used to compress backups in parallel (0 for one per CPU)',
+        'backup.pages_per_step': 'Database pages copied per online backup step',
         'backup.backup_images': 'Include uploaded images in backups (can be large)',
+        'backup.images_mode': 'Image backup mode: incremental (deduplicated snapshots) or archive (full tar.gz)',
         'backup.backup_day': 'Day of the week when automatic backups are performed',
+        
+        # Replication settings
+        'replication.enabled': 'Continuously ship database changes to the replica directory',
+        'replication.replica_path': 'Directory holding the database replica',
+        'replication.interval_seconds': 'Seconds between replica syncs (the finest point-in-time recovery step)',
+        'replication.keep_generations': 'Number of replica base snapshots to keep',
+        'replication.max_segments': 'WAL segments after which a new base snapshot is taken (0 for no limit)',
+        'replication.max_generation_age_hours': 'Hours after which a new base snapshot is taken (0 for no limit)',
+        
+        # Scheduler daemon settings
+        'scheduler.notifications_schedule': 'When to queue expiry notifications (interval like "every 5m" or cron expression; empty disables)',
+        'scheduler.purge_schedule': 'When to permanently delete expired soft-deleted artifacts',
+        'scheduler.maintenance_schedule': 'When to re-render missing or stale cached content and optimize the database',
+        'scheduler.backup_schedule': 'How often to check whether the weekly backup is due',
+        'scheduler.config_check_interval': 'Seconds between checks for changed settings while the daemon is idle',
     }
     
     return descriptions.get(key, f'Configuration setting for {key.replace(".", " ").title()}')
@@ -103,8 +226,7 @@ def initialize_config_table():
     session = Session()
     try:
         # Load from YAML and get all editable configs
-        yaml_config = load_config_from_yaml()
-        flat_config = flatten_dict(yaml_config)
+        flat_config = get_flat_yaml_config()
         
         # Get existing config items from database as a dict
         existing_configs = {config.key: config for config in session.query(Config).all()}
@@ -131,6 +253,7 @@ def initialize_config_table():
                         updated_count += 1
 
         if added_count > 0 or updated_count > 0:
+            bump_config_version(session)
             session.commit()
             print(f"Config table updated: added {added_count} new, updated {updated_count} editable config items")
         else:
@@ -219,6 +342,78 @@ def load_config():
     finally:
         session.close()
 
+def freeze_config(value):
+    """Recursively convert a loaded config into read-only mappings and tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze_config(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze_config(v) for v in value)
+    return value
+
+def get_config_version(session=None):
+    """Get the current config version from the database (0 if never bumped, None on error)"""
+    owns_session = session is None
+    if owns_session:
+        session = Session()
+    try:
+        version = session.query(ConfigVersion.version).filter(ConfigVersion.id == 1).scalar()
+        return version or 0
+    except Exception as e:
+        print(f"Error reading config version: {e}")
+        return None
+    finally:
+        if owns_session:
+            session.close()
+
+def bump_config_version(session):
+    """Increment the config version as part of the caller's transaction"""
+    updated = session.query(ConfigVersion).filter(ConfigVersion.id == 1).update(
+        {ConfigVersion.version: ConfigVersion.version + 1},
+        synchronize_session=False
+    )
+    if not updated:
+        session.add(ConfigVersion(id=1, version=1))
+
+def invalidate_config_cache():
+    """Drop this process's config snapshot so the next get_config() reloads it"""
+    global _config_snapshot, _config_snapshot_version
+    with _config_lock:
+        _config_snapshot = None
+        _config_snapshot_version = None
+
+def get_snapshot_version():
+    """Config version seen by the last get_config() call in this process (no query)"""
+    return _config_snapshot_version
+
+def clear_stale_cache(cache, cache_version):
+    """Empty a per-process cache derived from config if the snapshot version has
+    moved since cache_version. Call with the cache's lock held and store the
+    returned version."""
+    version = get_snapshot_version()
+    if version != cache_version:
+        # Another worker changed config since these entries were loaded
+        cache.clear()
+    return version
+
+def get_config():
+    """Get a read-only snapshot of the merged config.
+    
+    Each call costs one primary-key lookup of the config version; the YAML file
+    and config table are only re-read when another process (or this one) has
+    changed the config since the snapshot was taken.
+    """
+    global _config_snapshot, _config_snapshot_version
+    version = get_config_version()
+    snapshot = _config_snapshot
+    if snapshot is not None and version == _config_snapshot_version:
+        return snapshot
+    
+    with _config_lock:
+        if _config_snapshot is None or version != _config_snapshot_version:
+            _config_snapshot = freeze_config(load_config())
+            _config_snapshot_version = version
+        return _config_snapshot
+
 def update_config(key, value):
     """Update a single config value"""
     session = Session()
@@ -226,7 +421,9 @@ def update_config(key, value):
         config = session.query(Config).filter(Config.key == key).first()
         if config:
             config.value = json.dumps(value) if isinstance(value, (list, dict)) else str(value)
+            bump_config_version(session)
             session.commit()
+            invalidate_config_cache()
             return True
         return False
     except Exception as e:
@@ -244,29 +441,14 @@ def get_config_for_settings():
         
         # Filter out project-related config items (these should not appear in system settings UI)
         # Get project-level config keys to exclude from system settings
-        yaml_config = load_config_from_yaml()
-        flat_config = flatten_dict(yaml_config)
-        
-        project_level_keys = set()
-        for key, value, is_editable in flat_config:
-            # Check if this config has project_settings: True
-            if isinstance(value, dict) and value.get('project_settings', False):
-                project_level_keys.add(key)
-            elif key in yaml_config and isinstance(yaml_config[key], dict) and yaml_config[key].get('project_settings', False):
-                project_level_keys.add(key)
+        project_level_keys = get_project_level_keys()
         
         # Also exclude other system keys
         excluded_keys = {'ui.default_project_id'}.union(project_level_keys)
         configs = [config for config in configs if config.key not in excluded_keys]
         
-        # Load YAML config to check editability
-        yaml_config = load_config_from_yaml()
-        flat_config = flatten_dict(yaml_config)
-        
-        # Create a map of config keys to their editability
-        editability_map = {}
-        for key, value, is_editable in flat_config:
-            editability_map[key] = is_editable
+        # Map of config keys to their editability
+        editability_map = get_editability_map()
         
         # Group configs by section
         grouped_configs = {}
@@ -347,9 +529,13 @@ def get_section_title(section):
         'storage': 'File Storage Settings',
         'sql_alchemy': 'Database Settings', 
         'trim': 'Display & Formatting',
+        'pagination': 'Pagination',
+        'expiry': 'Expiry Status',
         'email': 'Email & Notifications',
         'general': 'General Settings',
         'backup': 'Backup & Recovery Settings',
+        'replication': 'Database Replication',
+        'scheduler': 'Scheduled Jobs',
         'type': 'Artifact Types'
     }
     return section_titles.get(section, section.replace('_', ' ').title())
@@ -360,9 +546,13 @@ def get_section_icon(section):
         'storage': 'fas fa-hard-drive',
         'sql_alchemy': 'fas fa-database',
         'trim': 'fas fa-eye',
+        'pagination': 'fas fa-list-ol',
+        'expiry': 'fas fa-hourglass-half',
         'email': 'fas fa-envelope',
         'general': 'fas fa-cog',
         'backup': 'fas fa-shield-alt',
+        'replication': 'fas fa-clone',
+        'scheduler': 'fas fa-clock',
         'type': 'fas fa-shapes'
     }
     return section_icons.get(section, 'fas fa-cog')
@@ -375,8 +565,7 @@ def reset_config_to_defaults():
         session.query(Config).delete()
         
         # Reinitialize from YAML
-        yaml_config = load_config_from_yaml()
-        flat_config = flatten_dict(yaml_config)
+        flat_config = get_flat_yaml_config()
         
         for key, value, is_editable in flat_config:
             if is_editable:
@@ -387,7 +576,9 @@ def reset_config_to_defaults():
                 )
                 session.add(config_item)
         
+        bump_config_version(session)
         session.commit()
+        invalidate_config_cache()
         return True
         
     except Exception as e:
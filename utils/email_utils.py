@@ -1,10 +1,25 @@
 import smtplib
+import queue
+import hashlib
+import html
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 import os
 from dotenv import load_dotenv
+from sqlalchemy import func, and_, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker
+from models.base import engine
 from models.artifact import Artifact
+from models.project import Project
+from models.project_member import ProjectMember
+from models.user import User
+from models.notification_outbox import NotificationOutbox, STATUS_PENDING, STATUS_SENT, STATUS_DEAD
+from utils.config_utils import load_config, get_config_version
 import logging
 import sys
 
@@ -21,20 +36,129 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def send_expiry_notification(config, artifact, days_left):
-    """Send email notification for expiring tokens"""
-    sender_email = os.getenv('SENDER_EMAIL')
-    sender_password = os.getenv('EMAIL_APP_PASSWORD') 
-    smtp_server = config['email']['smtp_server']
-    smtp_port = config['email']['smtp_port']
+Session = sessionmaker(bind=engine)
 
-    # Create message
-    message = MIMEMultipart()
-    message["From"] = sender_email
-    message["To"] = config.get('maintainer_email', sender_email)
-    message["Subject"] = f"Token Expiry Alert: {artifact.name}"
+DEFAULT_MAX_CONNECTIONS = 4
+DEFAULT_OUTBOX_MAX_ATTEMPTS = 5
+DEFAULT_OUTBOX_RETRY_DELAY = 60  # Seconds, doubled on each further failure
+DEFAULT_OUTBOX_POLL_INTERVAL = 30
+DEFAULT_OUTBOX_RETENTION_DAYS = 30
+# Seconds between the dispatcher's sweeps of old sent and dead rows
+OUTBOX_PURGE_INTERVAL = 3600
+# Outbox rows inserted per statement and delivered per commit
+OUTBOX_INSERT_BATCH = 500
+OUTBOX_DISPATCH_BATCH = 50
+
+# Errors after which a connection can no longer be used and is replaced
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+class SMTPConnectionPool:
+    """Persistent, authenticated SMTP connections shared across many messages.
+
+    At most max_connections connections are open at once, which also bounds the
+    number of messages sent concurrently. Connections are opened lazily, reused
+    after each send and replaced when the server drops them.
+    """
+
+    def __init__(self, config, max_connections=None, timeout=30, max_retries=1):
+        email_config = config['email']
+        self.smtp_server = email_config['smtp_server']
+        self.smtp_port = email_config['smtp_port']
+        self.use_tls = email_config.get('use_tls', True)
+        self.max_connections = max_connections or email_config.get('max_connections', DEFAULT_MAX_CONNECTIONS)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.sender_email = os.getenv('SENDER_EMAIL')
+        self.sender_password = os.getenv('EMAIL_APP_PASSWORD')
+        self.connections_opened = 0
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-    # Email body
+    def _connect(self):
+        """Open and authenticate a new SMTP connection"""
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.sender_email and self.sender_password:
+                server.login(self.sender_email, self.sender_password)
+        except Exception:
+            self._discard(server)
+            raise
+        with self._lock:
+            self.connections_opened += 1
+        return server
+
+    def _discard(self, server):
+        """Close a connection without raising"""
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _acquire(self):
+        """Take an idle connection or open a new one, waiting for a free slot"""
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, server, broken=False):
+        """Return a connection to the pool, or drop it if it is no longer usable"""
+        if broken:
+            self._discard(server)
+        else:
+            self._idle.put(server)
+        self._slots.release()
+
+    def send(self, message):
+        """Send a message, reconnecting and retrying if the connection was dropped"""
+        for attempt in range(self.max_retries + 1):
+            server = self._acquire()
+            try:
+                server.send_message(message)
+            except CONNECTION_ERRORS as e:
+                self._release(server, broken=True)
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"SMTP connection lost ({str(e)}), reconnecting")
+                continue
+            except Exception:
+                # The server rejected this message; the connection is still usable
+                self._release(server)
+                raise
+            self._release(server)
+            return
+
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(server)
+
+def build_expiry_email(artifact, days_left):
+    """Subject and HTML body of the notification for an expiring token"""
+    subject = f"Token Expiry Alert: {artifact.name}"
     body = f"""
     <html>
         <body>
@@ -49,41 +173,366 @@ def send_expiry_notification(config, artifact, days_left):
         </body>
     </html>
     """
+    return subject, body
 
+def build_message(recipient, subject, body, idempotency_key=None):
+    """Build an HTML email; the idempotency key becomes a stable Message-ID so
+    a message resent after a crash can be recognised as a duplicate"""
+    message = MIMEMultipart()
+    message["From"] = os.getenv('SENDER_EMAIL')
+    message["To"] = recipient
+    message["Subject"] = subject
+    if idempotency_key:
+        message["Message-ID"] = f"<{idempotency_key.replace(':', '.')}@keepstone>"
     message.attach(MIMEText(body, "html"))
+    return message
+
+def get_notification_recipient(config):
+    """Address expiry notifications are sent to"""
+    return config.get('maintainer_email', os.getenv('SENDER_EMAIL'))
+
+def build_expiry_message(config, artifact, days_left):
+    """Build the email notification for an expiring token"""
+    subject, body = build_expiry_email(artifact, days_left)
+    return build_message(get_notification_recipient(config), subject, body)
+
+def send_expiry_notification(config, artifact, days_left, pool=None):
+    """Send email notification for expiring tokens, over the pool's connections if given"""
+    message = build_expiry_message(config, artifact, days_left)
 
     try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.send_message(message)
-        server.quit()
+        if pool is not None:
+            pool.send(message)
+        else:
+            with SMTPConnectionPool(config, max_connections=1) as single_pool:
+                single_pool.send(message)
         logger.info(f"Sent notification for {artifact.name} ({days_left} days remaining)")
         return True
     except Exception as e:
         logger.error(f"Failed to send email notification for {artifact.name}: {str(e)}")
         return False
 
+def build_digest_email(tokens, project_names, today):
+    """Subject and HTML body of a digest listing several expiring tokens"""
+    subject = f"Token Expiry Digest: {len(tokens)} token{'s' if len(tokens) != 1 else ''} expiring soon"
+    table_rows = ''.join(
+        f"""
+                <tr>
+                    <td>{html.escape(token.name)}</td>
+                    <td>{html.escape(project_names.get(token.project_id, '-'))}</td>
+                    <td>{token.expiry_date.strftime('%B %d, %Y')}</td>
+                    <td>{(token.expiry_date - today).days}</td>
+                </tr>"""
+        for token in tokens
+    )
+    body = f"""
+    <html>
+        <body>
+            <h2>Token Expiry Digest</h2>
+            <p>The following tokens are about to expire:</p>
+            <table border="1" cellpadding="6" cellspacing="0">
+                <tr><th>Name</th><th>Project</th><th>Expiry Date</th><th>Days Remaining</th></tr>{table_rows}
+            </table>
+            <p>Please take necessary action to renew or update these tokens.</p>
+        </body>
+    </html>
+    """
+    return subject, body
+
+def get_digest_recipients(session, config, project_ids):
+    """Map each project id to the addresses its expiring tokens are reported to.
+
+    email.digest_recipients selects the project's active 'owners' or 'members';
+    tokens without a project, projects without such members, and the
+    'maintainer' setting fall back to the maintainer address.
+    """
+    mode = config['email'].get('digest_recipients', 'members')
+    maintainer = get_notification_recipient(config)
+    addresses = {}
+    member_project_ids = [project_id for project_id in project_ids if project_id is not None]
+    if mode != 'maintainer' and member_project_ids:
+        query = session.query(ProjectMember.project_id, User.email)\
+            .join(User, User.id == ProjectMember.user_id)\
+            .filter(ProjectMember.project_id.in_(member_project_ids),
+                    ProjectMember.is_active == True,
+                    User.is_active == True)
+        if mode == 'owners':
+            query = query.filter(ProjectMember.role == 'owner')
+        for project_id, email in query.all():
+            addresses.setdefault(project_id, set()).add(email)
+    return {project_id: sorted(addresses.get(project_id) or [maintainer]) for project_id in project_ids}
+
+def get_idempotency_key(artifact_id, notification_number):
+    """Key identifying the nth expiry notification of an artifact"""
+    return f"expiry:{artifact_id}:{notification_number}"
+
+def get_digest_idempotency_key(recipient, tokens):
+    """Key identifying a digest by its recipient and the notifications it covers"""
+    covered = ','.join(f"{token.id}:{(token.notification_count or 0) + 1}" for token in tokens)
+    return f"digest:{hashlib.sha256(f'{recipient}|{covered}'.encode()).hexdigest()[:32]}"
+
+def build_digest_rows(session, config, due_tokens, today):
+    """One outbox row per recipient covering all of their due tokens"""
+    project_ids = {token.project_id for token in due_tokens}
+    recipients = get_digest_recipients(session, config, project_ids)
+    project_names = dict(
+        session.query(Project.id, Project.name).filter(Project.id.in_([p for p in project_ids if p is not None])).all()
+    )
+
+    tokens_by_recipient = {}
+    for token in due_tokens:
+        for recipient in recipients[token.project_id]:
+            tokens_by_recipient.setdefault(recipient, []).append(token)
+
+    rows = []
+    for recipient, tokens in tokens_by_recipient.items():
+        subject, body = build_digest_email(tokens, project_names, today)
+        rows.append({
+            'idempotency_key': get_digest_idempotency_key(recipient, tokens),
+            'artifact_id': None,
+            'covered_artifacts': [[token.id, (token.notification_count or 0) + 1] for token in tokens],
+            'recipient': recipient,
+            'subject': subject,
+            'body': body
+        })
+    return rows
+
 def check_expiring_tokens(session, config):
-    """Check for tokens that will expire soon and send notifications"""
+    """Queue notifications for tokens that will expire soon.
+
+    Due tokens are written to the notification outbox in one transaction and
+    delivered later by dispatch_outbox. A token already queued for its next
+    notification is skipped by its idempotency key.
+
+    With email.digest enabled, each recipient gets one summary of all their due
+    tokens instead; the row lists the tokens it covers so dispatch_outbox can
+    record their notifications on delivery. Tokens still covered by a pending
+    notification of either kind are not queued again, nor are tokens whose
+    notification was dead-lettered less than email.notification_interval hours
+    after it was queued. Returns the number of emails queued.
+    """
+    now = datetime.utcnow()
     today = date.today()
-    notification_days = config['email'].get('notification_days', 14)
-    
-    # Query for tokens that will expire soon (using type_name field)
-    expiring_tokens = (
-        session.query(Artifact)
-        .filter(
-            Artifact.type_name == 'Token',
-            Artifact.expiry_date <= today + timedelta(days=notification_days),
-            Artifact.expiry_date > today
-        )
+    digest = config['email'].get('digest', False)
+
+    # Only live tokens that are due a notification are fetched, without their content
+    due_tokens = (
+        session.query(Artifact.id, Artifact.name, Artifact.project_id, Artifact.expiry_date,
+                      Artifact.notification_count)
+        .filter(Artifact.notification_due(config, now, today))
+        .order_by(Artifact.expiry_date, Artifact.id)
         .all()
     )
-    
-    for token in expiring_tokens:
-        if token.can_send_notification(config):
-            days_left = (token.expiry_date - today).days
-            if send_expiry_notification(config, token, days_left):
-                token.record_notification()
+    if not due_tokens:
+        return 0
+
+    # Skip tokens whose queued notification has not been delivered yet, so switching
+    # email.digest on or off never sends (and records) the same notification twice.
+    # A dead-lettered notification is retried once the notification interval has passed
+    retry_dead_before = now - timedelta(hours=config['email'].get('notification_interval', 24))
+    pending_ids = set()
+    for artifact_id, covered_artifacts in session.query(NotificationOutbox.artifact_id,
+                                                        NotificationOutbox.covered_artifacts)\
+            .filter(or_(NotificationOutbox.status == STATUS_PENDING,
+                        and_(NotificationOutbox.status == STATUS_DEAD,
+                             NotificationOutbox.created_at > retry_dead_before))):
+        if artifact_id is not None:
+            pending_ids.add(artifact_id)
+        pending_ids.update(covered_id for covered_id, _ in covered_artifacts or [])
+    due_tokens = [token for token in due_tokens if token.id not in pending_ids]
+    if not due_tokens:
+        return 0
+
+    try:
+        if digest:
+            rows = build_digest_rows(session, config, due_tokens, today)
+        else:
+            recipient = get_notification_recipient(config)
+            rows = []
+            for token in due_tokens:
+                subject, body = build_expiry_email(token, (token.expiry_date - today).days)
+                rows.append({
+                    'idempotency_key': get_idempotency_key(token.id, (token.notification_count or 0) + 1),
+                    'artifact_id': token.id,
+                    'recipient': recipient,
+                    'subject': subject,
+                    'body': body
+                })
+        for row in rows:
+            row.update({'status': STATUS_PENDING, 'attempts': 0, 'next_attempt_at': now, 'created_at': now})
+
+        queued_count = 0
+        for start in range(0, len(rows), OUTBOX_INSERT_BATCH):
+            result = session.execute(
+                sqlite_insert(NotificationOutbox)
+                .values(rows[start:start + OUTBOX_INSERT_BATCH])
+                .on_conflict_do_nothing(index_elements=['idempotency_key'])
+            )
+            queued_count += result.rowcount
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    if digest:
+        logger.info(f"Queued {queued_count} expiry digests covering {len(due_tokens)} tokens")
+    else:
+        logger.info(f"Queued {queued_count} expiry notifications ({len(rows) - queued_count} already queued)")
+    return queued_count
+
+def dispatch_outbox(session, config, pool=None, batch_size=OUTBOX_DISPATCH_BATCH):
+    """Deliver pending outbox notifications whose retry time has come.
+
+    Each batch is sent concurrently over the pool and committed on its own:
+    delivered rows are marked sent and their artifacts' notification counts
+    updated, failed rows are retried with exponential backoff
+    and dead-lettered after email.outbox_max_attempts attempts. Only one
+    dispatcher should run at a time. Returns counts of sent, retried and dead
+    notifications.
+    """
+    max_attempts = config['email'].get('outbox_max_attempts', DEFAULT_OUTBOX_MAX_ATTEMPTS)
+    retry_delay = config['email'].get('outbox_retry_delay', DEFAULT_OUTBOX_RETRY_DELAY)
+    report = {'sent': 0, 'retried': 0, 'dead': 0}
+
+    owns_pool = pool is None
+    if owns_pool:
+        pool = SMTPConnectionPool(config)
+
+    try:
+        with ThreadPoolExecutor(max_workers=pool.max_connections) as executor:
+            while True:
+                now = datetime.utcnow()
+                entries = (
+                    session.query(NotificationOutbox)
+                    .filter(NotificationOutbox.status == STATUS_PENDING,
+                            NotificationOutbox.next_attempt_at <= now)
+                    .order_by(NotificationOutbox.next_attempt_at, NotificationOutbox.id)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not entries:
+                    break
+
+                # Messages are built here so worker threads never touch ORM objects
+                futures = {
+                    executor.submit(pool.send, build_message(entry.recipient, entry.subject, entry.body,
+                                                             entry.idempotency_key)): entry
+                    for entry in entries
+                }
+                sent_artifact_ids = []
+                sent_digest_numbers = {}
+                for future in as_completed(futures):
+                    entry = futures[future]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        entry.mark_failed(e, max_attempts, retry_delay, now)
+                        if entry.status == STATUS_DEAD:
+                            report['dead'] += 1
+                            logger.error(f"Giving up on notification {entry.idempotency_key} after "
+                                         f"{entry.attempts} attempts: {str(e)}")
+                        else:
+                            report['retried'] += 1
+                            logger.warning(f"Failed to send notification {entry.idempotency_key} "
+                                           f"(attempt {entry.attempts}), retrying at {entry.next_attempt_at}: {str(e)}")
+                        continue
+
+                    entry.mark_sent(now)
+                    report['sent'] += 1
+                    if entry.artifact_id is not None:
+                        sent_artifact_ids.append(entry.artifact_id)
+                    for artifact_id, notification_number in entry.covered_artifacts or []:
+                        sent_digest_numbers.setdefault(notification_number, set()).add(artifact_id)
+
+                if sent_artifact_ids:
+                    session.query(Artifact)\
+                        .filter(Artifact.id.in_(sent_artifact_ids))\
+                        .update({
+                            Artifact.notification_count: func.coalesce(Artifact.notification_count, 0) + 1,
+                            Artifact.last_notification_sent: now
+                        }, synchronize_session=False)
+                # A token in several recipients' digests is recorded by the first delivery only
+                for notification_number, artifact_ids in sent_digest_numbers.items():
+                    session.query(Artifact)\
+                        .filter(Artifact.id.in_(artifact_ids),
+                                func.coalesce(Artifact.notification_count, 0) < notification_number)\
+                        .update({
+                            Artifact.notification_count: notification_number,
+                            Artifact.last_notification_sent: now
+                        }, synchronize_session=False)
                 session.commit()
-                logger.info(f"Notification recorded for {token.name} (total: {token.notification_count})")
\ No newline at end of file
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        if owns_pool:
+            pool.close()
+
+    if any(report.values()):
+        logger.info(f"Outbox dispatch: {report['sent']} sent, {report['retried']} to retry, "
+                    f"{report['dead']} dead-lettered")
+    return report
+
+def purge_outbox(session, config, now=None):
+    """Delete sent and dead-lettered notifications older than email.outbox_retention_days.
+
+    Returns the number of rows deleted; a retention of 0 keeps everything.
+    """
+    retention_days = config['email'].get('outbox_retention_days', DEFAULT_OUTBOX_RETENTION_DAYS)
+    if not retention_days:
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    try:
+        deleted = session.query(NotificationOutbox)\
+            .filter(or_(and_(NotificationOutbox.status == STATUS_SENT, NotificationOutbox.sent_at < cutoff),
+                        and_(NotificationOutbox.status == STATUS_DEAD, NotificationOutbox.created_at < cutoff)))\
+            .delete(synchronize_session=False)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    if deleted:
+        logger.info(f"Purged {deleted} notifications older than {retention_days} days from the outbox")
+    return deleted
+
+def run_outbox_dispatcher(config, stop_event=None, poll_interval=None):
+    """Drain the notification outbox until stop_event is set, polling while it is empty.
+
+    The config is re-read whenever its version changes, and the SMTP connections
+    are replaced when the email settings did. Old sent and dead rows are purged
+    every OUTBOX_PURGE_INTERVAL seconds.
+    """
+    stop_event = stop_event or threading.Event()
+    config_version = get_config_version()
+    interval = poll_interval or config['email'].get('outbox_poll_interval', DEFAULT_OUTBOX_POLL_INTERVAL)
+    logger.info(f"Notification dispatcher started (polling every {interval}s)")
+
+    pool = SMTPConnectionPool(config)
+    last_purge = None
+    try:
+        while not stop_event.is_set():
+            version = get_config_version()
+            if version is not None and version != config_version:
+                config_version, previous_email, config = version, config['email'], load_config()
+                if config['email'] != previous_email:
+                    logger.info("Email settings changed, reconnecting to the SMTP server")
+                    pool.close()
+                    pool = SMTPConnectionPool(config)
+                interval = poll_interval or config['email'].get('outbox_poll_interval', DEFAULT_OUTBOX_POLL_INTERVAL)
+
+            session = Session()
+            try:
+                dispatch_outbox(session, config, pool=pool)
+                if last_purge is None or time.monotonic() - last_purge >= OUTBOX_PURGE_INTERVAL:
+                    last_purge = time.monotonic()
+                    purge_outbox(session, config)
+            except Exception as e:
+                logger.error(f"Error dispatching notifications: {str(e)}")
+            finally:
+                session.close()
+            stop_event.wait(interval)
+    finally:
+        pool.close()
+
+    logger.info("Notification dispatcher stopped")
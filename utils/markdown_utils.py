@@ -0,0 +1,113 @@
+"""
+Markdown rendering utilities with rendered HTML cached on the artifact row
+"""
+
+import re
+import html
+import hashlib
+import threading
+from sqlalchemy.orm import sessionmaker
+from models.base import engine
+from models.artifact import Artifact, PREVIEW_LENGTH
+
+Session = sessionmaker(bind=engine)
+
+MARKDOWN_EXTRAS = ["tables", "fenced-code-blocks"]
+
+# Markdown renderer, created on first use: most requests are served from cached HTML
+_markdowner = None
+_markdowner_lock = threading.Lock()
+
+def get_markdowner():
+    """Import markdown2 and build the shared renderer the first time it is needed"""
+    global _markdowner
+    if _markdowner is None:
+        with _markdowner_lock:
+            if _markdowner is None:
+                from markdown2 import Markdown
+                _markdowner = Markdown(extras=MARKDOWN_EXTRAS)
+    return _markdowner
+
+def render_markdown(text):
+    """Render markdown text to HTML"""
+    return get_markdowner().convert(text or '')
+
+def get_content_hash(text):
+    """Hash of the content and renderer settings the cached HTML was built from"""
+    digest = hashlib.sha256(','.join(MARKDOWN_EXTRAS).encode())
+    digest.update((text or '').encode('utf-8'))
+    return digest.hexdigest()
+
+def build_preview(content_html):
+    """Plain-text start of rendered content for list views (one character over the
+    preview length when truncated, so templates can tell they need an ellipsis)"""
+    text = html.unescape(re.sub(r'<[^>]+>', ' ', content_html or ''))
+    return ' '.join(text.split())[:PREVIEW_LENGTH + 1]
+
+def refresh_rendered_content(artifact):
+    """Re-render the artifact's cached HTML and preview if its content changed; returns True if it did"""
+    content_hash = get_content_hash(artifact.content)
+    if (artifact.content_hash == content_hash and artifact.content_html is not None
+            and artifact.content_preview is not None):
+        return False
+    artifact.content_html = render_markdown(artifact.content)
+    artifact.content_hash = content_hash
+    artifact.content_preview = build_preview(artifact.content_html)
+    return True
+
+def get_rendered_content(artifact, session=None):
+    """Get the artifact's content as HTML, rendering only when the cached copy is stale.
+
+    With a session, a re-render is flushed to it; committing it, so later views
+    are served from the cache, is left to the caller.
+    """
+    if refresh_rendered_content(artifact) and session is not None:
+        session.flush()
+    return artifact.content_html
+
+def backfill_rendered_content(session=None, batch_size=100):
+    """Fill in or refresh the cached HTML of stored artifacts, committing per batch.
+
+    Returns the number of artifacts re-rendered.
+    """
+    owns_session = session is None
+    if owns_session:
+        session = Session()
+    try:
+        rendered_count = 0
+        last_id = 0
+        while True:
+            rows = (
+                session.query(Artifact.id, Artifact.content, Artifact.content_hash, Artifact.content_preview)
+                .filter(Artifact.id > last_id)
+                .order_by(Artifact.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            updates = []
+            for row in rows:
+                content_hash = get_content_hash(row.content)
+                if row.content_hash != content_hash or row.content_preview is None:
+                    content_html = render_markdown(row.content)
+                    updates.append({
+                        'id': row.id,
+                        'content_html': content_html,
+                        'content_hash': content_hash,
+                        'content_preview': build_preview(content_html)
+                    })
+            if updates:
+                session.bulk_update_mappings(Artifact, updates)
+                session.commit()
+                rendered_count += len(updates)
+
+        return rendered_count
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        if owns_session:
+            session.close()
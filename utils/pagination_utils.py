@@ -0,0 +1,123 @@
+"""
+Keyset (cursor) pagination utilities for artifact lists
+"""
+
+import base64
+import json
+from datetime import date
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 200
+
+class Page:
+    """One page of keyset-paginated results"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+def get_page_size(config, requested=None):
+    """Resolve the page size from the request or config, clamped to a sane range"""
+    page_size = None
+    if requested:
+        try:
+            page_size = int(requested)
+        except (ValueError, TypeError):
+            page_size = None
+    if not page_size:
+        page_size = (config or {}).get('pagination', {}).get('page_size', DEFAULT_PAGE_SIZE)
+    try:
+        page_size = int(page_size)
+    except (ValueError, TypeError):
+        page_size = DEFAULT_PAGE_SIZE
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+def encode_cursor(sort_value, row_id):
+    """Encode a (sort value, id) position as an opaque URL-safe string"""
+    if isinstance(sort_value, date):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, parse_value=None):
+    """Decode a cursor back to (sort value, id); returns None if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if sort_value is not None and parse_value:
+            sort_value = parse_value(sort_value)
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+def parse_date(value):
+    """Cursor value parser for date sort columns"""
+    return date.fromisoformat(value)
+
+def _after(sort_column, id_column, sort_value, row_id):
+    """Rows strictly after the position in (sort ASC NULLS FIRST, id ASC) order"""
+    if sort_value is None:
+        return or_(and_(sort_column.is_(None), id_column > row_id), sort_column.isnot(None))
+    return or_(sort_column > sort_value, and_(sort_column == sort_value, id_column > row_id))
+
+def _before(sort_column, id_column, sort_value, row_id):
+    """Rows strictly before the position in (sort ASC NULLS FIRST, id ASC) order"""
+    if sort_value is None:
+        return and_(sort_column.is_(None), id_column < row_id)
+    return or_(sort_column.is_(None), sort_column < sort_value,
+               and_(sort_column == sort_value, id_column < row_id))
+
+def keyset_paginate(query, sort_column, id_column, page_size, after=None, before=None,
+                    row_key=None, parse_value=None):
+    """Fetch one page of a query ordered by (sort_column, id_column).
+
+    NULL sort values come first, matching SQLite's ascending order. Only page_size + 1
+    rows are read, so deep pages cost the same as the first one. row_key(row) must
+    return the (sort value, id) of a result row; by default the row is an ORM object
+    with attributes named after the two columns.
+    """
+    if row_key is None:
+        row_key = lambda row: (getattr(row, sort_column.key), getattr(row, id_column.key))
+
+    after_position = decode_cursor(after, parse_value)
+    before_position = decode_cursor(before, parse_value) if after_position is None else None
+
+    if before_position is not None:
+        rows = (query
+                .filter(_before(sort_column, id_column, *before_position))
+                .order_by(sort_column.desc(), id_column.desc())
+                .limit(page_size + 1)
+                .all())
+        if rows:
+            items = list(reversed(rows[:page_size]))
+            prev_cursor = encode_cursor(*row_key(items[0])) if len(rows) > page_size else None
+            next_cursor = encode_cursor(*row_key(items[-1]))
+            return Page(items, next_cursor=next_cursor, prev_cursor=prev_cursor)
+        # Nothing before a stale cursor - fall back to the first page
+
+    if after_position is not None:
+        query = query.filter(_after(sort_column, id_column, *after_position))
+
+    rows = query.order_by(sort_column.asc(), id_column.asc()).limit(page_size + 1).all()
+    items = rows[:page_size]
+    next_cursor = encode_cursor(*row_key(items[-1])) if len(rows) > page_size else None
+    prev_cursor = encode_cursor(*row_key(items[0])) if after_position is not None and items else None
+    return Page(items, next_cursor=next_cursor, prev_cursor=prev_cursor)
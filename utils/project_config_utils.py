@@ -1,26 +1,22 @@
 import json
+import copy
+import threading
 from sqlalchemy.orm import sessionmaker
 from models.base import engine
 from models.project_config import ProjectConfig
 from models.project import Project
-from utils.config_utils import load_config_from_yaml, flatten_dict, generate_config_description, generate_config_title
+from utils.config_utils import load_config_from_yaml, get_project_level_keys, generate_config_description, generate_config_title, bump_config_version, clear_stale_cache
 
 Session = sessionmaker(bind=engine)
 
+# Parsed project configs keyed by project ID, cleared when the config version moves
+_project_config_lock = threading.Lock()
+_project_config_cache = {}
+_project_config_cache_version = None
+
 def get_project_level_config_keys():
     """Get list of configuration keys that should be managed at project level"""
-    yaml_config = load_config_from_yaml()
-    flat_config = flatten_dict(yaml_config)
-    
-    project_level_keys = []
-    for key, value, is_editable in flat_config:
-        # Check if this config has project_settings: True
-        if isinstance(value, dict) and value.get('project_settings', False):
-            project_level_keys.append(key)
-        elif key in yaml_config and isinstance(yaml_config[key], dict) and yaml_config[key].get('project_settings', False):
-            project_level_keys.append(key)
-    
-    return project_level_keys
+    return list(get_project_level_keys())
 
 def initialize_project_configs(project_id):
     """Initialize project configurations with default values"""
@@ -70,7 +66,9 @@ def initialize_project_configs(project_id):
                     )
                     session.add(config_item)
         
+        bump_config_version(session)
         session.commit()
+        invalidate_project_config_cache(project_id)
         return True
         
     except Exception as e:
@@ -80,25 +78,60 @@ def initialize_project_configs(project_id):
     finally:
         session.close()
 
-def get_project_config(project_id, key, default=None):
-    """Get a specific configuration value for a project"""
+def invalidate_project_config_cache(project_id=None):
+    """Drop cached configs for one project, or for all projects"""
+    with _project_config_lock:
+        if project_id is None:
+            _project_config_cache.clear()
+        else:
+            _project_config_cache.pop(project_id, None)
+
+def get_project_configs(project_ids):
+    """Get parsed configs for several projects as {project_id: {key: value}}.
+    
+    Projects missing from the cache are loaded together in a single query. The
+    returned dicts are shared with the cache and must not be modified.
+    """
+    global _project_config_cache_version
+    project_ids = [project_id for project_id in dict.fromkeys(project_ids) if project_id]
+    
+    with _project_config_lock:
+        _project_config_cache_version = clear_stale_cache(_project_config_cache, _project_config_cache_version)
+        
+        result = {project_id: _project_config_cache[project_id]
+                  for project_id in project_ids if project_id in _project_config_cache}
+    
+    missing_ids = [project_id for project_id in project_ids if project_id not in result]
+    if not missing_ids:
+        return result
+    
     session = Session()
     try:
-        config = session.query(ProjectConfig).filter_by(
-            project_id=project_id,
-            key=key
-        ).first()
+        loaded = {project_id: {} for project_id in missing_ids}
+        configs = session.query(ProjectConfig).filter(
+            ProjectConfig.project_id.in_(missing_ids)
+        ).all()
+        for config in configs:
+            loaded[config.project_id][config.key] = config.get_parsed_value()
         
-        if config:
-            return config.get_parsed_value()
-        return default
+        with _project_config_lock:
+            _project_config_cache.update(loaded)
+        result.update(loaded)
+        return result
         
     except Exception as e:
-        print(f"Error getting project config: {e}")
-        return default
+        print(f"Error getting project configs: {e}")
+        return result
     finally:
         session.close()
 
+def get_project_config(project_id, key, default=None):
+    """Get a specific configuration value for a project"""
+    configs = get_project_configs([project_id]).get(project_id, {})
+    if key in configs:
+        return copy.deepcopy(configs[key])
+    return default
+
 def update_project_config(project_id, key, value):
     """Update a project configuration value"""
     session = Session()
@@ -120,7 +153,9 @@ def update_project_config(project_id, key, value):
             config.set_value(value)
             session.add(config)
         
+        bump_config_version(session)
         session.commit()
+        invalidate_project_config_cache(project_id)
         return True
         
     except Exception as e:
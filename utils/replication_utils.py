@@ -0,0 +1,435 @@
+"""
+WAL shipping: incremental replication of the SQLite database to a replica directory
+
+Each replica generation starts from a base snapshot of the database and is
+followed by WAL segments holding the committed frames written since. The
+replicator keeps a read transaction open between syncs so no other connection
+can restart the WAL behind its back, and does its own checkpoints only after
+everything in the WAL has been shipped. When continuity is lost anyway (the
+replicator was stopped, the WAL was deleted) a new generation is started. New
+generations are also started after a number of segments or hours, so neither
+the manifest nor the replay needed to restore grows with the total history.
+
+Replica layout:
+    manifest.json
+    generations/<id>/base.db
+    generations/<id>/wal/<sequence>.wal
+"""
+
+import os
+import json
+import shutil
+import sqlite3
+import struct
+import threading
+import logging
+from datetime import datetime
+from utils.backup_utils import check_integrity
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+WAL_HEADER_SIZE = 32
+WAL_FRAME_HEADER_SIZE = 24
+# Magic numbers mark whether WAL checksums use little- or big-endian words
+WAL_MAGIC_LITTLE_ENDIAN = 0x377f0682
+WAL_MAGIC_BIG_ENDIAN = 0x377f0683
+
+DEFAULT_INTERVAL_SECONDS = 10
+DEFAULT_KEEP_GENERATIONS = 2
+# A new base snapshot is taken once a generation reaches either limit, so the
+# manifest and the replay needed to restore stay bounded
+DEFAULT_MAX_SEGMENTS = 1000
+DEFAULT_MAX_GENERATION_AGE_HOURS = 24
+
+class ReplicationError(Exception):
+    """Raised when a replica cannot be read or restored"""
+
+def wal_checksum(data, s0, s1, big_endian):
+    """SQLite's cumulative WAL checksum over data, continuing from (s0, s1)"""
+    words = struct.unpack(('>' if big_endian else '<') + f'{len(data) // 4}I', data)
+    for i in range(0, len(words), 2):
+        s0 = (s0 + words[i] + s1) & 0xFFFFFFFF
+        s1 = (s1 + words[i + 1] + s0) & 0xFFFFFFFF
+    return s0, s1
+
+def read_wal_header(wal_path):
+    """Parse and validate a WAL file header; None if there is no usable WAL"""
+    try:
+        with open(wal_path, 'rb') as f:
+            data = f.read(WAL_HEADER_SIZE)
+    except FileNotFoundError:
+        return None
+    if len(data) < WAL_HEADER_SIZE:
+        return None
+    magic, version, page_size, checkpoint_seq, salt1, salt2, c1, c2 = struct.unpack('>8I', data)
+    if magic not in (WAL_MAGIC_LITTLE_ENDIAN, WAL_MAGIC_BIG_ENDIAN):
+        return None
+    big_endian = magic == WAL_MAGIC_BIG_ENDIAN
+    if wal_checksum(data[:24], 0, 0, big_endian) != (c1, c2):
+        return None
+    return {
+        'big_endian': big_endian,
+        'page_size': page_size,
+        'checkpoint_seq': checkpoint_seq,
+        'salt': [salt1, salt2],
+        'checksum': [c1, c2],
+    }
+
+def read_committed_frames(wal_path, header, offset, checksum):
+    """Read the valid frames after offset up to the last commit frame.
+
+    Frames are validated against the WAL salts and checksum chain, the same way
+    SQLite recovers a WAL, so stale or uncommitted frames are never shipped.
+    Returns (frame bytes, end offset, checksum at end offset, frames, commits).
+    """
+    frame_size = WAL_FRAME_HEADER_SIZE + header['page_size']
+    with open(wal_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+
+    s0, s1 = checksum
+    position = 0
+    frame_count = 0
+    committed = (0, list(checksum), 0, 0)
+    commit_count = 0
+    while position + frame_size <= len(data):
+        frame_header = data[position:position + WAL_FRAME_HEADER_SIZE]
+        _, commit_size, salt1, salt2, c1, c2 = struct.unpack('>6I', frame_header)
+        if [salt1, salt2] != header['salt']:
+            break
+        s0, s1 = wal_checksum(frame_header[:8], s0, s1, header['big_endian'])
+        s0, s1 = wal_checksum(data[position + WAL_FRAME_HEADER_SIZE:position + frame_size], s0, s1, header['big_endian'])
+        if (s0, s1) != (c1, c2):
+            break
+        position += frame_size
+        frame_count += 1
+        if commit_size:
+            commit_count += 1
+            committed = (position, [s0, s1], frame_count, commit_count)
+
+    end, end_checksum, frames, commits = committed
+    return data[:end], offset + end, end_checksum, frames, commits
+
+def apply_wal_frames(db_file, frames, page_size):
+    """Write WAL frame pages into an open database file, truncating at each commit"""
+    frame_size = WAL_FRAME_HEADER_SIZE + page_size
+    for position in range(0, len(frames) - frame_size + 1, frame_size):
+        page_number, commit_size = struct.unpack('>2I', frames[position:position + 8])
+        db_file.seek((page_number - 1) * page_size)
+        db_file.write(frames[position + WAL_FRAME_HEADER_SIZE:position + frame_size])
+        if commit_size:
+            db_file.truncate(commit_size * page_size)
+
+def write_file_atomic(path, data):
+    """Write a file via a synced temporary file and rename"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def load_manifest(replica_path):
+    """Read a replica's manifest, or an empty one if the replica is new"""
+    manifest_path = os.path.join(replica_path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {'version': MANIFEST_VERSION, 'generations': []}
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ReplicationError(f"Unsupported replica manifest version: {manifest.get('version')}")
+    return manifest
+
+class WalReplicator:
+    """Ships a database's WAL to a replica directory, one sync() at a time"""
+
+    def __init__(self, db_path, replica_path, keep_generations=DEFAULT_KEEP_GENERATIONS, busy_timeout=5.0,
+                 max_segments=DEFAULT_MAX_SEGMENTS, max_generation_age_hours=DEFAULT_MAX_GENERATION_AGE_HOURS):
+        self.db_path = db_path
+        self.wal_path = db_path + '-wal'
+        self.replica_path = replica_path
+        self.keep_generations = keep_generations
+        self.max_segments = max_segments
+        self.max_generation_age_hours = max_generation_age_hours
+        self.busy_timeout = busy_timeout
+        os.makedirs(os.path.join(replica_path, 'generations'), exist_ok=True)
+        self.manifest = load_manifest(replica_path)
+
+        # Connection whose read transaction pins the WAL between syncs
+        self._reader = sqlite3.connect(db_path, timeout=busy_timeout, isolation_level=None)
+        # True while the read lock has been held since the current position was recorded
+        self._tracking = False
+
+    def close(self):
+        """Release the read lock and close the connection"""
+        self._release_read_lock()
+        self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _hold_read_lock(self):
+        self._reader.execute("BEGIN")
+        self._reader.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+    def _release_read_lock(self):
+        if self._reader.in_transaction:
+            self._reader.execute("COMMIT")
+        self._tracking = False
+
+    def _save_manifest(self):
+        data = json.dumps(self.manifest, indent=2).encode('utf-8')
+        write_file_atomic(os.path.join(self.replica_path, MANIFEST_NAME), data)
+
+    def _generation_path(self, generation, *parts):
+        return os.path.join(self.replica_path, 'generations', generation['id'], *parts)
+
+    @property
+    def generation(self):
+        """The generation new WAL segments are added to"""
+        generations = self.manifest['generations']
+        return generations[-1] if generations else None
+
+    def _can_continue(self, header):
+        """Whether the WAL on disk follows on from the recorded position"""
+        if self.generation is None:
+            return False
+        position = self.generation['position']
+        salt = header['salt'] if header else None
+        if salt == position['salt'] and (header is None or header['page_size'] == self.generation['page_size']):
+            return True
+        # A WAL restart is only safe to follow if it came right after our own
+        # complete checkpoint while the read lock kept anyone else from restarting
+        return self._tracking and position['checkpointed'] and (
+            header is None or header['page_size'] == self.generation['page_size'])
+
+    def _rebase_due(self):
+        """Whether the current generation has reached its segment count or age limit"""
+        generation = self.generation
+        if self.max_segments and len(generation['segments']) >= self.max_segments:
+            return True
+        age = datetime.now() - datetime.fromisoformat(generation['created_at'])
+        return bool(self.max_generation_age_hours) and age.total_seconds() >= self.max_generation_age_hours * 3600
+
+    def _new_generation(self, header):
+        """Record the current end of the WAL as the position a new generation starts from.
+
+        Called with writers held off; the base snapshot is copied afterwards by _copy_base.
+        """
+        now = datetime.now()
+        generation = {
+            'id': now.strftime('%Y%m%dT%H%M%S%f'),
+            'created_at': now.isoformat(),
+            'base': 'base.db',
+            'segments': [],
+        }
+        if header:
+            _, offset, checksum, _, _ = read_committed_frames(self.wal_path, header, WAL_HEADER_SIZE, header['checksum'])
+            generation['page_size'] = header['page_size']
+            generation['position'] = {'salt': header['salt'], 'offset': offset, 'checksum': checksum,
+                                      'checkpointed': False}
+        else:
+            generation['page_size'] = self._reader.execute("PRAGMA page_size").fetchone()[0]
+            generation['position'] = {'salt': None, 'offset': WAL_HEADER_SIZE, 'checksum': None,
+                                      'checkpointed': True}
+        return generation
+
+    def _copy_base(self, generation):
+        """Copy the base snapshot from the reader's read transaction and check its integrity.
+
+        The read transaction was started at the generation's recorded position, so
+        the copy matches it however much has been committed since.
+        """
+        os.makedirs(self._generation_path(generation, 'wal'), exist_ok=True)
+        base_path = self._generation_path(generation, 'base.db')
+        partial_path = base_path + '.partial'
+        try:
+            target = sqlite3.connect(partial_path)
+            try:
+                # One step: the copy never restarts to pick up later commits
+                self._reader.backup(target)
+                # The copy is a standalone file, not a WAL database with a missing -wal
+                target.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                target.close()
+            problems = check_integrity(partial_path)
+            if problems:
+                raise ReplicationError(f"Base snapshot of {self.db_path} failed integrity check: "
+                                       f"{'; '.join(problems[:5])}")
+            os.replace(partial_path, base_path)
+        except Exception:
+            shutil.rmtree(self._generation_path(generation), ignore_errors=True)
+            raise
+
+        self.manifest['generations'].append(generation)
+        self._prune_generations()
+        logger.info(f"Started replica generation {generation['id']}")
+
+    def _prune_generations(self):
+        """Remove the oldest generations beyond keep_generations"""
+        generations = self.manifest['generations']
+        while len(generations) > max(self.keep_generations, 1):
+            old = generations.pop(0)
+            shutil.rmtree(self._generation_path(old), ignore_errors=True)
+            logger.info(f"Removed replica generation {old['id']}")
+
+    def _ship_frames(self, header):
+        """Copy committed frames after the recorded position into a new segment"""
+        generation = self.generation
+        position = generation['position']
+        if header is None:
+            return 0, 0, 0
+        if position['salt'] != header['salt']:
+            # The WAL restarted after our checkpoint; continue from its first frame
+            position.update({'salt': header['salt'], 'offset': WAL_HEADER_SIZE, 'checksum': header['checksum']})
+
+        frames, offset, checksum, frame_count, commit_count = read_committed_frames(
+            self.wal_path, header, position['offset'], position['checksum'])
+        if not frames:
+            return 0, 0, 0
+
+        sequence = generation['segments'][-1]['sequence'] + 1 if generation['segments'] else 0
+        segment_name = f"{sequence:08d}.wal"
+        write_file_atomic(self._generation_path(generation, 'wal', segment_name), frames)
+        generation['segments'].append({
+            'sequence': sequence,
+            'file': segment_name,
+            'shipped_at': datetime.now().isoformat(),
+            'frames': frame_count,
+            'commits': commit_count,
+            'bytes': len(frames),
+        })
+        position.update({'offset': offset, 'checksum': checksum, 'checkpointed': False})
+        return len(frames), frame_count, commit_count
+
+    def sync(self):
+        """Ship new committed WAL frames and checkpoint. Returns a report of the work done.
+
+        Writers are held off (BEGIN IMMEDIATE) only while the new frames are read
+        and the checkpoint runs, so the cost follows the amount of change. A new
+        generation is started when continuity with the WAL is lost, and after
+        max_segments segments or max_generation_age_hours; its base snapshot is
+        copied and checked after writers are let go, from the read transaction
+        pinned at the recorded position. The manifest is written at most once
+        per sync, and only when something changed.
+        """
+        report = {'new_generation': False, 'bytes': 0, 'frames': 0, 'commits': 0}
+        previous_position = json.dumps(self.generation['position']) if self.generation else None
+        new_generation = None
+        writer = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+        try:
+            writer.execute("BEGIN IMMEDIATE")
+            try:
+                header = read_wal_header(self.wal_path)
+                if not self._can_continue(header) or self._rebase_due():
+                    new_generation = self._new_generation(header)
+                    position = new_generation['position']
+                else:
+                    report['bytes'], report['frames'], report['commits'] = self._ship_frames(header)
+                    position = self.generation['position']
+
+                # Controlled checkpoint: everything in the WAL has been shipped, so a
+                # restart following a complete checkpoint loses nothing
+                self._release_read_lock()
+                busy, log_frames, checkpointed_frames = self._reader.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+                position['checkpointed'] = header is None or (busy == 0 and log_frames == checkpointed_frames)
+                # Still under the write lock, so the read transaction sees exactly the recorded position
+                self._hold_read_lock()
+                self._tracking = True
+            finally:
+                writer.execute("ROLLBACK")
+        finally:
+            writer.close()
+
+        if new_generation is not None:
+            try:
+                self._copy_base(new_generation)
+            except Exception:
+                self._release_read_lock()
+                raise
+            report['new_generation'] = True
+        if report['new_generation'] or report['frames'] or json.dumps(self.generation['position']) != previous_position:
+            self._save_manifest()
+
+        report['generation'] = self.generation['id']
+        if report['frames']:
+            logger.info(f"Replicated {report['commits']} commits ({report['frames']} frames, {report['bytes']} bytes) "
+                        f"to generation {report['generation']}")
+        return report
+
+def restore_replica(replica_path, target_path, timestamp=None):
+    """Rebuild a database from a replica as of timestamp (latest if None).
+
+    The newest generation whose base snapshot was taken at or before timestamp
+    is restored, then every WAL segment shipped at or before it is replayed.
+    Recovery points are as fine-grained as the replication interval. Returns a
+    report of the generation, segments applied and the point restored to.
+    """
+    manifest = load_manifest(replica_path)
+    generations = [g for g in manifest['generations']
+                   if timestamp is None or datetime.fromisoformat(g['created_at']) <= timestamp]
+    if not generations:
+        raise ReplicationError(f"No replica generation at or before {timestamp}")
+    generation = generations[-1]
+    generation_path = os.path.join(replica_path, 'generations', generation['id'])
+
+    partial_path = target_path + '.partial'
+    shutil.copyfile(os.path.join(generation_path, generation['base']), partial_path)
+    restored_to = generation['created_at']
+    applied = 0
+    try:
+        with open(partial_path, 'r+b') as db_file:
+            for segment in generation['segments']:
+                if timestamp is not None and datetime.fromisoformat(segment['shipped_at']) > timestamp:
+                    break
+                with open(os.path.join(generation_path, 'wal', segment['file']), 'rb') as f:
+                    apply_wal_frames(db_file, f.read(), generation['page_size'])
+                restored_to = segment['shipped_at']
+                applied += 1
+
+        # Replayed pages may carry the WAL flag; the restored file stands alone
+        conn = sqlite3.connect(partial_path)
+        try:
+            conn.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            conn.close()
+        problems = check_integrity(partial_path)
+        if problems:
+            raise ReplicationError(f"Restored database failed integrity check: {'; '.join(problems[:5])}")
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    os.replace(partial_path, target_path)
+    logger.info(f"Restored {target_path} from generation {generation['id']} "
+                f"({applied} WAL segments, as of {restored_to})")
+    return {'generation': generation['id'], 'segments': applied, 'restored_to': restored_to}
+
+def run_replication(config, stop_event=None):
+    """Sync the database to the replica directory every interval until stop_event is set"""
+    replication_config = config.get('replication', {})
+    db_config = config.get('sql_alchemy', {})
+    db_path = os.path.join(db_config.get('loc', '/app/db'), db_config.get('db', 'data.db'))
+    interval = replication_config.get('interval_seconds', DEFAULT_INTERVAL_SECONDS)
+    stop_event = stop_event or threading.Event()
+
+    logger.info(f"Replicating {db_path} to {replication_config.get('replica_path')} every {interval}s")
+    with WalReplicator(db_path, replication_config.get('replica_path', '/app/replica'),
+                       keep_generations=replication_config.get('keep_generations', DEFAULT_KEEP_GENERATIONS),
+                       max_segments=replication_config.get('max_segments', DEFAULT_MAX_SEGMENTS),
+                       max_generation_age_hours=replication_config.get('max_generation_age_hours',
+                                                                       DEFAULT_MAX_GENERATION_AGE_HOURS)) as replicator:
+        while not stop_event.is_set():
+            try:
+                replicator.sync()
+            except Exception as e:
+                logger.error(f"Error replicating database: {str(e)}")
+            stop_event.wait(interval)
+    logger.info("Replication stopped")
@@ -0,0 +1,237 @@
+"""
+In-process job scheduling for the long-running scheduler daemon
+
+A schedule is either an interval ("every 5m", "30s", "2h", "1d" or a number of
+seconds) or a five-field cron expression ("minute hour day month weekday",
+local time) such as "30 3 * * *". Jobs run one at a time in the calling
+thread, so two jobs never compete for the SQLite write lock, and each run's
+duration is recorded on the job.
+"""
+
+import re
+import time
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Durations kept per job for the average/max in its stats
+DURATION_HISTORY = 50
+
+INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+INTERVAL_PATTERN = re.compile(r'^(?:every\s+)?(\d+)\s*([smhd]?)$')
+
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+}
+WEEKDAY_NAMES = {'sun': 0, 'mon': 1, 'tue': 2, 'wed': 3, 'thu': 4, 'fri': 5, 'sat': 6}
+# (low, high) bounds of minute, hour, day of month, month, day of week
+CRON_FIELD_BOUNDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+class ScheduleError(ValueError):
+    """Raised for a schedule specification that cannot be parsed"""
+
+class IntervalSchedule:
+    """Run every fixed number of seconds"""
+
+    def __init__(self, seconds):
+        if seconds <= 0:
+            raise ScheduleError(f"Interval must be positive, got {seconds}")
+        self.seconds = seconds
+
+    def next_run(self, after):
+        return after + timedelta(seconds=self.seconds)
+
+    def __repr__(self):
+        return f"every {self.seconds}s"
+
+class CronSchedule:
+    """Run at the minutes matching a five-field cron expression"""
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = CRON_ALIASES.get(expression, expression).split()
+        if len(fields) != 5:
+            raise ScheduleError(f"Cron expression needs 5 fields, got '{expression}'")
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELD_BOUNDS)
+        ]
+        # As in cron, a restricted day of month and day of week match if either does
+        self.days_restricted = fields[2] != '*'
+        self.weekdays_restricted = fields[4] != '*'
+
+    def matches_day(self, moment):
+        day_match = moment.day in self.days
+        weekday_match = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_match or weekday_match
+        return day_match and weekday_match
+
+    def next_run(self, after):
+        """First matching minute strictly after the given time"""
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Skipping whole months, days and hours keeps this to a few hundred steps
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self.matches_day(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ScheduleError(f"Cron expression '{self.expression}' never matches")
+
+    def __repr__(self):
+        return f"cron '{self.expression}'"
+
+def parse_cron_field(field, low, high):
+    """Expand one cron field ('*', '*/15', '1-5', 'mon,wed', '0-30/10') into a set of values"""
+    values = set()
+    for part in field.lower().split(','):
+        range_part, _, step = part.partition('/')
+        try:
+            step = int(step) if step else 1
+            if range_part == '*':
+                start, end = low, high
+            elif '-' in range_part:
+                start, end = (int(WEEKDAY_NAMES.get(v, v)) for v in range_part.split('-', 1))
+            else:
+                start = int(WEEKDAY_NAMES.get(range_part, range_part))
+                end = high if step > 1 else start
+        except ValueError:
+            raise ScheduleError(f"Invalid cron field '{field}'")
+        # 7 is accepted for Sunday in the weekday field
+        if high == 6 and start == 7 and end == 7:
+            start = end = 0
+        elif high == 6 and end == 7:
+            values.add(0)
+            end = 6
+        if step < 1 or start < low or end > high or start > end:
+            raise ScheduleError(f"Cron field '{field}' is out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+def parse_schedule(spec):
+    """Build a schedule from config: seconds, an interval string or a cron expression.
+
+    Returns None for an empty spec, which disables the job.
+    """
+    if spec is None or spec == '' or spec is False:
+        return None
+    if isinstance(spec, (int, float)):
+        return IntervalSchedule(spec)
+    spec = str(spec).strip()
+    match = INTERVAL_PATTERN.match(spec.lower())
+    if match:
+        return IntervalSchedule(int(match.group(1)) * INTERVAL_UNITS[match.group(2) or 's'])
+    return CronSchedule(spec)
+
+class Job:
+    """A named callable with a schedule and a record of its runs"""
+
+    def __init__(self, name, func, spec, now=None):
+        self.name = name
+        self.func = func
+        self.spec = spec
+        self.schedule = parse_schedule(spec)
+        self.next_run = self.schedule.next_run(now or datetime.now())
+        self.runs = 0
+        self.failures = 0
+        self.last_started = None
+        self.last_duration = None
+        self.last_error = None
+        self.durations = deque(maxlen=DURATION_HISTORY)
+
+    def run(self):
+        """Run the job once, recording its duration; errors are logged, not raised"""
+        self.last_started = datetime.now()
+        start = time.perf_counter()
+        try:
+            self.func()
+            self.last_error = None
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logger.error(f"Job {self.name} failed: {str(e)}")
+        finally:
+            self.last_duration = time.perf_counter() - start
+            self.durations.append(self.last_duration)
+            self.runs += 1
+
+        finished = datetime.now()
+        # A run that overran its slot is not repeated back-to-back to catch up
+        self.next_run = self.schedule.next_run(self.last_started)
+        if self.next_run <= finished:
+            self.next_run = self.schedule.next_run(finished)
+        logger.info(f"Job {self.name} {'failed' if self.last_error else 'finished'} in {self.last_duration:.2f}s, "
+                    f"next run at {self.next_run:%Y-%m-%d %H:%M:%S}")
+
+    def stats(self):
+        """Run count, failures and recent durations in seconds"""
+        return {
+            'schedule': self.spec,
+            'runs': self.runs,
+            'failures': self.failures,
+            'last_duration': self.last_duration,
+            'avg_duration': sum(self.durations) / len(self.durations) if self.durations else None,
+            'max_duration': max(self.durations) if self.durations else None,
+            'next_run': self.next_run,
+        }
+
+class JobScheduler:
+    """Holds the daemon's jobs and runs the ones that are due"""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def set_job(self, name, func, spec, now=None):
+        """Add a job, or update it in place; an unchanged spec keeps its next run and stats.
+
+        An empty spec removes the job.
+        """
+        job = self.jobs.get(name)
+        if parse_schedule(spec) is None:
+            if self.jobs.pop(name, None):
+                logger.info(f"Job {name} disabled")
+            return None
+        if job is not None and job.spec == spec:
+            job.func = func
+            return job
+
+        new_job = Job(name, func, spec, now)
+        if job is not None:
+            # Keep the run history across a schedule change
+            new_job.runs, new_job.failures, new_job.durations = job.runs, job.failures, job.durations
+            new_job.last_started, new_job.last_duration = job.last_started, job.last_duration
+        self.jobs[name] = new_job
+        logger.info(f"Job {name} scheduled {new_job.schedule!r}, next run at {new_job.next_run:%Y-%m-%d %H:%M:%S}")
+        return new_job
+
+    def run_pending(self, now=None, stop_event=None):
+        """Run every due job in order of due time, returning the names run"""
+        now = now or datetime.now()
+        ran = []
+        for job in sorted(self.jobs.values(), key=lambda job: job.next_run):
+            if job.next_run > now or (stop_event is not None and stop_event.is_set()):
+                break
+            job.run()
+            ran.append(job.name)
+        return ran
+
+    def seconds_until_next(self, now=None):
+        """Seconds until the earliest job is due (None with no jobs)"""
+        if not self.jobs:
+            return None
+        now = now or datetime.now()
+        return max(0.0, (min(job.next_run for job in self.jobs.values()) - now).total_seconds())
+
+    def stats(self):
+        return {name: job.stats() for name, job in self.jobs.items()}
@@ -0,0 +1,167 @@
+"""
+Full-text search utilities backed by an SQLite FTS5 index over artifacts
+"""
+
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import text, func, table, column, literal_column
+from sqlalchemy.orm import sessionmaker
+from models.base import engine
+
+Session = sessionmaker(bind=engine)
+
+SEARCH_TABLE = 'artifact_fts'
+
+# Lightweight table construct so the FTS index can be joined in ORM queries
+artifact_fts = table(SEARCH_TABLE, column('rowid'), column('name'), column('content'), column('image_names'))
+
+# Column weights for bm25 ranking: name, content, image_names
+BM25_WEIGHTS = (10.0, 1.0, 2.0)
+
+# Control characters used as snippet highlight markers; they survive HTML escaping
+# and are swapped for <mark> tags afterwards
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+_search_index_available = None
+
+def _image_names_sql(ref):
+    """SQL expression extracting space-separated image filenames from an artifact row"""
+    return (f"CASE WHEN json_valid({ref}.images) THEN "
+            f"COALESCE((SELECT group_concat(json_extract(value, '$.name'), ' ') FROM json_each({ref}.images)), '') "
+            f"ELSE '' END")
+
+SEARCH_INDEX_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        name, content, image_names, tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai AFTER INSERT ON artifact BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, name, content, image_names)
+        VALUES (NEW.id, NEW.name, NEW.content, {_image_names_sql('NEW')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad AFTER DELETE ON artifact BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au AFTER UPDATE OF name, content, images ON artifact BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.id;
+        INSERT INTO {SEARCH_TABLE}(rowid, name, content, image_names)
+        VALUES (NEW.id, NEW.name, NEW.content, {_image_names_sql('NEW')});
+    END""",
+]
+
+def ensure_search_index():
+    """Create the FTS index and its sync triggers if missing, backfilling a new index"""
+    global _search_index_available
+    session = Session()
+    try:
+        exists = session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': SEARCH_TABLE}
+        ).first() is not None
+
+        for statement in SEARCH_INDEX_DDL:
+            session.execute(text(statement))
+        session.commit()
+
+        if not exists:
+            count = rebuild_search_index(session)
+            print(f"Search index created and populated with {count} artifacts")
+
+        _search_index_available = True
+        return True
+
+    except Exception as e:
+        session.rollback()
+        print(f"Warning: Full-text search index unavailable, falling back to LIKE search: {e}")
+        _search_index_available = False
+        return False
+    finally:
+        session.close()
+
+def rebuild_search_index(session=None):
+    """Repopulate the FTS index from the artifact table, returning the number of rows indexed"""
+    owns_session = session is None
+    if owns_session:
+        session = Session()
+    try:
+        session.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+        session.execute(text(
+            f"INSERT INTO {SEARCH_TABLE}(rowid, name, content, image_names) "
+            f"SELECT a.id, a.name, a.content, {_image_names_sql('a')} FROM artifact a"
+        ))
+        session.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')"))
+        count = session.execute(text(f"SELECT COUNT(*) FROM {SEARCH_TABLE}")).scalar()
+        session.commit()
+        return count
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        if owns_session:
+            session.close()
+
+def search_index_available():
+    """Check (once per process) whether the FTS index exists"""
+    global _search_index_available
+    if _search_index_available is None:
+        session = Session()
+        try:
+            _search_index_available = session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': SEARCH_TABLE}
+            ).first() is not None
+        except Exception:
+            _search_index_available = False
+        finally:
+            session.close()
+    return _search_index_available
+
+def build_match_query(search_query):
+    """Turn free-form user input into a safe FTS5 MATCH expression.
+
+    Every word is quoted (so FTS operators in the input are treated as text) and
+    prefix-matched; all words must match. Returns None if there are no words.
+    """
+    terms = re.findall(r'\w+', search_query or '')
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def search_rank():
+    """bm25 rank expression for the FTS index (lower is a better match)"""
+    return func.bm25(literal_column(SEARCH_TABLE), *BM25_WEIGHTS)
+
+def apply_search(query, artifact_model, search_query, snippet_tokens=16):
+    """Restrict an Artifact query to FTS matches, adding snippet and rank columns.
+
+    Snippet and rank are appended as the last two columns of each row (so a
+    query for Artifact yields (artifact, snippet, rank)); order by search_rank()
+    (or paginate on it) to get the best matches first.
+    """
+    match_query = build_match_query(search_query)
+    if match_query is None:
+        return (query.filter(artifact_model.id == -1)
+                .add_columns(literal_column("''"), literal_column("0.0")))
+
+    fts = literal_column(SEARCH_TABLE)
+    snippet = func.snippet(fts, -1, HIGHLIGHT_START, HIGHLIGHT_END, '...', snippet_tokens)
+
+    return (query
+            .join(artifact_fts, artifact_fts.c.rowid == artifact_model.id)
+            .filter(fts.op('MATCH')(match_query))
+            .add_columns(snippet, search_rank()))
+
+def highlight_snippet(snippet):
+    """HTML-escape an FTS snippet and turn its highlight markers into <mark> tags"""
+    if not snippet:
+        return Markup('')
+    escaped = str(escape(snippet))
+    return Markup(escaped.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+
+def highlight_preview(preview, search_query, limit):
+    """HTML-escape the first limit characters of a card preview and mark the search
+    query in them, for LIKE searches that have no FTS snippet"""
+    preview = preview or ''
+    parts = re.split(f"({re.escape(search_query)})", preview[:limit], flags=re.IGNORECASE) if search_query else [preview[:limit]]
+    highlighted = ''.join(f"<mark>{escape(part)}</mark>" if i % 2 else str(escape(part)) for i, part in enumerate(parts))
+    return Markup(highlighted + ('...' if len(preview) > limit else ''))
@@ -2,14 +2,24 @@
 Tool utilities for managing project tools
 """
 
+import threading
 from models.base import engine
 from models.project_config import ProjectConfig
 from models.tool import Tool
 from sqlalchemy.orm import sessionmaker
-from utils.config_utils import load_config_from_yaml
+from utils.config_utils import load_config_from_yaml, bump_config_version, clear_stale_cache
+from utils.project_config_utils import invalidate_project_config_cache
 
 Session = sessionmaker(bind=engine)
 
+# Tools registry state: the parsed config.yaml the tools table was last synced
+# from, the enabled tools in that registry, and each project's enabled tools
+_tools_lock = threading.Lock()
+_synced_yaml_config = None
+_registry_tools = None
+_enabled_tools_cache = {}
+_enabled_tools_cache_version = None
+
 def initialize_tools_table():
     """Initialize/sync the tools table with config.yaml"""
     session = Session()
@@ -64,6 +74,12 @@ def initialize_tools_table():
                 existing_tool.enabled = False  # Disable instead of deleting to preserve data
         
         session.commit()
+        
+        global _synced_yaml_config, _registry_tools
+        with _tools_lock:
+            _synced_yaml_config = yaml_config
+            _registry_tools = None
+            _enabled_tools_cache.clear()
         return True
         
     except Exception as e:
@@ -73,34 +89,56 @@ def initialize_tools_table():
     finally:
         session.close()
 
-def get_available_tools():
-    """Get all available tools from the tools table"""
+def ensure_tools_synced():
+    """Sync the tools table only if config.yaml changed since the last sync"""
+    if load_config_from_yaml() is not _synced_yaml_config:
+        initialize_tools_table()
+
+def invalidate_enabled_tools(project_id=None):
+    """Drop cached enabled tools for one project, or for all projects"""
+    with _tools_lock:
+        if project_id is None:
+            _enabled_tools_cache.clear()
+        else:
+            _enabled_tools_cache.pop(project_id, None)
+
+def _get_registry_tools():
+    """Get the enabled tools from the tools table, loaded once per sync"""
+    global _registry_tools
+    ensure_tools_synced()
+    tools = _registry_tools
+    if tools is not None:
+        return tools
+    
     session = Session()
     try:
-        # Ensure tools table is initialized
-        initialize_tools_table()
-        
-        tools = session.query(Tool).filter(Tool.enabled == True).all()
-        return [{
+        tools = [{
             'name': tool.name,
             'display_name': tool.display_name,
             'description': tool.description,
             'icon': tool.icon,
             'url': tool.url
-        } for tool in tools]
-        
+        } for tool in session.query(Tool).filter(Tool.enabled == True).all()]
+        with _tools_lock:
+            _registry_tools = tools
+        return tools
+    finally:
+        session.close()
+
+def get_available_tools():
+    """Get all available tools from the tools table"""
+    try:
+        return [dict(tool) for tool in _get_registry_tools()]
     except Exception as e:
         print(f"Error getting available tools: {e}")
         return []
-    finally:
-        session.close()
 
 def initialize_project_tools(project_id):
     """Initialize project tools from tools table if they don't exist in project_config"""
     session = Session()
     try:
-        # Ensure tools table is initialized
-        initialize_tools_table()
+        # Ensure tools table is in sync with config.yaml
+        ensure_tools_synced()
         
         # Get all available tools from tools table
         available_tools = session.query(Tool).filter(Tool.enabled == True).all()
@@ -126,7 +164,11 @@ def initialize_project_tools(project_id):
                 )
                 session.add(new_config)
         
-        session.commit()
+        if session.new:
+            bump_config_version(session)
+            session.commit()
+            invalidate_project_config_cache(project_id)
+            invalidate_enabled_tools(project_id)
         return True
         
     except Exception as e:
@@ -138,18 +180,25 @@ def initialize_project_tools(project_id):
 
 def get_enabled_tools(project_id):
     """Get list of enabled tools for a project"""
-    session = Session()
+    global _enabled_tools_cache_version
     try:
-        enabled_tools = []
-        
-        # Get all available tools from tools table
-        available_tools = session.query(Tool).filter(Tool.enabled == True).all()
-        
-        # Get project-specific tool configurations
-        tool_configs = session.query(ProjectConfig).filter(
-            ProjectConfig.project_id == project_id,
-            ProjectConfig.key.like('tools.%')
-        ).all()
+        registry_tools = _get_registry_tools()
+        
+        with _tools_lock:
+            _enabled_tools_cache_version = clear_stale_cache(_enabled_tools_cache, _enabled_tools_cache_version)
+            enabled_tools = _enabled_tools_cache.get(project_id)
+        if enabled_tools is not None:
+            return list(enabled_tools)
+        
+        session = Session()
+        try:
+            # Get project-specific tool configurations
+            tool_configs = session.query(ProjectConfig).filter(
+                ProjectConfig.project_id == project_id,
+                ProjectConfig.key.like('tools.%')
+            ).all()
+        finally:
+            session.close()
         
         # Create a map of enabled tools for this project
         enabled_map = {}
@@ -158,22 +207,20 @@ def get_enabled_tools(project_id):
             enabled_map[tool_name] = config.value and config.value.lower() == 'true'
         
         # Return only tools that are both available and enabled for this project
-        for tool in available_tools:
-            if enabled_map.get(tool.name, False):
-                enabled_tools.append({
-                    'name': tool.name,
-                    'display_name': tool.display_name,
-                    'icon': tool.icon,
-                    'url': tool.url
-                })
+        enabled_tools = [{
+            'name': tool['name'],
+            'display_name': tool['display_name'],
+            'icon': tool['icon'],
+            'url': tool['url']
+        } for tool in registry_tools if enabled_map.get(tool['name'], False)]
         
-        return enabled_tools
+        with _tools_lock:
+            _enabled_tools_cache[project_id] = enabled_tools
+        return list(enabled_tools)
         
     except Exception as e:
         print(f"Error getting enabled tools: {e}")
         return []
-    finally:
-        session.close()
 
 def get_tool_display_name(tool_name):
     """Get display name for a tool"""
@@ -229,7 +276,10 @@ def save_project_tools(project_id, selected_tools):
                 )
                 session.add(new_config)
         
+        bump_config_version(session)
         session.commit()
+        invalidate_project_config_cache(project_id)
+        invalidate_enabled_tools(project_id)
         return True
         
     except Exception as e: